@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+# Make the src modules importable when run from the repository root
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from clip_recorder import ClipRecorder, STORAGE_MODES
+from fake_capture import synthetic_frames
+
+
+# Feed frames at fps for duration seconds with a motion event every event_interval seconds
+# Returns the add() latencies in ms, the recorder's stats after it has closed and the peak
+# traced memory in MB, which includes the frame buffer and any clips waiting to be written
+def run(storage, frames, fps, duration, event_interval, memory_mb, pre, post, directory):
+    tracemalloc.start()
+    recorder = ClipRecorder(directory, camera=storage, pre_seconds=pre, post_seconds=post,
+                            memory_mb=memory_mb, storage=storage, max_bytes=None)
+    latencies = []
+    interval = 1.0 / fps
+    next_event = time.perf_counter() + event_interval
+    stop = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        motion = start >= next_event
+        if motion:
+            next_event += event_interval
+        recorder.add(frames[i % len(frames)], motion, start)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+        remaining = interval - (time.perf_counter() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+    recorder.close()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return np.array(latencies) * 1000, recorder.stats(), peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of buffering frames for motion clips and memory under event load")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per configuration")
+    parser.add_argument('--event-intervals', type=float, nargs='+', default=[30.0, 5.0, 1.0, 0.2],
+                        help="Seconds between motion events")
+    parser.add_argument('--storage', choices=STORAGE_MODES, nargs='+', default=list(STORAGE_MODES))
+    parser.add_argument('--memory-mb', type=float, default=64)
+    parser.add_argument('--pre', type=float, default=5.0)
+    parser.add_argument('--post', type=float, default=5.0)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(60, args.width, args.height, movers=2)
+    directory = tempfile.mkdtemp(prefix='clips-')
+    try:
+        for storage in args.storage:
+            print(f"\n[{storage} storage, {args.memory_mb:g} MB, {args.width}x{args.height} @ {args.fps:g} fps]")
+            for event_interval in args.event_intervals:
+                latencies, stats, peak = run(storage, frames, args.fps, args.duration, event_interval,
+                                            args.memory_mb, args.pre, args.post, directory)
+                print(f"  event every {event_interval:5.1f}s  add p50 {np.percentile(latencies, 50):5.2f} ms  "
+                      f"p99 {np.percentile(latencies, 99):5.2f} ms  clips {stats['clips']:3d}  "
+                      f"buffered {stats['buffered_seconds']:5.1f}s  skipped {stats['skipped']:4d}  "
+                      f"dropped {stats['dropped']:4d}  buffer {stats['memory_bytes'] / 2 ** 20:5.1f} MB  "
+                      f"peak {peak:5.1f} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+# Make the src modules importable when run from the repository root
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from face_detectors import DETECTORS, create_face_detector, detector_spec
+from fake_capture import load_video_frames
+from bench_suite import face_frame, FACE_CROPS
+
+
+def box_iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    union = (a[1] - a[3]) * (a[2] - a[0]) + (b[1] - b[3]) * (b[2] - b[0]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+# Count boxes matching a reference box at IoU >= 0.5, each reference box used once
+def matched(boxes, reference, threshold=0.5):
+    used = set()
+    count = 0
+    for box in boxes:
+        best = max(range(len(reference)), key=lambda i: box_iou(box, reference[i]), default=None)
+        if best is not None and best not in used and box_iou(box, reference[best]) >= threshold:
+            used.add(best)
+            count += 1
+    return count
+
+
+# Run a detector over RGB frames, returning per-frame times in ms and the boxes found
+def run_detector(detector, frames):
+    times = []
+    boxes = []
+    for frame in frames:
+        start = time.perf_counter()
+        found = detector.detect(frame)
+        times.append((time.perf_counter() - start) * 1000)
+        boxes.append(list(found))
+    return np.array(times), boxes
+
+
+# Print cost and agreement with the reference detector for every detector on one clip
+def report(name, frames, specs, reference):
+    print(f"\n[{name}: {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}]")
+    results = {}
+    for spec in specs:
+        try:
+            detector = create_face_detector(spec)
+        except (ImportError, RuntimeError) as e:
+            print(f"  {spec:<12} skipped: {e}")
+            continue
+        results[spec] = run_detector(detector, frames)
+
+    ref_boxes = results.get(reference, (None, None))[1]
+    for spec, (times, boxes) in results.items():
+        found = sum(len(b) for b in boxes)
+        line = (f"  {spec:<12} mean {times.mean():8.2f} ms  p95 {np.percentile(times, 95):8.2f} ms  "
+                f"faces {found:5d}")
+        if ref_boxes is not None and spec != reference:
+            agree = sum(matched(b, r) for b, r in zip(boxes, ref_boxes))
+            ref_total = sum(len(r) for r in ref_boxes)
+            recall = agree / ref_total if ref_total else 1.0
+            precision = agree / found if found else 1.0
+            line += f"  recall vs {reference} {recall:6.1%}  precision {precision:6.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame cost and agreement of face detector backends")
+    parser.add_argument('clips', nargs='*', help="Recorded video files")
+    parser.add_argument('--detectors', nargs='+', type=detector_spec,
+                        default=list(DETECTORS) + ['haar>hog', 'yunet>hog'],
+                        help="Detectors and cascades to compare, e.g. hog haar haar>hog")
+    parser.add_argument('--reference', default='hog', help="Detector whose faces count as ground truth")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--width', type=int, default=640, help="Resize clips to this width (0 keeps the size)")
+    args = parser.parse_args()
+
+    # Synthetic frames with the face crops from data/ at known places
+    if FACE_CROPS:
+        for faces in (1, 4):
+            frame = cv2.cvtColor(face_frame((args.width or 640, (args.width or 640) * 3 // 4), faces), cv2.COLOR_BGR2RGB)
+            report(f"data crops, {faces} faces", [frame] * min(args.frames, 20), args.detectors, args.reference)
+
+    for path in args.clips:
+        frames = load_video_frames(path, args.frames)
+        if not frames:
+            print(f"[ERROR]: No frames read from {path}")
+            continue
+        if args.width:
+            height = frames[0].shape[0] * args.width // frames[0].shape[1]
+            frames = [cv2.resize(f, (args.width, height), interpolation=cv2.INTER_AREA) for f in frames]
+        report(path, [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in frames], args.detectors, args.reference)
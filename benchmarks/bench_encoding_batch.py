@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import cv2
+import numpy as np
+
+# Make the src modules importable when run from the repository root
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from encoding_batcher import EncodingBatcher, encode_aligned
+from bench_suite import face_frame, FACE_CROPS
+
+
+# Cost model for machines without face_recognition: a fixed cost per call plus a cost per face
+# dlib holds the GIL while encoding, so calls from different threads run one at a time
+def simulated_encoder(call_ms, face_ms):
+    lock = threading.Lock()
+
+    def encode(items):
+        with lock:
+            time.sleep((call_ms + face_ms * len(items)) / 1000)
+        return [np.zeros(128) for _ in items]
+    return encode
+
+
+# Streams each submit a frame, wait for its encodings, then submit the next, at up to fps frames per second
+# encode(rgb, locations) is either a batcher's encode or a direct per-frame call
+def run_streams(encode, frame, locations, streams, duration, fps):
+    latencies = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def stream():
+        interval = 1.0 / fps if fps else 0.0
+        local = []
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            encode(frame, locations)
+            local.append(time.perf_counter() - start)
+            remaining = interval - (time.perf_counter() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=stream) for _ in range(streams)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies) * 1000, time.perf_counter() - start
+
+
+def report(label, latencies, elapsed, faces_per_frame, extra=""):
+    print(f"  {label:<18} {len(latencies) * faces_per_frame / elapsed:8.1f} faces/s  "
+          f"p50 {np.percentile(latencies, 50):7.2f} ms  p95 {np.percentile(latencies, 95):7.2f} ms{extra}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency of batched face encoding across streams")
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 4, 8], help="Concurrent streams to simulate")
+    parser.add_argument('--faces', type=int, default=2, help="Faces per frame")
+    parser.add_argument('--budgets-ms', type=float, nargs='+', default=[0, 5, 10, 20, 50])
+    parser.add_argument('--max-faces', type=int, default=32)
+    parser.add_argument('--fps', type=float, default=0, help="Frame rate per stream (0 = as fast as possible)")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds per configuration")
+    parser.add_argument('--simulate', type=float, nargs=2, metavar=('CALL_MS', 'FACE_MS'),
+                        help="Use a cost model instead of dlib, e.g. --simulate 4 6")
+    args = parser.parse_args()
+
+    rgb = cv2.cvtColor(face_frame((640, 480), args.faces), cv2.COLOR_BGR2RGB)
+    if args.simulate:
+        encode_items = simulated_encoder(*args.simulate)
+        locations = [(0, 1, 1, 0)] * args.faces
+
+        def encode_direct(rgb_frame, locs):
+            return encode_items([(rgb_frame, loc) for loc in locs])
+    else:
+        import face_recognition
+        if not FACE_CROPS:
+            sys.exit("[ERROR]: No face crops in data/ to build frames from")
+        encode_items = encode_aligned
+        locations = face_recognition.face_locations(rgb)
+        print(f"[INFO]: {len(locations)} faces found in the test frame")
+
+        def encode_direct(rgb_frame, locs):
+            return face_recognition.face_encodings(rgb_frame, locs)
+
+    for streams in args.streams:
+        print(f"\n[{streams} streams, {len(locations)} faces per frame]")
+        latencies, elapsed = run_streams(encode_direct, rgb, locations, streams, args.duration, args.fps)
+        report("per frame", latencies, elapsed, len(locations))
+        for budget in args.budgets_ms:
+            batcher = EncodingBatcher(budget / 1000, args.max_faces, encode_items, callers=streams)
+            latencies, elapsed = run_streams(batcher.encode, rgb, locations, streams, args.duration, args.fps)
+            batcher.close()
+            stats = batcher.stats()
+            report(f"batch {budget:g} ms", latencies, elapsed, len(locations),
+                   f"  avg batch {stats['avg_batch']:5.1f}  max {stats['max_batch']:3d}  "
+                   f"wait {stats['avg_wait_ms']:6.2f} ms")
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Make the src modules importable when run from the repository root
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from face_index import BruteForceIndex, IVFIndex
+
+
+# Synthetic 128-d encodings with roughly the spread of dlib face encodings
+def make_gallery(size, dim=128, seed=0):
+    rng = np.random.default_rng(seed)
+    gallery = rng.normal(0.0, 0.09, size=(size, dim)).astype(np.float32)
+    return gallery, rng
+
+# Queries are gallery rows plus noise at a typical same-person distance
+def make_queries(gallery, rng, count, noise=0.025):
+    truth = rng.choice(len(gallery), count, replace=False)
+    queries = gallery[truth] + rng.normal(0.0, noise, size=(count, gallery.shape[1])).astype(np.float32)
+    return queries, truth
+
+# Time single-face lookups, returning latencies in milliseconds and the top row ids
+def time_lookups(index, queries):
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, rows = index.search(query[None, :], 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(rows[0, 0])
+    return np.array(latencies), np.array(found)
+
+# Run the benchmark for one gallery size
+def run(size, queries_count, nprobes, nlist):
+    gallery, rng = make_gallery(size)
+    queries, truth = make_queries(gallery, rng, min(queries_count, size))
+
+    start = time.perf_counter()
+    brute = BruteForceIndex().build(gallery)
+    brute_build = time.perf_counter() - start
+    latencies, exact = time_lookups(brute, queries)
+    print(f"\n[{size} identities, {len(queries)} queries]")
+    print(f"  brute         build {brute_build:7.2f}s  p50 {np.percentile(latencies, 50):7.3f} ms  "
+          f"p99 {np.percentile(latencies, 99):7.3f} ms  recall@1 {np.mean(exact == truth):.3f}")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(nlist=nlist).build(gallery)
+    ivf_build = time.perf_counter() - start
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        latencies, found = time_lookups(ivf, queries)
+        print(f"  ivf nprobe={nprobe:<3} build {ivf_build:7.2f}s  p50 {np.percentile(latencies, 50):7.3f} ms  "
+              f"p99 {np.percentile(latencies, 99):7.3f} ms  recall@1 {np.mean(found == exact):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of face gallery indexes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--nlist', type=int, default=None)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.queries, args.nprobe, args.nlist)
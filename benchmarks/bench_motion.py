@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+# Make the src modules importable when run from the repository root
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from background import ENGINES
+from motion_detection import MotionDetector
+
+
+# Static scene with sensor noise, lighting flicker and a slow mover in the second half
+# Returns (frames, truth) where truth marks frames that contain real motion
+def synthetic_clip(frames=300, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    scene = cv2.GaussianBlur(rng.integers(40, 200, (height, width, 3), dtype=np.uint8), (0, 0), 8)
+    clip = []
+    truth = []
+    for i in range(frames):
+        flicker = 20 * np.sin(i / 2.0)
+        noise = rng.normal(0, 4, scene.shape)
+        frame = np.clip(scene.astype(np.float32) + flicker + noise, 0, 255).astype(np.uint8)
+        moving = i >= frames // 2
+        if moving:
+            x = 50 + (i - frames // 2)
+            cv2.rectangle(frame, (x, 180), (x + 60, 330), (30, 30, 30), -1)
+        clip.append(frame)
+        truth.append(moving)
+    return clip, np.array(truth)
+
+
+# Read frames from a recorded video file
+def load_clip(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+# Run one engine over a clip, returning per-frame times in ms and trigger flags
+def run_engine(engine, frames):
+    detector = MotionDetector(engine, draw=False)
+    times = []
+    triggers = []
+    for frame in frames:
+        start = time.perf_counter()
+        motion, _ = detector.detect(frame)
+        times.append((time.perf_counter() - start) * 1000)
+        triggers.append(motion)
+    return np.array(times), np.array(triggers)
+
+
+# Print cost and trigger statistics for every engine
+def report(name, frames, truth, engines):
+    print(f"\n[{name}: {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}]")
+    for engine in engines:
+        times, triggers = run_engine(engine, frames)
+        line = (f"  {engine:<16} mean {times.mean():6.2f} ms  p95 {np.percentile(times, 95):6.2f} ms  "
+                f"trigger rate {triggers.mean():6.1%}")
+        if truth is not None:
+            false_rate = triggers[~truth].mean() if (~truth).any() else 0.0
+            miss_rate = 1 - triggers[truth].mean() if truth.any() else 0.0
+            line += f"  false triggers {false_rate:6.1%}  missed {miss_rate:6.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame cost and trigger rate of motion engines")
+    parser.add_argument('clips', nargs='*', help="Recorded video files (no ground truth)")
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=ENGINES)
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    frames, truth = synthetic_clip(args.frames)
+    report("synthetic flicker + slow mover", frames, truth, args.engines)
+    for path in args.clips:
+        frames = load_clip(path, args.frames)
+        if frames:
+            report(path, frames, None, args.engines)
+        else:
+            print(f"[ERROR]: No frames read from {path}")
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+
+# Make the src modules importable when run from the repository root
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import face_handler
+from recognition_pool import RecognitionPool
+
+
+# Read all frames from a video file or a directory of images
+def load_frames(source, limit):
+    frames = []
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.lower().endswith((".jpg", ".png")):
+                frame = cv2.imread(os.path.join(source, filename))
+                if frame is not None:
+                    frames.append(frame)
+            if len(frames) >= limit:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+# Analyze frames in the current process as the single-threaded baseline
+def run_inline(frames):
+    face_handler.ensure_ready()
+    start = time.perf_counter()
+    faces = sum(len(face_handler.analyze_faces(frame)[0]) for frame in frames)
+    return faces, time.perf_counter() - start
+
+
+# Analyze frames through a pool with the given number of worker processes
+def run_pool(frames, workers):
+    with RecognitionPool(workers=workers, max_frame_bytes=max(f.nbytes for f in frames)) as pool:
+        # Warm up every worker so process start-up is not timed
+        list(pool.map(frames[:workers * 2]))
+        start = time.perf_counter()
+        faces = sum(len(locations) for locations, _, _ in pool.map(frames))
+        return faces, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face recognition throughput vs worker processes")
+    parser.add_argument('source', nargs='?', default=os.path.join('demo', 'demo.gif'),
+                        help="Video file or directory of frames")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=1, help="Repeat the clip to lengthen short recordings")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames) * args.repeat
+    if not frames:
+        print(f"[ERROR]: No frames read from {args.source}")
+        sys.exit(1)
+    print(f"[INFO]: {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]} from {args.source}")
+
+    faces, elapsed = run_inline(frames)
+    baseline = len(frames) / elapsed
+    print(f"  inline      {baseline:7.1f} frames/s  {faces / elapsed:7.1f} faces/s")
+
+    for workers in args.workers:
+        faces, elapsed = run_pool(frames, workers)
+        fps = len(frames) / elapsed
+        print(f"  workers={workers:<3} {fps:7.1f} frames/s  {faces / elapsed:7.1f} faces/s  "
+              f"speedup {fps / baseline:4.2f}x")
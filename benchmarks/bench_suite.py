@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import glob
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import cv2
+import numpy as np
+
+# Make the src modules importable when run from the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from fake_capture import FakeVideoCapture, synthetic_frames, load_video_frames
+from gallery import FaceGallery
+from logger import save_log, create_event_sink
+from motion_detection import detect_motion, MotionDetector
+from pipeline import DetectionPipeline
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+DEMO_CLIP = os.path.join(ROOT_DIR, 'demo', 'demo.gif')
+FACE_CROPS = sorted(glob.glob(os.path.join(ROOT_DIR, 'data', 'known_faces', '*.jpg')) +
+                    glob.glob(os.path.join(ROOT_DIR, 'data', 'unknown_faces', '*.jpg')))
+
+RESOLUTIONS = {'480p': (640, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+GALLERY_SIZES = (100, 1000, 10000, 50000)
+FACE_COUNTS = (1, 4, 16)
+EVENT_COUNTS = (1000, 10000)
+# A case is reported as a regression when its p50 or throughput is this much worse than the baseline
+REGRESSION_THRESHOLD = 0.10
+
+
+# Benchmark case: op() is called repeatedly and processes `items` items per call
+# setup() runs before each timed pass and returns the op, so state such as a motion background starts fresh
+class Case:
+
+    def __init__(self, group, name, params, setup, items=1, iterations=100, skip=None):
+        self.group = group
+        self.name = name
+        self.params = params
+        self.setup = setup
+        self.items = items
+        self.iterations = iterations
+        self.skip = skip
+
+
+# Time `iterations` calls of op, returning per-call latencies in seconds
+def time_op(op, iterations, warmup):
+    for _ in range(warmup):
+        op()
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        op()
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+# Peak Python heap growth while running op, measured in a separate pass so tracing does not skew timings
+def peak_memory(op, iterations):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(iterations):
+            op()
+        return (tracemalloc.get_traced_memory()[1] - base) / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case, quick):
+    result = {'group': case.group, 'name': case.name, 'params': case.params}
+    if case.skip:
+        result['skipped'] = case.skip
+        print(f"  {case.name:<40} skipped: {case.skip}")
+        return result
+    iterations = max(5, case.iterations // 5) if quick else case.iterations
+    latencies = time_op(case.setup(), iterations, warmup=max(1, iterations // 10))
+    peak_mb = peak_memory(case.setup(), max(1, min(iterations, 20)))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    result.update({
+        'iterations': iterations,
+        'throughput_per_s': case.items * iterations / latencies.sum(),
+        'latency_ms': {
+            'mean': latencies.mean() * 1000,
+            'p50': p50 * 1000,
+            'p95': p95 * 1000,
+            'p99': p99 * 1000,
+            'max': latencies.max() * 1000,
+        },
+        'peak_memory_mb': peak_mb,
+    })
+    print(f"  {case.name:<40} p50 {p50 * 1000:8.3f} ms  p99 {p99 * 1000:8.3f} ms  "
+          f"{result['throughput_per_s']:10.1f} /s  peak {peak_mb:7.2f} MB")
+    return result
+
+
+# Cycle through frames, one per call
+def frame_cycle(frames):
+    state = {'i': 0}
+
+    def next_frame():
+        frame = frames[state['i'] % len(frames)]
+        state['i'] += 1
+        return frame
+    return next_frame
+
+
+def motion_cases(resolutions):
+    cases = []
+    for label in resolutions:
+        width, height = RESOLUTIONS[label]
+        frames = synthetic_frames(60, width, height)
+
+        def setup_legacy(frames=frames):
+            next_frame = frame_cycle(frames)
+            state = {'first': None}
+
+            def op():
+                gray, _, _ = detect_motion(next_frame().copy(), state['first'])
+                if state['first'] is None:
+                    state['first'] = gray
+            return op
+
+        def setup_detector(frames=frames):
+            next_frame = frame_cycle(frames)
+            detector = MotionDetector(draw=False)
+            return lambda: detector.detect(next_frame())
+
+        params = {'resolution': label, 'fixture': 'synthetic'}
+        cases.append(Case('motion', f"detect_motion[{label}]", params, setup_legacy, iterations=200))
+        cases.append(Case('motion', f"MotionDetector[{label}]", params, setup_detector, iterations=200))
+
+    if os.path.exists(DEMO_CLIP):
+        frames = load_video_frames(DEMO_CLIP, size=RESOLUTIONS['1080p'])
+
+        def setup_demo(frames=frames):
+            next_frame = frame_cycle(frames)
+            detector = MotionDetector(draw=False)
+            return lambda: detector.detect(next_frame())
+        cases.append(Case('motion', "MotionDetector[demo.gif]", {'resolution': '1080p', 'fixture': 'demo.gif'},
+                          setup_demo, iterations=100))
+    return cases
+
+
+# Paste face crops from data/ onto a plain background, spread across the frame
+def face_frame(size, faces, face_px=160):
+    width, height = size
+    frame = np.full((height, width, 3), 120, dtype=np.uint8)
+    columns = int(np.ceil(np.sqrt(faces)))
+    cell_w, cell_h = width // columns, height // columns
+    face_px = min(face_px, cell_w, cell_h)
+    for i in range(faces):
+        crop = cv2.imread(FACE_CROPS[i % len(FACE_CROPS)])
+        crop = cv2.resize(crop, (face_px, face_px), interpolation=cv2.INTER_AREA)
+        x = (i % columns) * cell_w + (cell_w - face_px) // 2
+        y = (i // columns) * cell_h + (cell_h - face_px) // 2
+        frame[y:y + face_px, x:x + face_px] = crop
+    return frame
+
+
+def recognition_cases(resolutions):
+    skip = None
+    try:
+        import face_handler
+        face_handler.load_face_recognition()
+        face_handler.ensure_ready()
+    except ImportError as e:
+        skip = f"face_recognition is not available ({e})"
+    if not FACE_CROPS:
+        skip = "no face crops in data/"
+
+    cases = []
+    for label in resolutions:
+        for faces in (1, 4):
+            def setup(size=RESOLUTIONS[label], faces=faces):
+                frame = face_frame(size, faces)
+                # Recognition without saving unknown crops, which happen on a background writer
+                return lambda: face_handler.analyze_faces_encoded(frame)
+            cases.append(Case('recognize', f"recognize_faces[{label},faces={faces}]",
+                              {'resolution': label, 'faces': faces, 'fixture': 'data crops'},
+                              setup, items=1, iterations=20, skip=skip))
+    return cases
+
+
+def matching_cases(sizes, face_counts):
+    cases = []
+    for size in sizes:
+        rng = np.random.default_rng(0)
+        encodings = rng.normal(0.0, 0.09, size=(size, 128)).astype(np.float32)
+        gallery = FaceGallery.from_lists(list(encodings), [f"person{i}" for i in range(size)])
+        gallery.snapshot()
+        for faces in face_counts:
+            rows = rng.choice(size, faces, replace=False)
+            queries = encodings[rows] + rng.normal(0.0, 0.025, size=(faces, 128)).astype(np.float32)
+
+            def setup(gallery=gallery, queries=queries):
+                return lambda: gallery.identify(queries)
+            cases.append(Case('matching', f"identify[gallery={size},faces={faces}]",
+                              {'gallery_size': size, 'faces': faces, 'index': type(gallery.snapshot()['index']).__name__},
+                              setup, items=faces, iterations=200))
+    return cases
+
+
+# Events shaped like the ones main.log_motion_for_gui records
+def make_events(count):
+    detections = json.dumps([{"name": "Unknown", "distance": 0.61, "box": [10, 90, 90, 10]}])
+    return [{"Time": 1767225600.0 + i, "Timestamp": f"2026-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}",
+             "Camera": "camera0", "Faces": "Unknown", "Detections": detections} for i in range(count)]
+
+
+def logging_cases(event_counts, tmp_dir):
+    cases = []
+    for count in event_counts:
+        events = make_events(count)
+        path = os.path.join(tmp_dir, f"save_log_{count}.csv")
+
+        def setup_save_log(events=events, path=path):
+            # save_log prints a line per call, which is not part of the cost being measured
+            return lambda: save_log(events, path)
+        cases.append(Case('logging', f"save_log[events={count}]", {'events': count},
+                          setup_save_log, items=count, iterations=10))
+
+        for fmt in ('csv', 'jsonl', 'db'):
+            def setup_sink(events=events, fmt=fmt, count=count):
+                state = {'run': 0}
+
+                def op():
+                    state['run'] += 1
+                    sink = create_event_sink(os.path.join(tmp_dir, f"sink_{count}_{state['run']}.{fmt}"), flush_size=100)
+                    for event in events:
+                        sink.write(event)
+                    sink.close()
+                return op
+            cases.append(Case('logging', f"event_sink[{fmt},events={count}]", {'events': count, 'format': fmt},
+                              setup_sink, items=count, iterations=5))
+    return cases
+
+
+# FakeVideoCapture that waits after its last frame instead of failing, so the pipeline keeps
+# running until every frame has come out of it; release() unblocks the capture thread for stop()
+class HeldCapture(FakeVideoCapture):
+
+    def __init__(self, frames, max_frames):
+        super().__init__(frames, max_frames=max_frames)
+        self.released = False
+
+    def release(self):
+        self.released = True
+        self.max_frames = None
+
+    def read(self):
+        while not self.released and self.position >= self.max_frames:
+            time.sleep(0.001)
+        return super().read()
+
+
+# Full capture -> motion -> render pipeline fed by FakeVideoCapture, with face recognition stubbed
+# out so the case measures the pipeline's own overhead and motion stage
+# Each run waits until all frames_per_run frames have been rendered (or skipped as stale)
+def pipeline_cases(resolutions, frames_per_run=200, timeout=60.0):
+    cases = []
+    for label in resolutions:
+        width, height = RESOLUTIONS[label]
+        frames = synthetic_frames(60, width, height)
+
+        def setup(frames=frames):
+            def op():
+                cap = HeldCapture(frames, frames_per_run)
+                done = []
+                pipeline = DetectionPipeline(cap, MotionDetector(draw=False), lambda f, r: (f, [], []),
+                                             done.append, face_workers=1, queue_size=frames_per_run)
+                pipeline.start()
+                deadline = time.perf_counter() + timeout
+                while len(done) + pipeline.stale_frames < frames_per_run and pipeline.running:
+                    if time.perf_counter() > deadline:
+                        break
+                    time.sleep(0.001)
+                handled = len(done) + pipeline.stale_frames
+                cap.release()
+                pipeline.stop()
+                if handled < frames_per_run:
+                    raise RuntimeError(f"Pipeline handled only {handled} of {frames_per_run} frames")
+            return op
+        cases.append(Case('pipeline', f"pipeline[{label}]", {'resolution': label, 'frames': frames_per_run},
+                          setup, items=frames_per_run, iterations=5))
+    return cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+    }
+    try:
+        import face_recognition
+        info['face_recognition'] = getattr(face_recognition, '__version__', 'installed')
+    except ImportError:
+        info['face_recognition'] = None
+    return info
+
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+# Print cases that got slower than the baseline run, returning how many regressed
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    with open(baseline_path) as f:
+        baseline = {(c['group'], c['name']): c for c in json.load(f)['cases']}
+    print(f"\n[Comparison with {baseline_path}]")
+    regressions = 0
+    for case in results['cases']:
+        old = baseline.get((case['group'], case['name']))
+        if old is None or 'latency_ms' not in old or 'latency_ms' not in case:
+            continue
+        p50_change = case['latency_ms']['p50'] / old['latency_ms']['p50'] - 1
+        throughput_change = case['throughput_per_s'] / old['throughput_per_s'] - 1
+        regressed = p50_change > threshold or throughput_change < -threshold
+        regressions += regressed
+        print(f"  {case['name']:<40} p50 {p50_change:+7.1%}  throughput {throughput_change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+GROUPS = ('motion', 'recognize', 'matching', 'logging', 'pipeline')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the motion, recognition, matching and logging hot paths")
+    parser.add_argument('--only', nargs='+', choices=GROUPS, help="Run only these groups")
+    parser.add_argument('--quick', action='store_true', help="Fewer iterations and sizes, for a smoke run")
+    parser.add_argument('--output', help="JSON results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown reported as a regression, as a fraction")
+    args = parser.parse_args()
+
+    groups = args.only or GROUPS
+    resolutions = ['480p'] if args.quick else list(RESOLUTIONS)
+    sizes = (100, 10000) if args.quick else GALLERY_SIZES
+    face_counts = (1, 4) if args.quick else FACE_COUNTS
+    event_counts = EVENT_COUNTS[:1] if args.quick else EVENT_COUNTS
+
+    commit = git_commit()
+    results = {'commit': commit, 'time': time.time(), 'quick': args.quick, 'environment': environment(), 'cases': []}
+    print(f"[INFO]: Benchmarking commit {commit} on {results['environment']['platform']}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builders = {
+            'motion': lambda: motion_cases(resolutions),
+            'recognize': lambda: recognition_cases(resolutions),
+            'matching': lambda: matching_cases(sizes, face_counts),
+            'logging': lambda: logging_cases(event_counts, tmp_dir),
+            'pipeline': lambda: pipeline_cases(resolutions),
+        }
+        for group in groups:
+            print(f"\n[{group}]")
+            for case in builders[group]():
+                results['cases'].append(run_case(case, args.quick))
+    results['max_rss_mb'] = max_rss_mb()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"\n[INFO]: Results written to {output} (max RSS {results['max_rss_mb'] or 0:.0f} MB)")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"[WARNING]: {regressions} cases regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
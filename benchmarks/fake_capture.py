@@ -0,0 +1,103 @@
+import time
+import cv2
+import numpy as np
+
+
+# Synthetic scene with sensor noise and dark boxes moving across it
+def synthetic_frames(count=120, width=640, height=480, movers=1, seed=0):
+    rng = np.random.default_rng(seed)
+    scene = cv2.GaussianBlur(rng.integers(40, 200, (height, width, 3), dtype=np.uint8), (0, 0), 8)
+    box_w, box_h = max(20, width // 10), max(30, height // 3)
+    frames = []
+    for i in range(count):
+        frame = np.clip(scene.astype(np.int16) + rng.integers(-4, 5, scene.shape), 0, 255).astype(np.uint8)
+        for m in range(movers):
+            x = (m * width // max(movers, 1) + i * max(2, width // 100)) % max(1, width - box_w)
+            y = (height - box_h) * (m + 1) // (movers + 1)
+            cv2.rectangle(frame, (x, y), (x + box_w, y + box_h), (30, 30, 30), -1)
+        frames.append(frame)
+    return frames
+
+
+# Frames of a video file or animated GIF, resized to the given size if one is set
+def load_video_frames(path, limit=None, size=None):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if size is not None:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+# Stand-in for cv2.VideoCapture that plays a list of frames, so the pipeline runs without a camera
+# Frames are returned as copies, like a real capture, and loop until max_frames have been read
+# With realtime=True, read() is paced at fps like a camera
+class FakeVideoCapture:
+
+    def __init__(self, frames, fps=30.0, max_frames=None, realtime=False):
+        if not frames:
+            raise ValueError("FakeVideoCapture needs at least one frame")
+        self.frames = frames
+        self.fps = fps
+        self.max_frames = max_frames
+        self.realtime = realtime
+        self.position = 0
+        self.opened = True
+        self._next_due = None
+        self._grabbed = None
+
+    def isOpened(self):
+        return self.opened
+
+    def grab(self):
+        if not self.opened or (self.max_frames is not None and self.position >= self.max_frames):
+            self._grabbed = None
+            return False
+        if self.realtime:
+            now = time.perf_counter()
+            if self._next_due is None:
+                self._next_due = now
+            elif now < self._next_due:
+                time.sleep(self._next_due - now)
+            self._next_due += 1.0 / self.fps
+        self._grabbed = self.frames[self.position % len(self.frames)]
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        if self._grabbed is None:
+            return False, None
+        return True, self._grabbed.copy()
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        height, width = self.frames[0].shape[:2]
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(height)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.max_frames if self.max_frames is not None else len(self.frames))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+            return True
+        return False
+
+    def release(self):
+        self.opened = False
@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+
+# Motion after this many seconds without any counts as a new event
+MOTION_GAP = 1.0
+# A motion region is new if less than this fraction of it overlaps the previous motion frame's regions
+NEW_REGION_OVERLAP = 0.3
+# Weight of the newest recognition latency in the running average
+LATENCY_SMOOTHING = 0.2
+
+
+# Fraction of box a, given as (x, y, w, h), that is covered by box b
+def region_overlap(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0 or aw <= 0 or ah <= 0:
+        return 0.0
+    return (w * h) / (aw * ah)
+
+
+# Decides which frames get motion detection and which motion frames get face recognition
+# Motion detection runs on every frame while active. Recognition runs on every stride-th motion
+# frame: stride is min_stride for boost_seconds after new motion regions or new faces appear,
+# then doubles every backoff_after seconds of motion with nothing new, up to max_stride.
+# Every control_interval the process's CPU use and the recognition latency are measured, and the
+# stride is raised while over cpu_budget (in cores) or latency_slo (seconds), and lowered again
+# once comfortably under. After idle_after seconds without motion, motion detection only runs
+# idle_fps times a second until motion comes back.
+# CPU is measured for this process, so recognition worker processes are not included.
+class AdaptiveScheduler:
+
+    def __init__(self, cpu_budget=None, latency_slo=None, min_stride=1, max_stride=8, boost_seconds=2.0,
+                 backoff_after=5.0, idle_after=30.0, idle_fps=2.0, control_interval=1.0):
+        self.cpu_budget = cpu_budget
+        self.latency_slo = latency_slo
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.boost_seconds = boost_seconds
+        self.backoff_after = backoff_after
+        self.idle_after = idle_after
+        self.idle_fps = idle_fps
+        self.control_interval = control_interval
+
+        self.idle = False
+        # Lower bound on the stride from the CPU and latency targets
+        self.budget_stride = float(self.min_stride)
+        self.stride = self.min_stride
+
+        self.frames = 0
+        self.analyzed = 0
+        self.motion_frames = 0
+        self.recognized = 0
+        self.skipped = 0
+        self.idle_skipped = 0
+        self.boosts = 0
+        self.latency = None
+
+        now = time.perf_counter()
+        self._last_motion = now
+        self._last_regions = []
+        self._last_faces = set()
+        self._boost_until = 0.0
+        self._sustained_since = now
+        self._since_recognized = self.max_stride
+        self._next_idle_frame = 0.0
+        self._window = self._window_start(now)
+        self._report = {'fps': 0.0, 'analyzed_fps': 0.0, 'recognized_fps': 0.0, 'cpu_cores': 0.0, 'cpu_percent': 0.0}
+        self._lock = threading.Lock()
+
+    # Change the targets and limits while running, e.g. from a reloaded config
+    # cpu_budget or latency_slo of None removes that target; other None values are left as they are
+    def configure(self, cpu_budget=None, latency_slo=None, max_stride=None, idle_after=None, idle_fps=None):
+        with self._lock:
+            self.cpu_budget = cpu_budget
+            self.latency_slo = latency_slo
+            if max_stride is not None:
+                self.max_stride = max(self.min_stride, max_stride)
+                self.budget_stride = min(self.budget_stride, self.max_stride)
+            if idle_after is not None:
+                self.idle_after = idle_after
+            if idle_fps is not None:
+                self.idle_fps = idle_fps
+
+    def _window_start(self, now):
+        return (now, time.process_time(), self.frames, self.analyzed, self.recognized)
+
+    # Whether to run motion detection on a frame captured at now; False only in idle mode
+    def run_motion(self, now):
+        with self._lock:
+            self.frames += 1
+            self._control(now)
+            if not self.idle and now - self._last_motion >= self.idle_after:
+                self.idle = True
+                print(f"[INFO]: No motion for {self.idle_after:g}s, motion detection drops to "
+                      f"{self.idle_fps:g} fps.")
+            if self.idle:
+                if now < self._next_idle_frame:
+                    self.idle_skipped += 1
+                    return False
+                self._next_idle_frame = now + 1.0 / self.idle_fps
+            self.analyzed += 1
+            return True
+
+    # Whether to recognize faces on a motion frame; regions are its (x, y, w, h) motion boxes
+    def should_recognize(self, now, regions=()):
+        with self._lock:
+            self.motion_frames += 1
+            novel = now - self._last_motion > MOTION_GAP or self.idle or self._has_new_region(regions)
+            if self.idle:
+                self.idle = False
+                print("[INFO]: Motion detected, leaving idle mode.")
+            self._last_motion = now
+            self._last_regions = list(regions)
+            if novel:
+                self._boost(now)
+
+            self.stride = self._current_stride(now)
+            self._since_recognized += 1
+            if self._since_recognized >= self.stride:
+                self._since_recognized = 0
+                self.recognized += 1
+                return True
+            self.skipped += 1
+            return False
+
+    # Feed back a recognized frame: its latency and whether new faces turned up
+    # detections are face_handler.describe_faces records; tracked faces carry a "track" id
+    def record_result(self, packet, now):
+        latency = now - packet.captured_at
+        faces = {d.get("track", d.get("name")) for d in packet.detections or []}
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+            if faces - self._last_faces:
+                self._boost(now)
+            self._last_faces = faces
+
+    def _has_new_region(self, regions):
+        for region in regions:
+            if all(region_overlap(region, old) < NEW_REGION_OVERLAP for old in self._last_regions):
+                return True
+        return False
+
+    # Recognize the next motion frame and keep the stride at its minimum for a while
+    def _boost(self, now):
+        self.boosts += 1
+        self._boost_until = now + self.boost_seconds
+        self._sustained_since = self._boost_until
+        self._since_recognized = self.max_stride
+
+    def _current_stride(self, now):
+        if now < self._boost_until:
+            activity = self.min_stride
+        else:
+            steps = min(10, int((now - self._sustained_since) // self.backoff_after))
+            activity = min(self.max_stride, self.min_stride * 2 ** steps)
+        return max(activity, min(self.max_stride, round(self.budget_stride)))
+
+    # Measure rates and CPU over the last interval and steer the stride towards the targets
+    def _control(self, now):
+        start, cpu, frames, analyzed, recognized = self._window
+        wall = now - start
+        if wall < self.control_interval:
+            return
+        cores = (time.process_time() - cpu) / wall
+        self._report = {
+            'fps': (self.frames - frames) / wall,
+            'analyzed_fps': (self.analyzed - analyzed) / wall,
+            'recognized_fps': (self.recognized - recognized) / wall,
+            'cpu_cores': cores,
+            'cpu_percent': cores / (os.cpu_count() or 1) * 100,
+        }
+        over = ((self.cpu_budget is not None and cores > self.cpu_budget)
+                or (self.latency_slo is not None and self.latency is not None and self.latency > self.latency_slo))
+        under = ((self.cpu_budget is None or cores < 0.8 * self.cpu_budget)
+                 and (self.latency_slo is None or self.latency is None or self.latency < 0.8 * self.latency_slo))
+        if over:
+            self.budget_stride = min(self.max_stride, self.budget_stride * 1.5)
+        elif under:
+            self.budget_stride = max(self.min_stride, self.budget_stride - 0.5)
+        self._window = self._window_start(now)
+
+    # Achieved frame rates, CPU use, current stride and mode
+    def stats(self):
+        with self._lock:
+            result = dict(self._report)
+            result.update({
+                'mode': 'idle' if self.idle else 'active',
+                'stride': self.stride,
+                'budget_stride': round(self.budget_stride, 2),
+                'latency_ms': self.latency * 1000 if self.latency is not None else None,
+                'frames': self.frames,
+                'motion_frames': self.motion_frames,
+                'recognized': self.recognized,
+                'skipped': self.skipped,
+                'idle_skipped': self.idle_skipped,
+                'boosts': self.boosts,
+            })
+            return result
+
+    # Samples for the metrics exporter
+    def metric_samples(self, **labels):
+        stats = self.stats()
+        return [
+            ('achieved_fps', 'gauge', dict(labels, stage='capture'), stats['fps']),
+            ('achieved_fps', 'gauge', dict(labels, stage='motion'), stats['analyzed_fps']),
+            ('achieved_fps', 'gauge', dict(labels, stage='faces'), stats['recognized_fps']),
+            ('cpu_cores', 'gauge', labels, stats['cpu_cores']),
+            ('recognition_stride', 'gauge', labels, stats['stride']),
+            ('idle', 'gauge', labels, int(stats['mode'] == 'idle')),
+        ]
+
+
+# Format scheduler stats as a single log line
+def format_scheduler_stats(stats):
+    latency = f"{stats['latency_ms']:.0f}ms" if stats['latency_ms'] is not None else "-"
+    return (f"{stats['mode']} stride={stats['stride']} | {stats['fps']:.1f} fps, motion {stats['analyzed_fps']:.1f} fps, "
+            f"faces {stats['recognized_fps']:.1f} fps | CPU {stats['cpu_cores']:.2f} cores "
+            f"({stats['cpu_percent']:.0f}%) | latency {latency}")
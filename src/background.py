@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+
+
+# Base class for background models; apply() takes a blurred gray frame and returns a 0/255 mask
+# Buffers are allocated on the first frame and reused for every frame after that
+class BackgroundModel:
+    name = None
+
+    def __init__(self, threshold=30):
+        self.threshold = threshold
+        self.shape = None
+
+    # Allocate buffers for frames of the given shape
+    def _allocate(self, shape):
+        self.shape = shape
+        self.delta = np.empty(shape, dtype=np.uint8)
+        self.mask = np.empty(shape, dtype=np.uint8)
+
+    # Return the foreground mask, or None while the model is still learning the background
+    def apply(self, gray):
+        if self.shape != gray.shape:
+            self._allocate(gray.shape)
+            self._first_frame(gray)
+            return None
+        return self._apply(gray)
+
+    def _first_frame(self, gray):
+        raise NotImplementedError
+
+    def _apply(self, gray):
+        raise NotImplementedError
+
+    # Forget the learned background
+    def reset(self):
+        self.shape = None
+
+    # Change the threshold from the next frame on, keeping the learned background
+    def set_threshold(self, threshold):
+        self.threshold = threshold
+
+
+# Difference against the previous frame (the original detect_motion behaviour)
+class FrameDifference(BackgroundModel):
+    name = 'frame_diff'
+
+    def _allocate(self, shape):
+        super()._allocate(shape)
+        self.previous = np.empty(shape, dtype=np.uint8)
+
+    def _first_frame(self, gray):
+        np.copyto(self.previous, gray)
+
+    def _apply(self, gray):
+        cv2.absdiff(self.previous, gray, dst=self.delta)
+        np.copyto(self.previous, gray)
+        cv2.threshold(self.delta, self.threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+        return self.mask
+
+
+# Exponential running average of past frames, so slow movers stand out and flicker averages out
+class RunningAverage(BackgroundModel):
+    name = 'running_average'
+
+    # alpha is the weight of each new frame in the background
+    def __init__(self, threshold=25, alpha=0.05):
+        super().__init__(threshold)
+        self.alpha = alpha
+
+    def _allocate(self, shape):
+        super()._allocate(shape)
+        self.average = np.empty(shape, dtype=np.float32)
+        self.background = np.empty(shape, dtype=np.uint8)
+
+    def _first_frame(self, gray):
+        self.average[...] = gray
+
+    def _apply(self, gray):
+        cv2.convertScaleAbs(self.average, dst=self.background)
+        cv2.absdiff(self.background, gray, dst=self.delta)
+        cv2.accumulateWeighted(gray, self.average, self.alpha)
+        cv2.threshold(self.delta, self.threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+        return self.mask
+
+
+# OpenCV's Gaussian mixture (MOG2) or k-nearest-neighbour background subtractors
+class OpenCVSubtractor(BackgroundModel):
+
+    # learning_rate of -1 lets OpenCV choose it from the history length
+    def __init__(self, kind='mog2', history=500, threshold=None, learning_rate=-1, warmup_frames=10):
+        super().__init__(threshold)
+        self.name = kind
+        self.kind = kind
+        self.history = history
+        self.learning_rate = learning_rate
+        self.warmup_frames = warmup_frames
+        self._create()
+
+    def _create(self):
+        if self.kind == 'mog2':
+            var_threshold = self.threshold if self.threshold is not None else 16
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(self.history, var_threshold, False)
+        elif self.kind == 'knn':
+            dist_threshold = self.threshold if self.threshold is not None else 400.0
+            self.subtractor = cv2.createBackgroundSubtractorKNN(self.history, dist_threshold, False)
+        else:
+            raise ValueError(f"Unknown background subtractor: {self.kind}")
+        self.frames = 0
+
+    def _first_frame(self, gray):
+        self.subtractor.apply(gray, self.mask, self.learning_rate)
+        self.frames = 1
+
+    def _apply(self, gray):
+        mask = self.subtractor.apply(gray, self.mask, self.learning_rate)
+        self.frames += 1
+        if self.frames <= self.warmup_frames:
+            return None
+        return mask
+
+    def reset(self):
+        super().reset()
+        self._create()
+
+    # None restores OpenCV's default threshold
+    def set_threshold(self, threshold):
+        self.threshold = threshold
+        if self.kind == 'mog2':
+            self.subtractor.setVarThreshold(threshold if threshold is not None else 16)
+        else:
+            self.subtractor.setDist2Threshold(threshold if threshold is not None else 400.0)
+
+
+ENGINES = ('frame_diff', 'running_average', 'mog2', 'knn')
+
+
+# Create a background model by name; options are passed to its constructor
+def create_background_model(engine='running_average', **options):
+    if engine == 'frame_diff':
+        return FrameDifference(**options)
+    if engine == 'running_average':
+        return RunningAverage(**options)
+    if engine in ('mog2', 'knn'):
+        return OpenCVSubtractor(kind=engine, **options)
+    raise ValueError(f"Unknown motion engine: {engine}")
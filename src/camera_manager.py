@@ -0,0 +1,540 @@
+import time
+import threading
+import argparse
+import cv2
+
+import metrics
+import camera_source
+from config import Config, ConfigWatcher, add_arguments, from_args
+from motion_detection import open_camera, MotionDetector, DEFAULT_MOTION_ENGINE
+from pipeline import FramePacket, default_face_workers
+from tracker import FaceTracker
+from background import ENGINES
+from face_detectors import create_face_detector, detector_spec
+from camera_source import ReconnectingCapture
+from clip_recorder import ClipRecorder, STORAGE_MODES
+from adaptive_scheduler import AdaptiveScheduler, format_scheduler_stats
+
+# Score added per second a recognition job has been waiting, so busy streams cannot starve others
+AGING_PER_SECOND = 1.0
+# Smoothing factor for each stream's motion activity score
+MOTION_SMOOTHING = 0.1
+
+
+# Open a device index, video file or stream URL
+def open_source(source):
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return open_camera(int(source))
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"[ERROR]: Failed to open video source {source}")
+        return None
+    return cap
+
+
+# Devices and network streams can drop out and come back; video files just end
+def is_live_source(source):
+    if isinstance(source, int):
+        return True
+    return isinstance(source, str) and (source.isdigit() or '://' in source)
+
+
+# Running counters for one camera stream
+class StreamStats:
+
+    def __init__(self):
+        self.frames = 0
+        self.motion_frames = 0
+        self.recognized_frames = 0
+        self.dropped_jobs = 0
+        self.started_at = None
+        self.last_error = None
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'frames': self.frames,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'motion_frames': self.motion_frames,
+            'recognized_frames': self.recognized_frames,
+            'dropped_jobs': self.dropped_jobs,
+            'last_error': self.last_error,
+        }
+
+
+# One camera with its own capture thread, motion state and stop control
+class CameraStream:
+
+    # realtime paces file sources at their recorded frame rate instead of reading flat out
+    # detector is a face_detectors.FaceDetector for this camera, or None for the default
+    # reconnect reopens live sources with backoff when they stop delivering frames
+    # clip_recorder is a clip_recorder.ClipRecorder for this camera's motion clips, or None
+    # adaptive is an adaptive_scheduler.AdaptiveScheduler choosing which of this camera's frames get
+    # motion detection and recognition, or None to check every frame and recognize every motion frame
+    # motion_options are further MotionDetector settings, e.g. threshold or min_area
+    def __init__(self, name, source, scheduler, on_result=None, priority=0.0, realtime=False, tracker=None,
+                 motion_engine=DEFAULT_MOTION_ENGINE, detector=None, reconnect=True, clip_recorder=None,
+                 adaptive=None, motion_options=None):
+        self.name = name
+        self.source = source
+        self.scheduler = scheduler
+        self.on_result = on_result
+        self.priority = priority
+        self.realtime = realtime
+        self.tracker = tracker
+        self.detector = detector
+        self.reconnect = reconnect
+        self.clip_recorder = clip_recorder
+        self.adaptive = adaptive
+        self.motion_detector = MotionDetector(motion_engine, **(motion_options or {}))
+        self.motion_score = 0.0
+        self.stats = StreamStats()
+        self.cap = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Open the source and start reading frames
+    def start(self):
+        if self.running:
+            return True
+        self.cap = open_source(self.source)
+        if self.cap is None:
+            self.stats.last_error = "Could not open source"
+            return False
+        if self.reconnect and is_live_source(self.source):
+            self.cap = ReconnectingCapture(lambda: open_source(self.source), self.cap,
+                                           on_state=self._on_camera_state, name=self.name)
+        self._stop.clear()
+        self.stats.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f'camera-{self.name}', daemon=True)
+        self._thread.start()
+        return True
+
+    # Runs on the capture thread, so resetting the motion detector cannot race with detect()
+    def _on_camera_state(self, state, seconds):
+        if state == 'lost':
+            self.stats.last_error = "Camera lost, reconnecting"
+        else:
+            # The scene may have changed while the camera was away
+            self.motion_detector.reset()
+            self.stats.last_error = None
+
+    # Reconnect counters and outage-to-recovery times, or None if the source is not reconnecting
+    def reconnect_stats(self):
+        if isinstance(self.cap, ReconnectingCapture):
+            return self.cap.stats()
+        return None
+
+    # Ask the capture thread to stop and wait for it
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if isinstance(self.cap, ReconnectingCapture):
+            # Wake the capture thread if it is waiting for the camera to come back
+            self.cap.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.scheduler.cancel(self)
+
+    # Capture frames, detect motion and hand motion frames to the scheduler
+    def _run(self):
+        seq = 0
+        interval = 0.0
+        if self.realtime:
+            fps = self.cap.get(cv2.CAP_PROP_FPS)
+            interval = 1.0 / fps if fps and fps > 0 else 0.0
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret or frame is None:
+                    print(f"[INFO]: Camera {self.name} reached the end of its stream.")
+                    break
+                captured = time.perf_counter()
+                metrics.observe('capture', captured - start, camera=self.name)
+
+                packet = FramePacket(seq, frame, start)
+                seq += 1
+                self.stats.frames += 1
+                # In idle mode most frames skip motion detection
+                if self.adaptive is None or self.adaptive.run_motion(captured):
+                    packet.motion_detected, packet.regions = self.motion_detector.detect(frame)
+                    metrics.observe('motion', time.perf_counter() - captured, camera=self.name)
+                    self.motion_score += MOTION_SMOOTHING * (float(packet.motion_detected) - self.motion_score)
+                if self.clip_recorder is not None:
+                    packet.clip = self.clip_recorder.add(frame, packet.motion_detected, start)
+
+                if packet.motion_detected:
+                    self.stats.motion_frames += 1
+                if packet.motion_detected and (self.adaptive is None
+                                               or self.adaptive.should_recognize(captured, packet.regions)):
+                    self.scheduler.submit(self, packet)
+                elif self.on_result is not None:
+                    self.on_result(self, packet)
+
+                if interval:
+                    remaining = interval - (time.perf_counter() - start)
+                    if remaining > 0:
+                        time.sleep(remaining)
+        except Exception as e:
+            print(f"[Error]: Camera {self.name} crashed: {e}")
+            self.stats.last_error = str(e)
+        finally:
+            self.cap.release()
+
+
+# Shared face recognition workers serving many streams
+# recognize_faces works like face_handler.recognize_faces_detailed, and must accept a detector
+# keyword argument if any camera has its own face detector
+# Each stream has at most one pending frame; newer motion frames replace older ones
+class RecognitionScheduler:
+
+    def __init__(self, recognize_faces, workers=None):
+        self.recognize_faces = recognize_faces
+        self.workers = workers or default_face_workers()
+        self._pending = {}
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._threads = []
+
+    def start(self):
+        self._stop = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'recognition-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # Queue a motion frame, replacing the stream's previous frame if it has not started yet
+    def submit(self, stream, packet):
+        with self._cond:
+            if stream in self._pending:
+                stream.stats.dropped_jobs += 1
+            self._pending[stream] = (packet, time.monotonic())
+            self._cond.notify()
+
+    # Forget a stream's pending frame
+    def cancel(self, stream):
+        with self._cond:
+            self._pending.pop(stream, None)
+
+    def queue_depth(self):
+        return len(self._pending)
+
+    # Choose the pending frame with the best priority, motion activity and waiting time
+    # Streams that already have a frame being recognized are skipped to keep their frames in order
+    def _next_job(self):
+        now = time.monotonic()
+        ready = [item for item in self._pending.items() if item[0] not in self._busy]
+        if not ready:
+            return None, None
+
+        def score(item):
+            stream, (_, queued_at) = item
+            return stream.priority + stream.motion_score + AGING_PER_SECOND * (now - queued_at)
+
+        stream, (packet, _) = max(ready, key=score)
+        del self._pending[stream]
+        self._busy.add(stream)
+        return stream, packet
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                stream, packet = None, None
+                while not self._stop:
+                    stream, packet = self._next_job()
+                    if stream is not None:
+                        break
+                    self._cond.wait()
+                if self._stop:
+                    return
+            try:
+                with metrics.timer('faces', camera=stream.name):
+                    if stream.tracker:
+                        result = stream.tracker.recognize_faces_detailed(packet.frame, packet.regions)
+                    elif stream.detector is not None:
+                        result = self.recognize_faces(packet.frame, packet.regions, detector=stream.detector)
+                    else:
+                        result = self.recognize_faces(packet.frame, packet.regions)
+                    packet.frame, packet.face_names, packet.detections = result
+                packet.recognized = True
+                stream.stats.recognized_frames += 1
+                if stream.adaptive is not None:
+                    stream.adaptive.record_result(packet, time.perf_counter())
+            except Exception as e:
+                print(f"[Error]: Face recognition failed for camera {stream.name}: {e}")
+                stream.stats.last_error = str(e)
+                packet = None
+            finally:
+                with self._cond:
+                    self._busy.discard(stream)
+                    self._cond.notify_all()
+            if packet is not None and stream.on_result is not None:
+                stream.on_result(stream, packet)
+
+
+# Opens many camera sources and shares one recognition pool between them
+class CameraManager:
+
+    # tracking gives every camera its own FaceTracker so lingering people are not re-encoded
+    # reconnect reopens devices and stream URLs with backoff when they drop out
+    # clip_options, if set, records motion clips for every camera with these ClipRecorder options
+    # adaptive_options, if set, gives every camera an AdaptiveScheduler with these options. CPU is
+    # measured for the whole process, so a cpu_budget is shared by all cameras
+    # Motion, clip and scheduler settings not given here come from config (a config.Config), with
+    # each camera's profile applied; clips and scheduler can be turned off per camera there.
+    # motion_engine, if set, overrides the configured engine for every camera
+    def __init__(self, recognize_faces, workers=None, tracking=False, motion_engine=None,
+                 reconnect=True, clip_options=None, adaptive_options=None, config=None):
+        self.scheduler = RecognitionScheduler(recognize_faces, workers)
+        self.tracking = tracking
+        self.motion_engine = motion_engine
+        self.reconnect = reconnect
+        self.clip_options = clip_options
+        self.adaptive_options = adaptive_options
+        self.config = config or Config()
+        self.streams = {}
+
+    # Motion detection settings for a camera profile; hot=True keeps only those that can change while running
+    def _motion_settings(self, profile, hot=False):
+        settings = profile.section('motion', hot)
+        if self.motion_engine:
+            settings['engine'] = self.motion_engine
+        return settings
+
+    # Register a camera; source is a device index, video file or stream URL
+    # detector is a face detector spec (e.g. 'haar' or 'haar>hog') for this camera only
+    def add_camera(self, source, name=None, on_result=None, priority=0.0, realtime=False, detector=None):
+        name = name or str(source)
+        if name in self.streams:
+            raise ValueError(f"Camera {name} already exists")
+        face_detector = create_face_detector(detector) if detector else None
+        tracker = FaceTracker(detector=face_detector) if self.tracking else None
+        profile = self.config.for_camera(name)
+        clip_recorder = None
+        if self.clip_options is not None and profile['clips.enabled']:
+            clip_options = profile.section('clips')
+            del clip_options['enabled']
+            clip_options.update(self.clip_options)
+            # Camera names can be URLs; keep clip file names safe
+            safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+            clip_recorder = ClipRecorder(camera=safe_name, **clip_options)
+        adaptive = None
+        if self.adaptive_options is not None and profile['scheduler.enabled']:
+            adaptive_options = profile.section('scheduler')
+            del adaptive_options['enabled']
+            adaptive_options.update(self.adaptive_options)
+            adaptive = AdaptiveScheduler(**adaptive_options)
+        motion_options = self._motion_settings(profile)
+        stream = CameraStream(name, source, self.scheduler, on_result, priority, realtime, tracker,
+                              motion_options.pop('engine'), face_detector, self.reconnect, clip_recorder, adaptive,
+                              motion_options)
+        self.streams[name] = stream
+        return stream
+
+    # Per-camera frame counts and drops plus the scheduler's queue depth, for the metrics exporter
+    def _collect_metrics(self):
+        samples = [('recognition_queue_depth', 'gauge', {}, self.scheduler.queue_depth())]
+        for name, stream in self.streams.items():
+            stats = stream.stats
+            samples.append(('camera_frames', 'counter', {'camera': name}, stats.frames))
+            samples.append(('camera_motion_frames', 'counter', {'camera': name}, stats.motion_frames))
+            samples.append(('camera_recognized_frames', 'counter', {'camera': name}, stats.recognized_frames))
+            samples.append(('camera_dropped_jobs', 'counter', {'camera': name}, stats.dropped_jobs))
+            reconnect = stream.reconnect_stats()
+            if reconnect is not None:
+                samples.append(('camera_reconnects', 'counter', {'camera': name}, reconnect['reconnects']))
+                samples.append(('camera_down', 'gauge', {'camera': name}, int(reconnect['down'])))
+            if stream.adaptive is not None:
+                samples += stream.adaptive.metric_samples(camera=name)
+        return samples
+
+    # Apply hot settings from a reloaded config to every camera, each with its own profile
+    def apply_config(self, config):
+        self.config = config
+        for name, stream in self.streams.items():
+            profile = config.for_camera(name)
+            stream.motion_detector.configure(**self._motion_settings(profile, hot=True))
+            if stream.clip_recorder is not None:
+                stream.clip_recorder.configure(**profile.section('clips', hot=True))
+            if stream.adaptive is not None:
+                stream.adaptive.configure(**profile.section('scheduler', hot=True))
+
+    # Start the scheduler and every registered camera
+    def start(self):
+        metrics.register_collector(('cameras', id(self)), self._collect_metrics)
+        self.scheduler.start()
+        for stream in self.streams.values():
+            if not stream.start():
+                print(f"[ERROR]: Camera {stream.name} could not be started.")
+
+    # Stop a single camera, leaving the others running
+    def stop_camera(self, name):
+        self.streams[name].stop()
+
+    # Stop every camera and the scheduler, then finish the clips in progress
+    def stop(self):
+        for stream in self.streams.values():
+            stream.stop()
+        self.scheduler.stop()
+        for stream in self.streams.values():
+            if stream.clip_recorder is not None:
+                stream.clip_recorder.close()
+        metrics.unregister_collector(('cameras', id(self)))
+
+    @property
+    def running(self):
+        return any(stream.running for stream in self.streams.values())
+
+    # Per-camera stats plus the scheduler's queue depth
+    def stats(self):
+        result = {}
+        for name, stream in self.streams.items():
+            result[name] = stream.stats.as_dict()
+            if stream.tracker is not None:
+                result[name]['tracker'] = stream.tracker.stats()
+            reconnect = stream.reconnect_stats()
+            if reconnect is not None:
+                result[name]['reconnect'] = reconnect
+            if stream.clip_recorder is not None:
+                result[name]['clips'] = stream.clip_recorder.stats()
+            if stream.adaptive is not None:
+                result[name]['scheduler'] = stream.adaptive.stats()
+        result['_scheduler'] = {'queue_depth': self.scheduler.queue_depth(), 'workers': self.scheduler.workers}
+        return result
+
+
+# Run several cameras headlessly and print motion events
+def main():
+    parser = argparse.ArgumentParser(description="Run motion detection and face recognition on many cameras")
+    parser.add_argument('sources', nargs='+', help="Device indices, video files or stream URLs")
+    parser.add_argument('--workers', type=int, default=None, help="Face recognition worker threads")
+    parser.add_argument('--realtime', action='store_true', help="Play video files at their recorded frame rate")
+    parser.add_argument('--motion-engine', default=None, choices=ENGINES,
+                        help=f"Background model (default motion.engine, {DEFAULT_MOTION_ENGINE})")
+    parser.add_argument('--no-reconnect', action='store_true',
+                        help="Stop a device or stream camera when it drops out instead of reopening it")
+    parser.add_argument('--no-tracking', action='store_true', help="Re-encode every face on every motion frame")
+    parser.add_argument('--detector', type=detector_spec, default=None,
+                        help="Face detector for all cameras: hog, haar, yunet, ssd, or a cascade like haar>hog")
+    parser.add_argument('--camera-detector', action='append', default=[], metavar='SOURCE=DETECTOR',
+                        help="Face detector for one camera, overriding --detector")
+    parser.add_argument('--encode-batch-ms', type=float, default=0.0,
+                        help="Encode faces from all cameras in batches, waiting up to this long (0 = off)")
+    parser.add_argument('--encode-batch-size', type=int, default=32, help="Most faces per encoding batch")
+    parser.add_argument('--clips', metavar='DIR', help="Record a video clip of each motion event into this directory")
+    parser.add_argument('--clip-pre', type=float, default=None, help="Seconds recorded before each event")
+    parser.add_argument('--clip-post', type=float, default=None, help="Seconds recorded after each event")
+    parser.add_argument('--clip-memory-mb', type=float, default=None, help="Frame buffer size per camera")
+    parser.add_argument('--clip-storage', choices=STORAGE_MODES, default=None,
+                        help="Keep buffered frames as JPEG (more pre-roll per MB) or raw (less CPU)")
+    parser.add_argument('--no-adaptive', action='store_true',
+                        help="Recognize every motion frame instead of adapting the recognition rate")
+    parser.add_argument('--cpu-budget', type=float, default=None,
+                        help="CPU cores the process should stay under, by recognizing fewer motion frames")
+    parser.add_argument('--latency-slo', type=float, default=None,
+                        help="Seconds from capture to recognized result to stay under")
+    parser.add_argument('--idle-after', type=float, default=None,
+                        help="Seconds without motion before a camera drops to idle mode")
+    parser.add_argument('--stats-interval', type=float, default=None)
+    parser.add_argument('--metrics-file', help="Enable metrics and append a JSON snapshot every stats interval")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    # The tuning flags are shorthands for config settings; --set still overrides them
+    shorthands = {'motion.engine': args.motion_engine, 'clips.directory': args.clips,
+                  'clips.pre_seconds': args.clip_pre, 'clips.post_seconds': args.clip_post,
+                  'clips.memory_mb': args.clip_memory_mb, 'clips.storage': args.clip_storage,
+                  'scheduler.cpu_budget': args.cpu_budget, 'scheduler.latency_slo': args.latency_slo,
+                  'scheduler.idle_after': args.idle_after, 'stats.interval': args.stats_interval}
+    cfg = from_args(args, [f"{key}={value}" for key, value in shorthands.items() if value is not None])
+    camera_source.apply_config(cfg)
+    stats_interval = cfg['stats.interval']
+
+    dumper = None
+    if args.metrics_file:
+        metrics.enable()
+        dumper = metrics.JsonDumper(args.metrics_file, stats_interval).start()
+
+    import face_handler
+    from face_handler import recognize_faces_detailed, close_unknown_face_writer
+    face_handler.apply_config(cfg)
+    if not face_handler.ensure_ready():
+        print("[ERROR]: Face recognition is not available.")
+        return
+    if args.encode_batch_ms > 0:
+        face_handler.enable_encoding_batching(args.encode_batch_ms / 1000, args.encode_batch_size,
+                                              args.workers or default_face_workers())
+
+    # Print each recognized motion frame
+    def on_result(stream, packet):
+        if packet.recognized:
+            print(f"[INFO]: Camera {stream.name} frame {packet.seq}: faces {packet.face_names}")
+
+    camera_detectors = {}
+    for item in args.camera_detector:
+        source, _, spec = item.rpartition('=')
+        if not source:
+            parser.error(f"--camera-detector expects SOURCE=DETECTOR, got {item}")
+        try:
+            camera_detectors[source] = detector_spec(spec)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # Clip and scheduler settings come from the config; these only switch them on or off
+    clip_options = {} if args.clips else None
+    adaptive_options = None if args.no_adaptive else {}
+    manager = CameraManager(recognize_faces_detailed, args.workers, tracking=not args.no_tracking,
+                            reconnect=not args.no_reconnect, clip_options=clip_options,
+                            adaptive_options=adaptive_options, config=cfg)
+    for source in args.sources:
+        manager.add_camera(source, on_result=on_result, realtime=args.realtime,
+                           detector=camera_detectors.get(source, args.detector))
+    manager.start()
+
+    # Apply hot changes to the config file without restarting cameras or reloading known faces
+    def apply_config(new_config, changed):
+        nonlocal stats_interval
+        face_handler.apply_config(new_config)
+        manager.apply_config(new_config)
+        stats_interval = new_config['stats.interval']
+
+    watcher = ConfigWatcher(cfg, apply_config).start()
+    try:
+        last_stats = time.monotonic()
+        while manager.running or manager.scheduler.queue_depth():
+            time.sleep(0.2)
+            if time.monotonic() - last_stats >= stats_interval:
+                print(f"[STATS]: {manager.stats()}")
+                for name, stream in manager.streams.items():
+                    if stream.adaptive is not None:
+                        print(f"[STATS]: {name} scheduler {format_scheduler_stats(stream.adaptive.stats())}")
+                if face_handler.encoding_batcher is not None:
+                    print(f"[STATS]: encoding batches {face_handler.encoding_batcher.stats()}")
+                last_stats = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        manager.stop()
+        face_handler.close_encoding_batcher()
+        close_unknown_face_writer()
+        print(f"[STATS]: {manager.stats()}")
+        if dumper is not None:
+            dumper.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import cv2
+
+import metrics
+
+# The last camera that worked, tried first on the next start
+CAMERA_CACHE_PATH = os.path.join('data', 'cache', 'camera.json')
+# Camera indices probed when there is no cached camera or it stopped working
+PROBE_INDICES = range(5)
+# Seconds to wait for probes before giving up on slow devices
+PROBE_TIMEOUT = 3.0
+
+# Requested capture size and rate, read each time a camera is opened
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
+CAPTURE_FPS = 30
+
+
+# Take the capture size and rate from a config.Config
+def apply_config(config):
+    global CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_FPS
+    CAPTURE_WIDTH = config['camera.width']
+    CAPTURE_HEIGHT = config['camera.height']
+    CAPTURE_FPS = config['camera.fps']
+
+
+# Capture backends to try on this platform, preferred first
+def candidate_backends():
+    if sys.platform.startswith('win'):
+        return [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
+    if sys.platform == 'darwin':
+        return [cv2.CAP_AVFOUNDATION, cv2.CAP_ANY]
+    return [cv2.CAP_V4L2, cv2.CAP_ANY]
+
+
+def backend_name(backend):
+    try:
+        return cv2.videoio_registry.getBackendName(backend)
+    except Exception:
+        return str(backend)
+
+
+def load_cached_camera(path=CAMERA_CACHE_PATH):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return int(data['index']), int(data['backend'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_cached_camera(index, backend, path=CAMERA_CACHE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'index': index, 'backend': backend, 'backend_name': backend_name(backend)}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[Warning]: Failed to cache camera choice in {path}: {e}")
+
+
+# Open a device with one backend and check that it delivers a frame; returns the capture or None
+def try_open(index, backend):
+    cap = cv2.VideoCapture(index, backend)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_HEIGHT)
+    cap.set(cv2.CAP_PROP_FPS, CAPTURE_FPS)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    ret, frame = cap.read()
+    if not ret or frame is None:
+        cap.release()
+        return None
+    return cap
+
+
+# Try each backend on one device, returning (backend, capture) or (None, None)
+def probe(index, backends):
+    for backend in backends:
+        try:
+            cap = try_open(index, backend)
+        except cv2.error:
+            cap = None
+        if cap is not None:
+            return backend, cap
+    return None, None
+
+
+# Probe devices in parallel and return (index, backend, capture) for the lowest working index
+# Probes run on daemon threads, so a driver that hangs costs at most timeout seconds. A
+# capture that opens after discovery has finished is released by its thread.
+def discover_camera(indices=PROBE_INDICES, backends=None, timeout=PROBE_TIMEOUT):
+    backends = backends or candidate_backends()
+    results = queue.Queue()
+    lock = threading.Lock()
+    state = {'closed': False}
+
+    def run(index):
+        backend, cap = probe(index, backends)
+        with lock:
+            if not state['closed']:
+                results.put((index, backend, cap))
+                return
+        if cap is not None:
+            cap.release()
+
+    start = time.perf_counter()
+    for index in indices:
+        threading.Thread(target=run, args=(index,), name=f'camera-probe-{index}', daemon=True).start()
+
+    pending = set(indices)
+    found = {}
+    deadline = start + timeout
+    chosen = None
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        try:
+            index, backend, cap = results.get(timeout=remaining)
+        except queue.Empty:
+            break
+        pending.discard(index)
+        if cap is not None:
+            found[index] = (backend, cap)
+        # Stop as soon as no lower index can still come in
+        working = [i for i in found if all(p > i for p in pending)]
+        if working:
+            chosen = min(working)
+            break
+    if chosen is None and found:
+        chosen = min(found)
+
+    # Release every other camera that opened; probes finishing after this release their own
+    with lock:
+        state['closed'] = True
+    for index, (backend, cap) in found.items():
+        if index != chosen:
+            cap.release()
+    while True:
+        try:
+            index, backend, cap = results.get_nowait()
+        except queue.Empty:
+            break
+        if cap is not None:
+            cap.release()
+
+    elapsed = time.perf_counter() - start
+    metrics.observe('camera_discovery', elapsed)
+    if chosen is None:
+        print(f"[ERROR]: No working camera found ({elapsed:.2f}s).")
+        return None, None, None
+    backend, cap = found[chosen]
+    print(f"[INFO]: Found working camera at index {chosen} with {backend_name(backend)} ({elapsed:.2f}s).")
+    return chosen, backend, cap
+
+
+# Open a camera: the given index, else the cached one, else the first one discovery finds
+# The working index and backend are cached for the next start
+def open_camera(camera_index=None, cache_path=CAMERA_CACHE_PATH):
+    start = time.perf_counter()
+    cached = load_cached_camera(cache_path)
+    if camera_index is not None:
+        # Try the cached backend first if it was recorded for this index
+        backends = candidate_backends()
+        if cached and cached[0] == camera_index:
+            backends = [cached[1]] + [b for b in backends if b != cached[1]]
+        backend, cap = probe(camera_index, backends)
+        if cap is None:
+            print(f"[ERROR]: Failed to open camera at index {camera_index}")
+            return None
+        index = camera_index
+    else:
+        cap = None
+        if cached:
+            index, backend = cached
+            cap = try_open(index, backend)
+        if cap is None:
+            index, backend, cap = discover_camera()
+            if cap is None:
+                return None
+    if cached != (index, backend):
+        save_cached_camera(index, backend, cache_path)
+    print(f"[INFO]: Camera opened successfully at index {index} with {backend_name(backend)} "
+          f"({time.perf_counter() - start:.2f}s).")
+    return cap
+
+
+# Capture source that reopens its camera after read failures instead of ending the stream
+# open_source() returns an opened capture or None; reconnect attempts back off exponentially
+# from initial_backoff to max_backoff seconds. read() blocks while reconnecting and only
+# returns (False, None) after close() or max_attempts failed reconnects in a row.
+class ReconnectingCapture:
+
+    # on_state(state, seconds) is called with 'lost' when reads start failing (seconds = 0)
+    # and 'recovered' when frames come back (seconds = length of the outage)
+    def __init__(self, open_source, cap=None, initial_backoff=0.5, max_backoff=10.0, max_attempts=None,
+                 on_state=None, name='camera'):
+        self.open_source = open_source
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.on_state = on_state
+        self.name = name
+        self.cap = cap
+        self.reconnects = 0
+        self.attempts = 0
+        self.outages = []
+        self.outage_started = None
+        self._stop = threading.Event()
+
+    # Wake a read() that is waiting to reconnect and make it return (False, None)
+    def close(self):
+        self._stop.set()
+
+    def release(self):
+        self.close()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def isOpened(self):
+        return not self._stop.is_set()
+
+    def get(self, prop):
+        return self.cap.get(prop) if self.cap is not None else 0.0
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value) if self.cap is not None else False
+
+    def _notify(self, state, seconds):
+        if self.on_state is not None:
+            try:
+                self.on_state(state, seconds)
+            except Exception as e:
+                print(f"[Warning]: Camera state callback failed: {e}")
+
+    def read(self):
+        while not self._stop.is_set():
+            if self.cap is not None:
+                ret, frame = self.cap.read()
+                if ret and frame is not None:
+                    if self.outage_started is not None:
+                        self._recovered()
+                    return ret, frame
+                self.cap.release()
+                self.cap = None
+                if self.outage_started is None:
+                    self.outage_started = time.monotonic()
+                    print(f"[Warning]: Lost {self.name}, reconnecting...")
+                    metrics.inc('camera_outages', camera=self.name)
+                    self._notify('lost', 0.0)
+            if not self._reconnect():
+                break
+        return False, None
+
+    # Reopen with backoff until it works; False if closed or out of attempts
+    def _reconnect(self):
+        backoff = self.initial_backoff
+        attempts = 0
+        while not self._stop.is_set():
+            if self.max_attempts is not None and attempts >= self.max_attempts:
+                print(f"[ERROR]: Giving up on {self.name} after {attempts} reconnect attempts.")
+                return False
+            attempts += 1
+            self.attempts += 1
+            try:
+                cap = self.open_source()
+            except Exception as e:
+                print(f"[Warning]: Reconnecting {self.name} failed: {e}")
+                cap = None
+            if cap is not None:
+                self.cap = cap
+                self.reconnects += 1
+                return True
+            if self._stop.wait(backoff):
+                return False
+            backoff = min(backoff * 2, self.max_backoff)
+        return False
+
+    def _recovered(self):
+        seconds = time.monotonic() - self.outage_started
+        self.outage_started = None
+        self.outages.append(seconds)
+        metrics.observe('camera_recovery', seconds, camera=self.name)
+        print(f"[INFO]: {self.name} recovered after {seconds:.2f}s.")
+        self._notify('recovered', seconds)
+
+    # Reconnects and outage-to-recovery times
+    def stats(self):
+        outages = self.outages
+        return {
+            'reconnects': self.reconnects,
+            'reconnect_attempts': self.attempts,
+            'outages': len(outages) + (self.outage_started is not None),
+            'down': self.outage_started is not None,
+            'last_recovery_s': round(outages[-1], 3) if outages else None,
+            'mean_recovery_s': round(sum(outages) / len(outages), 3) if outages else None,
+            'max_recovery_s': round(max(outages), 3) if outages else None,
+            'downtime_s': round(sum(outages) + (time.monotonic() - self.outage_started
+                                                if self.outage_started is not None else 0.0), 3),
+        }
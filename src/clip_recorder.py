@@ -0,0 +1,440 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import cv2
+import numpy as np
+
+import metrics
+
+# How frames wait in memory for a clip: 'jpeg' (compressed, several times more pre-roll per MB)
+# or 'raw' (no compression cost, but a 640x480 frame takes 0.9 MB)
+STORAGE_MODES = ('jpeg', 'raw')
+# Raw frames waiting for the compressor thread in 'jpeg' mode, using at most STAGING_SHARE of
+# memory_mb (but always room for two frames); the JPEG ring gets the rest of the budget
+STAGING_FRAMES = 8
+STAGING_SHARE = 0.25
+
+
+# Ring of raw frames in one preallocated array; each new frame overwrites the oldest
+# Frames are numbered in the order they were added; only the newest slots frames can be read
+class RawFrameRing:
+
+    def __init__(self, memory_bytes, max_slots=None):
+        self.memory_bytes = memory_bytes
+        self.max_slots = max_slots
+        self.frames = None
+        self.times = None
+        self.slots = 0
+        self.next_seq = 0
+        self._valid_from = 0
+
+    # Size the ring for frames of this shape; stored frames are forgotten
+    def _allocate(self, frame):
+        slots = max(2, self.memory_bytes // frame.nbytes)
+        if self.max_slots:
+            slots = min(slots, self.max_slots)
+        self.frames = None
+        self.frames = np.empty((slots,) + frame.shape, frame.dtype)
+        self.times = np.zeros(slots)
+        self.slots = slots
+        self._valid_from = self.next_seq
+
+    @property
+    def first_seq(self):
+        return max(self._valid_from, self.next_seq - self.slots)
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes if self.frames is not None else 0
+
+    def put(self, frame, t):
+        if self.frames is None or self.frames.shape[1:] != frame.shape or self.frames.dtype != frame.dtype:
+            self._allocate(frame)
+        slot = self.next_seq % self.slots
+        np.copyto(self.frames[slot], frame)
+        self.times[slot] = t
+        self.next_seq += 1
+        return self.next_seq - 1
+
+    def time_of(self, seq):
+        return self.times[seq % self.slots]
+
+    def read(self, seq):
+        return self.frames[seq % self.slots].copy()
+
+
+# Ring of JPEG-compressed frames packed into one byte buffer, allocated on the first put
+# A new frame evicts the oldest frames until it fits, so the buffer never grows
+# capacity may be lowered until then, e.g. once the size of the frames is known
+class JpegRing:
+
+    def __init__(self, memory_bytes):
+        self.capacity = memory_bytes
+        self.buffer = None
+        # (time, offset, length) per stored frame, oldest first
+        self.entries = deque()
+        self.head = 0
+        self.next_seq = 0
+
+    @property
+    def first_seq(self):
+        return self.next_seq - len(self.entries)
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes if self.buffer is not None else 0
+
+    def _overlaps_oldest(self, start, end):
+        _, offset, length = self.entries[0]
+        return offset < end and offset + length > start
+
+    # Store one encoded frame; returns its number, or None if it is larger than the whole buffer
+    def put(self, data, t):
+        length = len(data)
+        if length > self.capacity:
+            return None
+        if self.buffer is None:
+            self.buffer = np.empty(self.capacity, np.uint8)
+        start = self.head
+        if start + length > self.capacity:
+            # Not enough room before the end: wrap around, dropping the frames stored past the head
+            while self.entries and self.entries[0][1] >= start:
+                self.entries.popleft()
+            start = 0
+        while self.entries and self._overlaps_oldest(start, start + length):
+            self.entries.popleft()
+        self.buffer[start:start + length] = data
+        self.entries.append((t, start, length))
+        self.head = start + length
+        self.next_seq += 1
+        return self.next_seq - 1
+
+    def time_of(self, seq):
+        return self.entries[seq - self.first_seq][0]
+
+    def read(self, seq):
+        _, offset, length = self.entries[seq - self.first_seq]
+        return self.buffer[offset:offset + length].copy()
+
+
+class _Clip:
+    __slots__ = ('path', 'start', 'end', 'limit', 'events', 'done')
+
+    def __init__(self, path, start, end, limit):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.limit = limit
+        self.events = 1
+        # Set by the writer once it has passed the end, after which the clip can no longer be extended
+        self.done = False
+
+
+# Records video clips around motion events from a fixed-size in-memory frame buffer
+# Every frame goes through add(). A motion frame opens a clip running from pre_seconds before it
+# to post_seconds after it; motion while a clip is open extends it, so overlapping events end up
+# in one clip of at most max_clip_seconds. Clips are encoded on a background thread that reads
+# from the ring buffer; if it falls a whole buffer behind, the frames it missed are skipped
+# rather than queued, so memory stays at memory_mb however many events there are.
+# The clip directory is kept under max_bytes by deleting the oldest clips first.
+class ClipRecorder:
+
+    def __init__(self, directory, camera='camera', pre_seconds=5.0, post_seconds=5.0, max_clip_seconds=120.0,
+                 memory_mb=64, storage='jpeg', jpeg_quality=80, fps=None, codec='mp4v', extension='.mp4',
+                 max_bytes=2 * 1024 ** 3):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown clip storage '{storage}', expected one of {', '.join(STORAGE_MODES)}")
+        self.directory = directory
+        self.camera = camera
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_clip_seconds = max(max_clip_seconds, pre_seconds + post_seconds)
+        self.storage = storage
+        self.jpeg_quality = jpeg_quality
+        self.fps = fps
+        self.codec = codec
+        self.extension = extension
+        self.max_bytes = max_bytes
+
+        memory_bytes = int(memory_mb * 1024 * 1024)
+        self.memory_bytes = memory_bytes
+        if storage == 'jpeg':
+            self.store = JpegRing(memory_bytes)
+            self.staging = RawFrameRing(int(memory_bytes * STAGING_SHARE), max_slots=STAGING_FRAMES)
+        else:
+            self.store = RawFrameRing(memory_bytes)
+            self.staging = None
+
+        self.frames = 0
+        self.clips = 0
+        self.events = 0
+        self.frames_written = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self.evicted = 0
+        self.disk_bytes = 0
+
+        self._clips = deque()
+        self._last_clip = None
+        self._compressed = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._files = deque()
+        self._threads = [threading.Thread(target=self._write_loop, name=f'clip-writer-{camera}', daemon=True)]
+        if self.staging is not None:
+            self._threads.append(threading.Thread(target=self._compress_loop, name=f'clip-compressor-{camera}',
+                                                  daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    # Change the clip window and disk quota while recording; the open clip keeps its window
+    # None leaves pre_seconds or post_seconds as they are, but max_bytes=None removes the quota
+    def configure(self, pre_seconds=None, post_seconds=None, max_bytes=None):
+        with self._cond:
+            if pre_seconds is not None:
+                self.pre_seconds = pre_seconds
+            if post_seconds is not None:
+                self.post_seconds = post_seconds
+            self.max_clip_seconds = max(self.max_clip_seconds, self.pre_seconds + self.post_seconds)
+            self.max_bytes = max_bytes
+
+    # Buffer a frame; timestamp is a time.perf_counter() value such as FramePacket.captured_at
+    # Returns the path of the clip a motion frame will be saved in, otherwise None
+    # The frame is copied, so the caller may draw on it afterwards
+    def add(self, frame, motion=False, timestamp=None):
+        t = time.perf_counter() if timestamp is None else timestamp
+        with self._cond:
+            if self._closed:
+                return None
+            # Extend or open the clip before storing the frame, so the writer never ends a clip
+            # on a frame that should have extended it
+            clip = self._clip_for(t) if motion else None
+            (self.staging or self.store).put(frame, t)
+            if self.staging is not None and self.store.buffer is None:
+                # The staging frames count against memory_mb; keep at least a quarter for the JPEG ring
+                self.store.capacity = max(self.memory_bytes // 4, self.memory_bytes - self.staging.nbytes)
+            self.frames += 1
+            self._cond.notify_all()
+        return clip.path if clip is not None else None
+
+    def _clip_path(self, t):
+        wall = time.time() - (time.perf_counter() - t)
+        stamp = datetime.fromtimestamp(wall).strftime("%Y-%m-%d_%H-%M-%S")
+        path = os.path.join(self.directory, f"{self.camera}_{stamp}{self.extension}")
+        suffix = 1
+        while self._last_clip is not None and path == self._last_clip.path:
+            path = os.path.join(self.directory, f"{self.camera}_{stamp}_{suffix}{self.extension}")
+            suffix += 1
+        return path
+
+    # The clip a motion frame at time t belongs to, merging it into the open clip if their windows overlap
+    def _clip_for(self, t):
+        self.events += 1
+        clip = self._last_clip
+        if clip is not None and not clip.done and t - self.pre_seconds <= clip.end and t < clip.limit:
+            clip.end = min(max(clip.end, t + self.post_seconds), clip.limit)
+            clip.events += 1
+            return clip
+        start = t - self.pre_seconds
+        if clip is not None:
+            # Do not repeat frames that are already in the previous clip
+            start = max(start, clip.end)
+        clip = _Clip(self._clip_path(t), start, min(t + self.post_seconds, start + self.max_clip_seconds),
+                     start + self.max_clip_seconds)
+        self._clips.append(clip)
+        self._last_clip = clip
+        self.clips += 1
+        return clip
+
+    # No more frames will reach the store
+    def _drained(self):
+        return self._closed and (self.staging is None or self._compressed >= self.staging.next_seq)
+
+    # Move staged raw frames into the JPEG ring, off the thread that calls add()
+    def _compress_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            with self._cond:
+                while self._compressed >= self.staging.next_seq and not self._closed:
+                    self._cond.wait()
+                if self._compressed >= self.staging.next_seq:
+                    self._cond.notify_all()
+                    return
+                first = self.staging.first_seq
+                if self._compressed < first:
+                    self.dropped += first - self._compressed
+                    metrics.inc('clip_frames_dropped', first - self._compressed, camera=self.camera)
+                    self._compressed = first
+                seq = self._compressed
+                t = self.staging.time_of(seq)
+                frame = self.staging.read(seq)
+            ok, data = cv2.imencode('.jpg', frame, params)
+            with self._cond:
+                self._compressed = seq + 1
+                if not ok or self.store.put(data.reshape(-1), t) is None:
+                    self.dropped += 1
+                self._cond.notify_all()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._clips and not self._closed:
+                    self._cond.wait()
+                if not self._clips:
+                    return
+                clip = self._clips[0]
+            self._write_clip(clip)
+            with self._cond:
+                clip.done = True
+                self._clips.popleft()
+
+    # First stored frame at or after time t
+    def _find(self, t):
+        seq = self.store.first_seq
+        while seq < self.store.next_seq and self.store.time_of(seq) < t:
+            seq += 1
+        return seq
+
+    # Frame rate to write clips at: the configured one, else the rate frames have been arriving at
+    def _clip_fps(self):
+        if self.fps:
+            return self.fps
+        first, last = max(self.store.first_seq, self.store.next_seq - 60), self.store.next_seq - 1
+        if last > first:
+            span = self.store.time_of(last) - self.store.time_of(first)
+            if span > 0:
+                return min(60.0, max(1.0, (last - first) / span))
+        return 30.0
+
+    # Encode one clip, following the ring buffer until a frame past the clip's end arrives
+    def _write_clip(self, clip):
+        base, extension = os.path.splitext(clip.path)
+        tmp_path = base + '.part' + extension
+        writer = None
+        size = None
+        written = 0
+        seq = None
+        start = time.perf_counter()
+        try:
+            while True:
+                with self._cond:
+                    if seq is None:
+                        seq = self._find(clip.start)
+                    while seq >= self.store.next_seq and not self._drained():
+                        self._cond.wait()
+                    if seq >= self.store.next_seq:
+                        clip.done = True
+                        break
+                    first = self.store.first_seq
+                    if seq < first:
+                        self.skipped += first - seq
+                        seq = first
+                    t = self.store.time_of(seq)
+                    if t > clip.end:
+                        clip.done = True
+                        break
+                    data = self.store.read(seq)
+                    seq += 1
+                    if writer is None:
+                        fps = self._clip_fps()
+                frame = cv2.imdecode(data, cv2.IMREAD_COLOR) if self.staging is not None else data
+                if frame is None:
+                    continue
+                if writer is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    size = (frame.shape[1], frame.shape[0])
+                    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*self.codec), fps, size)
+                    if not writer.isOpened():
+                        raise RuntimeError(f"Could not open a {self.codec} video writer for {tmp_path}")
+                elif (frame.shape[1], frame.shape[0]) != size:
+                    # The camera came back at a different resolution
+                    frame = cv2.resize(frame, size)
+                writer.write(frame)
+                written += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"[Error]: Failed to record clip {clip.path}: {e}")
+            written = 0
+        finally:
+            if writer is not None:
+                writer.release()
+        if not written:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        try:
+            os.replace(tmp_path, clip.path)
+        except OSError as e:
+            self.failed += 1
+            print(f"[Error]: Failed to save clip {clip.path}: {e}")
+            return
+        self.frames_written += written
+        metrics.observe('clip_write', time.perf_counter() - start, camera=self.camera)
+        metrics.inc('clips_written', camera=self.camera)
+        print(f"[INFO]: Saved {written / fps:.1f}s clip of {clip.events} motion event(s) to {clip.path}.")
+        self._track_file(clip.path)
+
+    # Add a new clip to the quota, scanning clips from earlier runs the first time
+    def _track_file(self, path):
+        if not self._files and not self.disk_bytes:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if (entry.is_file() and entry.name.endswith(self.extension) and '.part' not in entry.name
+                        and entry.path != path):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+            for _, old_path, old_size in sorted(entries):
+                self._files.append((old_path, old_size))
+                self.disk_bytes += old_size
+        size = os.path.getsize(path)
+        self._files.append((path, size))
+        self.disk_bytes += size
+        while self.max_bytes is not None and self.disk_bytes > self.max_bytes and len(self._files) > 1:
+            old_path, old_size = self._files.popleft()
+            self.disk_bytes -= old_size
+            try:
+                os.remove(old_path)
+                self.evicted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[Warning]: Failed to remove old clip {old_path}: {e}")
+
+    # Finish the clips in progress with the frames already buffered and stop the threads
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in reversed(self._threads):
+            thread.join(timeout)
+
+    # Seconds of video currently buffered, i.e. the longest pre-roll a new clip can get
+    def buffered_seconds(self):
+        with self._cond:
+            if self.store.next_seq - self.store.first_seq < 2:
+                return 0.0
+            return float(self.store.time_of(self.store.next_seq - 1) - self.store.time_of(self.store.first_seq))
+
+    # Clip counts, frames skipped by a lagging writer or compressor, and buffer memory
+    def stats(self):
+        buffered = self.buffered_seconds()
+        with self._cond:
+            memory = self.store.nbytes + (self.staging.nbytes if self.staging is not None else 0)
+            return {
+                'frames': self.frames,
+                'events': self.events,
+                'clips': self.clips,
+                'pending_clips': len(self._clips),
+                'frames_written': self.frames_written,
+                'skipped': self.skipped,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'evicted': self.evicted,
+                'buffered_frames': self.store.next_seq - self.store.first_seq,
+                'buffered_seconds': round(buffered, 2),
+                'memory_bytes': memory,
+                'disk_bytes': self.disk_bytes,
+            }
@@ -0,0 +1,435 @@
+import os
+import sys
+import json
+import argparse
+import threading
+
+from background import ENGINES
+from clip_recorder import STORAGE_MODES
+from face_detectors import detector_spec, DEFAULT_DETECTOR
+
+# Settings are read from this JSON file unless another one is given with --config or MOTION_CONFIG
+CONFIG_PATH = 'config.json'
+# Environment overrides are named MOTION_<SECTION>_<NAME>, e.g. MOTION_MOTION_THRESHOLD=40
+ENV_PREFIX = 'MOTION_'
+# Seconds between checks of the config file for changes
+WATCH_INTERVAL = 2.0
+# Sections that may be overridden per camera under "cameras" in the config file
+PROFILE_SECTIONS = ('motion', 'clips', 'scheduler')
+
+TRUE_WORDS = ('1', 'true', 'yes', 'on')
+FALSE_WORDS = ('0', 'false', 'no', 'off')
+
+
+def odd(value):
+    if value % 2 == 0:
+        raise ValueError("must be odd")
+
+
+# One typed setting; hot settings are applied to a running pipeline when the config file changes,
+# the others only when detection is restarted
+class Setting:
+    __slots__ = ('default', 'kind', 'hot', 'choices', 'minimum', 'optional', 'check', 'help')
+
+    def __init__(self, default, kind, hot=False, choices=None, minimum=None, optional=False, check=None, help=''):
+        self.default = default
+        self.kind = kind
+        self.hot = hot
+        self.choices = choices
+        self.minimum = minimum
+        self.optional = optional
+        self.check = check
+        self.help = help
+
+    # Convert a JSON value or an environment/command-line string to the setting's type
+    def parse(self, value):
+        if isinstance(value, str) and self.optional and value.strip().lower() in ('', 'none', 'null'):
+            return None
+        if isinstance(value, str) and self.kind is not str:
+            text = value.strip().lower()
+            if self.kind is bool:
+                if text not in TRUE_WORDS + FALSE_WORDS:
+                    raise ValueError(f"expected one of {', '.join(TRUE_WORDS + FALSE_WORDS)}, got '{value}'")
+                return text in TRUE_WORDS
+            try:
+                value = float(text)
+            except ValueError:
+                raise ValueError(f"expected a number, got '{value}'") from None
+        if value is None:
+            if not self.optional:
+                raise ValueError("may not be null")
+            return None
+        if self.kind is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"expected true or false, got {value!r}")
+        elif self.kind is float:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"expected a number, got {value!r}")
+            value = float(value)
+        elif self.kind is int:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                raise ValueError(f"expected an integer, got {value!r}")
+            value = int(value)
+        elif not isinstance(value, self.kind):
+            raise ValueError(f"expected {self.kind.__name__}, got {value!r}")
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"expected one of {', '.join(map(str, self.choices))}, got {value!r}")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"must be at least {self.minimum}, got {value}")
+        if self.check is not None:
+            self.check(value)
+        return value
+
+
+# Every tunable setting, keyed 'section.name'
+SETTINGS = {
+    'camera.name': Setting('camera0', str, help="Camera name recorded with each event"),
+    'camera.width': Setting(640, int, minimum=1, help="Requested capture width"),
+    'camera.height': Setting(480, int, minimum=1, help="Requested capture height"),
+    'camera.fps': Setting(30, int, minimum=1, help="Requested capture frame rate"),
+    'camera.reconnect_backoff': Setting(0.5, float, hot=True, minimum=0,
+                                        help="Seconds to wait after the first failed reconnect"),
+    'camera.reconnect_max_backoff': Setting(10.0, float, hot=True, minimum=0,
+                                            help="Longest wait between reconnect attempts"),
+
+    'motion.engine': Setting('running_average', str, hot=True, choices=ENGINES, help="Background model"),
+    'motion.threshold': Setting(None, int, hot=True, minimum=0, optional=True,
+                                help="Pixel difference that counts as motion (null for the engine's default)"),
+    'motion.blur_size': Setting(21, int, hot=True, minimum=1, check=odd, help="Gaussian blur kernel size"),
+    'motion.min_area': Setting(1000, int, hot=True, minimum=0, help="Smallest motion region in pixels"),
+    'motion.dilate_iterations': Setting(2, int, hot=True, minimum=0, help="Dilation passes on the motion mask"),
+
+    'recognition.tolerance': Setting(0.4, float, hot=True, minimum=0, help="Largest face distance for a match"),
+    'recognition.detector': Setting(DEFAULT_DETECTOR, str, hot=True, check=detector_spec,
+                                    help="Face detector: hog, haar, yunet, ssd or a cascade like haar>hog"),
+    'recognition.roi_mode': Setting(True, bool, hot=True, help="Only look for faces inside motion regions"),
+    'recognition.roi_scale': Setting(0.5, float, hot=True, minimum=0.05, help="Downscale of motion regions"),
+    'recognition.roi_padding': Setting(0.25, float, hot=True, minimum=0, help="Padding around motion regions"),
+    'recognition.min_detection_size': Setting(40, int, hot=True, minimum=1,
+                                              help="Smallest region (in detection pixels) searched for faces"),
+    'recognition.backend': Setting('threads', str, choices=('threads', 'processes'),
+                                   help="Run recognition on threads or worker processes"),
+    'recognition.tracking': Setting(True, bool, help="Track faces between frames instead of re-encoding them"),
+
+    'events.log_path': Setting('motion_log.csv', str, help="Event log (.csv, .jsonl or .db)"),
+    'events.flush_size': Setting(10, int, hot=True, minimum=1, help="Events buffered before a write"),
+    'events.flush_interval': Setting(5.0, float, hot=True, minimum=0, help="Seconds before buffered events are written"),
+    'events.recent': Setting(100, int, minimum=0, help="Recent events kept in memory"),
+
+    'paths.known_faces': Setting(os.path.join('data', 'known_faces'), str, help="Known face images"),
+    'paths.unknown_faces': Setting(os.path.join('data', 'unknown_faces'), str, help="Unknown face crops"),
+    'paths.thresholds': Setting(None, str, optional=True,
+                                help="Per-identity thresholds (null for thresholds.json in the known faces directory)"),
+    'paths.encoding_cache': Setting(os.path.join('data', 'cache', 'known_faces.npz'), str,
+                                    help="Cache of known face encodings"),
+    'paths.gallery_index': Setting(os.path.join('data', 'cache', 'gallery_index.npz'), str,
+                                   help="Cache of the approximate gallery index"),
+
+    'unknown_faces.dedup_distance': Setting(0.5, float, hot=True, minimum=0,
+                                            help="Crops this close to a recent one are skipped"),
+    'unknown_faces.cooldown': Setting(30.0, float, hot=True, minimum=0, help="Seconds a saved crop suppresses repeats"),
+    'unknown_faces.max_bytes': Setting(500 * 1024 * 1024, int, hot=True, minimum=0, optional=True,
+                                       help="Size of the unknown faces directory before old crops are deleted"),
+
+    'clips.enabled': Setting(True, bool, help="Record a video clip of each motion event"),
+    'clips.directory': Setting(os.path.join('data', 'clips'), str, help="Clip directory"),
+    'clips.pre_seconds': Setting(5.0, float, hot=True, minimum=0, help="Seconds recorded before each event"),
+    'clips.post_seconds': Setting(5.0, float, hot=True, minimum=0, help="Seconds recorded after each event"),
+    'clips.memory_mb': Setting(64.0, float, minimum=1, help="Frame buffer size"),
+    'clips.storage': Setting('jpeg', str, choices=STORAGE_MODES, help="Buffer frames as jpeg or raw"),
+    'clips.max_bytes': Setting(2 * 1024 ** 3, int, hot=True, minimum=0, optional=True,
+                               help="Size of the clip directory before old clips are deleted"),
+
+    'scheduler.enabled': Setting(True, bool, help="Adapt the recognition rate to activity and load"),
+    'scheduler.cpu_budget': Setting(None, float, hot=True, minimum=0, optional=True, help="CPU cores to stay under"),
+    'scheduler.latency_slo': Setting(0.5, float, hot=True, minimum=0, optional=True,
+                                     help="Seconds from capture to recognized result to stay under"),
+    'scheduler.max_stride': Setting(8, int, hot=True, minimum=1, help="Most motion frames per recognized frame"),
+    'scheduler.idle_after': Setting(30.0, float, hot=True, minimum=0, help="Seconds without motion before idling"),
+    'scheduler.idle_fps': Setting(2.0, float, hot=True, minimum=0.1, help="Motion detection rate while idle"),
+
+    'stats.interval': Setting(10.0, float, hot=True, minimum=0.1, help="Seconds between stats log lines"),
+}
+
+
+def env_name(key):
+    return ENV_PREFIX + key.replace('.', '_').upper()
+
+
+# Validate one setting, naming it and where it came from in the error
+def parse_setting(key, value, source):
+    setting = SETTINGS.get(key)
+    if setting is None:
+        raise ValueError(f"{source}: unknown setting '{key}'")
+    try:
+        return setting.parse(value)
+    except ValueError as e:
+        raise ValueError(f"{source}: {key} {e}") from None
+
+
+# Parse a 'section.name=value' or 'cameras.NAME.section.name=value' override
+# Returns (camera or None, key, value string)
+def parse_override(text):
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise ValueError(f"Expected SECTION.NAME=VALUE, got '{text}'")
+    key = key.strip()
+    if key.startswith('cameras.'):
+        # Camera names may contain dots, e.g. stream URLs, so the key is the last two parts
+        parts = key[len('cameras.'):].rsplit('.', 2)
+        if len(parts) != 3 or not parts[0]:
+            raise ValueError(f"Expected cameras.NAME.SECTION.NAME=VALUE, got '{text}'")
+        return parts[0], parts[1] + '.' + parts[2], value
+    return None, key, value
+
+
+def check_profile_key(camera, key, source):
+    if key.split('.')[0] not in PROFILE_SECTIONS:
+        raise ValueError(f"{source}: {key} cannot be set per camera (cameras.{camera}); "
+                         f"only {', '.join(PROFILE_SECTIONS)} settings can")
+
+
+# Effective settings: defaults, then the config file, then the environment, then command-line overrides
+# profiles hold per-camera overrides on top of those; for_camera() merges them in
+class Config:
+
+    def __init__(self, values=None, profiles=None, path=None, overrides=()):
+        self.values = {key: setting.default for key, setting in SETTINGS.items()}
+        self.values.update(values or {})
+        self.profiles = profiles or {}
+        self.path = path
+        self.overrides = tuple(overrides)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    # Settings of one section as a dict without the section prefix; hot=True keeps only hot settings
+    def section(self, name, hot=False):
+        prefix = name + '.'
+        return {key[len(prefix):]: value for key, value in self.values.items()
+                if key.startswith(prefix) and (not hot or SETTINGS[key].hot)}
+
+    # Settings for one camera, with its profile applied
+    def for_camera(self, name):
+        profile = self.profiles.get(name)
+        if not profile:
+            return self
+        return Config(dict(self.values, **profile), path=self.path, overrides=self.overrides)
+
+    # Keys whose value differs from other's, in the base settings or any camera's profile
+    def changed(self, other):
+        cameras = [None] + sorted(set(self.profiles) | set(other.profiles))
+        keys = set()
+        for camera in cameras:
+            mine = self.for_camera(camera).values if camera else self.values
+            theirs = other.for_camera(camera).values if camera else other.values
+            keys.update(key for key in SETTINGS if mine[key] != theirs[key])
+        return keys
+
+    # This config with the hot settings of new and the restart-only settings kept as they are
+    def with_hot(self, new):
+        values = {key: (new.values if setting.hot else self.values)[key] for key, setting in SETTINGS.items()}
+        profiles = {}
+        for camera in set(self.profiles) | set(new.profiles):
+            old_profile = self.profiles.get(camera, {})
+            new_profile = new.profiles.get(camera, {})
+            profile = {key: value for key, value in old_profile.items() if not SETTINGS[key].hot}
+            profile.update((key, value) for key, value in new_profile.items() if SETTINGS[key].hot)
+            if profile:
+                profiles[camera] = profile
+        return Config(values, profiles, new.path, new.overrides)
+
+    # Nested dict in the config file's layout
+    def as_dict(self):
+        result = {}
+        for key, value in self.values.items():
+            section, name = key.split('.')
+            result.setdefault(section, {})[name] = value
+        if self.profiles:
+            result['cameras'] = {}
+            for camera, profile in sorted(self.profiles.items()):
+                sections = result['cameras'][camera] = {}
+                for key, value in sorted(profile.items()):
+                    section, name = key.split('.')
+                    sections.setdefault(section, {})[name] = value
+        return result
+
+
+# Flatten a {"section": {"name": value}} dict into validated 'section.name' values
+def flatten_sections(data, source):
+    if not isinstance(data, dict):
+        raise ValueError(f"{source}: expected an object of sections")
+    values = {}
+    for section, names in data.items():
+        if not isinstance(names, dict):
+            raise ValueError(f"{source}: section '{section}' should be an object")
+        for name, value in names.items():
+            key = f"{section}.{name}"
+            values[key] = parse_setting(key, value, source)
+    return values
+
+
+# Load settings from a JSON file (missing is fine), the environment and 'section.name=value' overrides
+# Raises ValueError naming the offending setting if anything is invalid
+def load_config(path=None, overrides=(), environ=None):
+    environ = os.environ if environ is None else environ
+    path = path or environ.get(ENV_PREFIX + 'CONFIG') or CONFIG_PATH
+    values = {}
+    profiles = {}
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"{path}: {e}") from None
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: expected a JSON object")
+        cameras = data.pop('cameras', {})
+        values.update(flatten_sections(data, path))
+        if not isinstance(cameras, dict):
+            raise ValueError(f"{path}: 'cameras' should map camera names to settings")
+        for camera, sections in cameras.items():
+            profile = flatten_sections(sections, f"{path}: cameras.{camera}")
+            for key in profile:
+                check_profile_key(camera, key, path)
+            profiles[str(camera)] = profile
+
+    for key in SETTINGS:
+        name = env_name(key)
+        if name in environ:
+            values[key] = parse_setting(key, environ[name], name)
+
+    for text in overrides:
+        camera, key, value = parse_override(text)
+        value = parse_setting(key, value, '--set')
+        if camera is None:
+            values[key] = value
+        else:
+            check_profile_key(camera, key, '--set')
+            profiles.setdefault(camera, {})[key] = value
+    return Config(values, profiles, path, overrides)
+
+
+# Add --config and --set to a command's arguments
+def add_arguments(parser):
+    parser.add_argument('--config', metavar='FILE',
+                        help=f"JSON settings file, watched for changes (default {CONFIG_PATH} or ${ENV_PREFIX}CONFIG)")
+    parser.add_argument('--set', dest='settings', action='append', default=[], metavar='SECTION.NAME=VALUE',
+                        help="Override a setting, or one camera's with cameras.NAME.SECTION.NAME=VALUE")
+
+
+# Load the config for parsed --config/--set arguments; flags are 'section.name=value' overrides
+# from a command's own shorthand options, applied before --set
+def from_args(args, flags=()):
+    try:
+        return load_config(args.config, list(flags) + list(args.settings))
+    except ValueError as e:
+        print(f"[ERROR]: Invalid configuration: {e}")
+        sys.exit(2)
+
+
+# Polls the config file and reloads it when it changes
+# on_change(config, changed) gets the reloaded config with only its hot settings changed, and
+# the keys that changed. Restart-only changes are reported and wait for the next start; an
+# invalid file is reported and the previous settings stay in effect.
+class ConfigWatcher:
+
+    def __init__(self, config, on_change, interval=WATCH_INTERVAL):
+        self.config = config
+        self.on_change = on_change
+        self.interval = interval
+        self.reloads = 0
+        self.errors = 0
+        # Last version of the file as loaded, including restart-only changes not yet applied
+        self._loaded = config
+        self._signature = self._stat()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.config.path)
+            return st.st_mtime_ns, st.st_size
+        except (OSError, TypeError):
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    # Reload if the file changed (or always with force) and apply hot changes; returns the applied keys
+    def check(self, force=False):
+        with self._lock:
+            signature = self._stat()
+            if signature == self._signature and not force:
+                return []
+            self._signature = signature
+            try:
+                loaded = load_config(self.config.path, self.config.overrides)
+            except ValueError as e:
+                self.errors += 1
+                print(f"[Warning]: Ignoring config change, keeping the current settings: {e}")
+                return []
+            pending = sorted(key for key in loaded.changed(self._loaded) if not SETTINGS[key].hot)
+            self._loaded = loaded
+            if pending:
+                print(f"[Warning]: {', '.join(pending)} changed in {self.config.path}; "
+                      f"restart detection to apply.")
+            config = self.config.with_hot(loaded)
+            changed = sorted(config.changed(self.config))
+            if not changed:
+                return []
+            self.config = config
+            self.reloads += 1
+        print(f"[INFO]: Applying config changes: {', '.join(changed)}")
+        try:
+            self.on_change(config, changed)
+        except Exception as e:
+            self.errors += 1
+            print(f"[Error]: Failed to apply config changes: {e}")
+        return changed
+
+
+# Show the effective settings, or write them out as a starting config file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the effective settings after the config file, "
+                                                 "environment and overrides")
+    add_arguments(parser)
+    parser.add_argument('--camera', help="Show the settings for this camera's profile")
+    parser.add_argument('--write', metavar='FILE', help="Write the effective settings to a config file")
+    parser.add_argument('--list', action='store_true', help="List every setting with its type and description")
+    args = parser.parse_args()
+
+    if args.list:
+        for key, setting in SETTINGS.items():
+            kind = setting.kind.__name__ + (' or null' if setting.optional else '')
+            reload = 'hot' if setting.hot else 'restart'
+            print(f"{key:32} {kind:14} {reload:8} {setting.help} (default {setting.default!r}, {env_name(key)})")
+        sys.exit(0)
+
+    config = from_args(args)
+    if args.camera:
+        config = config.for_camera(args.camera)
+    text = json.dumps(config.as_dict(), indent=2)
+    if args.write:
+        tmp_path = args.write + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text + '\n')
+        os.replace(tmp_path, args.write)
+        print(f"[INFO]: Wrote settings to {args.write}")
+    else:
+        print(text)
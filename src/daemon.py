@@ -0,0 +1,393 @@
+import json
+import time
+import base64
+import signal
+import asyncio
+import hashlib
+import argparse
+import threading
+import contextlib
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+import cv2
+
+import main
+import config
+import metrics
+import startup
+
+# Preview frames per second sent to viewers, independent of the detection frame rate
+PREVIEW_FPS = 15
+PREVIEW_JPEG_QUALITY = 80
+# Number of recent motion events served by /events
+RECENT_EVENTS = 200
+# Messages a slow WebSocket viewer may fall behind before the oldest are dropped
+VIEWER_QUEUE_SIZE = 100
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+INDEX_HTML = b"""<!doctype html>
+<html><head><title>Motion Detection</title></head>
+<body style="background:#0a0e27;color:#8892b0;font-family:sans-serif">
+<h2 style="color:#00d9ff">Motion Detection</h2>
+<p><button onclick="fetch('/start',{method:'POST'})">Start</button>
+<button onclick="fetch('/stop',{method:'POST'})">Stop</button> <span id="status"></span></p>
+<img src="/stream.mjpg" style="max-width:100%">
+<script>
+setInterval(() => fetch('/status').then(r => r.json()).then(s => {
+  document.getElementById('status').textContent = s.status;
+}), 1000);
+</script>
+</body></html>
+"""
+
+
+# Latest preview frame, JPEG-encoded once and shared by every viewer
+# Encoding is skipped entirely while nobody is watching
+class PreviewBroadcaster:
+
+    def __init__(self, loop, fps=PREVIEW_FPS, quality=PREVIEW_JPEG_QUALITY):
+        self.loop = loop
+        self.fps = fps
+        self.quality = quality
+        self.viewers = 0
+        self.encoded = 0
+        self.frame = None
+        self._last = 0.0
+        self._changed = asyncio.Event()
+
+    # Called from the detection thread with each rendered frame
+    def submit(self, frame):
+        if not self.viewers:
+            return
+        now = time.monotonic()
+        if now - self._last < 1.0 / self.fps:
+            return
+        self._last = now
+        with metrics.timer('preview_encode'):
+            ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            self.encoded += 1
+            self.loop.call_soon_threadsafe(self._publish, jpeg.tobytes())
+
+    def _publish(self, data):
+        self.frame = data
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    # Wait for the next frame; viewers that fall behind simply get the newest one
+    async def next_frame(self):
+        await self._changed.wait()
+        return self.frame
+
+    # Count a viewer for as long as the block runs
+    @contextlib.contextmanager
+    def watch(self):
+        self.viewers += 1
+        try:
+            yield self
+        finally:
+            self.viewers -= 1
+
+
+# Runs main.log_motion_for_gui on a background thread and fans its status and events out to listeners
+class DetectionService:
+
+    def __init__(self, loop, broadcaster):
+        self.loop = loop
+        self.broadcaster = broadcaster
+        self.status = "Idle"
+        self.events = deque(maxlen=RECENT_EVENTS)
+        self.started_at = None
+        self.listeners = set()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Start detection; returns False if it is already running
+    def start(self):
+        with self._lock:
+            if self.running:
+                return False
+            main.stop_flag = False
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name='detection', daemon=True)
+            self._thread.start()
+            return True
+
+    # Stop detection and wait for the camera to be released (blocking)
+    def stop(self, timeout=15.0):
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return False
+            main.stop_flag = True
+        thread.join(timeout)
+        return True
+
+    def _run(self):
+        try:
+            main.log_motion_for_gui(self.broadcaster.submit, self._on_status, notify=self._on_notice,
+                                    on_event=self._on_event)
+        except Exception as e:
+            print(f"[ERROR]: Detection failed: {e}")
+            self._on_status(f"❌ Error: {e}")
+        finally:
+            self.started_at = None
+
+    def _on_status(self, msg):
+        self.status = msg
+        self._broadcast({"type": "status", "status": msg})
+
+    def _on_notice(self, kind, title, message):
+        print(f"[{kind.upper()}]: {title}: {message}")
+        self._broadcast({"type": "notice", "kind": kind, "title": title, "message": message})
+
+    def _on_event(self, event):
+        self.events.append(event)
+        self._broadcast({"type": "event", "event": event})
+
+    # Hand a message to the event loop (called from detection threads)
+    def _broadcast(self, message):
+        self.loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message):
+        for listener in self.listeners:
+            if listener.full():
+                listener.get_nowait()
+            listener.put_nowait(message)
+
+    # Current state for /status
+    def snapshot(self):
+        pipeline = main.current_pipeline if self.running else None
+        return {
+            "running": self.running,
+            "status": self.status,
+            "started_at": self.started_at,
+            "recent_events": len(self.events),
+            "viewers": self.broadcaster.viewers,
+            "preview_frames_encoded": self.broadcaster.encoded,
+            "recognition_ready": main.recognition_ready(),
+            "startup": startup.as_dict(),
+            "pipeline": pipeline.stats() if pipeline is not None else None,
+        }
+
+
+# Encode one unmasked server-to-client WebSocket frame
+def websocket_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, length])
+    elif length < 1 << 16:
+        header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, 'big')
+    else:
+        header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+# Read one client WebSocket frame, returning (opcode, payload)
+async def read_websocket_frame(reader):
+    head = await reader.readexactly(2)
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), 'big')
+    mask = await reader.readexactly(4) if head[1] & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+# HTTP and WebSocket API around a DetectionService
+# One request per connection; preview streams hold their connection open
+class ApiServer:
+
+    def __init__(self, service, broadcaster):
+        self.service = service
+        self.broadcaster = broadcaster
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            if headers.get('content-length'):
+                await reader.readexactly(int(headers['content-length']))
+            url = urlsplit(target)
+            await self.route(method, url.path, parse_qs(url.query), headers, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, query, headers, reader, writer):
+        if path == '/' and method == 'GET':
+            self.respond(writer, 200, INDEX_HTML, 'text/html; charset=utf-8')
+        elif path == '/status' and method == 'GET':
+            self.respond_json(writer, 200, self.service.snapshot())
+        elif path == '/metrics' and method == 'GET':
+            self.respond(writer, 200, metrics.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4')
+        elif path == '/metrics.json' and method == 'GET':
+            self.respond_json(writer, 200, metrics.snapshot())
+        elif path == '/events' and method == 'GET':
+            try:
+                limit = int(query.get('limit', [50])[0])
+            except ValueError:
+                self.respond_json(writer, 400, {"error": "limit must be an integer"})
+            else:
+                events = list(self.service.events)[-limit:] if limit > 0 else []
+                self.respond_json(writer, 200, events)
+        elif path == '/start' and method == 'POST':
+            self.respond_json(writer, 200, {"started": self.service.start()})
+        elif path == '/stop' and method == 'POST':
+            stopped = await asyncio.get_running_loop().run_in_executor(None, self.service.stop)
+            self.respond_json(writer, 200, {"stopped": stopped})
+        elif path == '/config' and method == 'GET':
+            current = main.current_config or config.Config()
+            self.respond_json(writer, 200, current.as_dict())
+        elif path == '/config/reload' and method == 'POST':
+            try:
+                changed = await asyncio.get_running_loop().run_in_executor(None, main.reload_config)
+            except ValueError as e:
+                self.respond_json(writer, 400, {"error": str(e)})
+            else:
+                self.respond_json(writer, 200, {"changed": changed})
+        elif path == '/stream.mjpg' and method == 'GET':
+            await self.stream_mjpeg(writer)
+        elif path == '/ws' and method == 'GET' and headers.get('upgrade', '').lower() == 'websocket':
+            await self.stream_websocket(headers, query, reader, writer)
+        elif path in ('/', '/status', '/metrics', '/metrics.json', '/events', '/start', '/stop', '/config',
+                      '/config/reload', '/stream.mjpg', '/ws'):
+            self.respond_json(writer, 405, {"error": f"{method} not allowed on {path}"})
+        else:
+            self.respond_json(writer, 404, {"error": f"Unknown path {path}"})
+        await writer.drain()
+
+    def respond(self, writer, status, body, content_type):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}.get(status, '')
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+
+    def respond_json(self, writer, status, obj):
+        self.respond(writer, status, json.dumps(obj, default=str).encode('utf-8'), 'application/json')
+
+    # Multipart JPEG stream that browsers show as a live image
+    async def stream_mjpeg(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        with self.broadcaster.watch():
+            while True:
+                frame = await self.broadcaster.next_frame()
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(frame))
+                writer.write(frame)
+                writer.write(b"\r\n")
+                await writer.drain()
+
+    # WebSocket carrying JPEG preview frames as binary messages and status/events as JSON text messages
+    # Connect with ?preview=0 to receive only status and events
+    async def stream_websocket(self, headers, query, reader, writer):
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('latin-1')).digest()).decode('ascii')
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode('latin-1'))
+        preview = query.get('preview', ['1'])[0] != '0'
+        messages = asyncio.Queue(VIEWER_QUEUE_SIZE)
+        messages.put_nowait({"type": "status", "status": self.service.status})
+        self.service.listeners.add(messages)
+        tasks = {}
+        try:
+            with contextlib.ExitStack() as stack:
+                if preview:
+                    stack.enter_context(self.broadcaster.watch())
+                # All writes happen in this loop, so frames and messages never interleave
+                while True:
+                    if preview and 'frame' not in tasks:
+                        tasks['frame'] = asyncio.ensure_future(self.broadcaster.next_frame())
+                    if 'message' not in tasks:
+                        tasks['message'] = asyncio.ensure_future(messages.get())
+                    if 'client' not in tasks:
+                        tasks['client'] = asyncio.ensure_future(read_websocket_frame(reader))
+                    done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_COMPLETED)
+                    for name in [n for n, t in tasks.items() if t in done]:
+                        result = tasks.pop(name).result()
+                        if name == 'frame':
+                            writer.write(websocket_frame(0x2, result))
+                        elif name == 'message':
+                            writer.write(websocket_frame(0x1, json.dumps(result, default=str).encode('utf-8')))
+                        else:
+                            opcode, payload = result
+                            if opcode == 0x8:
+                                writer.write(websocket_frame(0x8, payload[:2]))
+                                return
+                            if opcode == 0x9:
+                                writer.write(websocket_frame(0xA, payload))
+                    await writer.drain()
+        finally:
+            self.service.listeners.discard(messages)
+            for task in tasks.values():
+                task.cancel()
+
+
+async def serve(host, port, autostart, preview_fps=PREVIEW_FPS):
+    loop = asyncio.get_running_loop()
+    broadcaster = PreviewBroadcaster(loop, preview_fps)
+    service = DetectionService(loop, broadcaster)
+    api = ApiServer(service, broadcaster)
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"[INFO]: Detection API listening on http://{host}:{port}/")
+    startup.mark('api_listening')
+    # Load face recognition now so it is ready by the time detection is started
+    main.warm_up(lambda error: startup.report())
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    if autostart:
+        service.start()
+    try:
+        await stop.wait()
+    finally:
+        print("[INFO]: Shutting down detection API.")
+        server.close()
+        await loop.run_in_executor(None, service.stop)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Run motion detection headlessly behind a local HTTP/WebSocket API")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--autostart', action='store_true', help="Start detection immediately")
+    parser.add_argument('--preview-fps', type=float, default=PREVIEW_FPS, help="Preview frames per second")
+    parser.add_argument('--metrics', action='store_true', help="Record stage timings for /metrics")
+    config.add_arguments(parser)
+    args = parser.parse_args()
+    main.configure(config.from_args(args))
+
+    if args.metrics:
+        metrics.enable()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.autostart, args.preview_fps))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main_cli()
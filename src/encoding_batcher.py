@@ -0,0 +1,163 @@
+import time
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+import metrics
+
+# Faces are aligned to chips of this size before encoding, the input size of dlib's face network
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+
+# Encode faces from any number of frames with one call into dlib's face network
+# items is a list of (rgb_frame, (top, right, bottom, left)). Each face is aligned to a
+# CHIP_SIZE chip with the same 5-point landmarks and padding as face_recognition.face_encodings,
+# so the encodings match the gallery's.
+def encode_aligned(items):
+    import dlib
+    from face_recognition import api
+
+    chips = []
+    for rgb_frame, (top, right, bottom, left) in items:
+        shape = api.pose_predictor_5_point(rgb_frame, dlib.rectangle(left, top, right, bottom))
+        chips.append(dlib.get_face_chip(rgb_frame, shape, size=CHIP_SIZE, padding=CHIP_PADDING))
+    return [np.array(d) for d in api.face_encoder.compute_face_descriptor(chips)]
+
+
+class _Request:
+    __slots__ = ('rgb_frame', 'locations', 'future', 'submitted_at')
+
+    def __init__(self, rgb_frame, locations):
+        self.rgb_frame = rgb_frame
+        self.locations = locations
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+# Collects faces from many frames and streams and encodes them in batches on one thread
+# A batch is sent once it holds max_faces faces or its oldest request has waited budget
+# seconds, so no caller waits more than budget plus one batch's encoding time
+# callers is the number of threads that submit, if known: once each of them is waiting
+# no more faces can arrive, so the batch is sent without waiting out the budget
+class EncodingBatcher:
+
+    def __init__(self, budget=0.02, max_faces=32, encode=encode_aligned, callers=None):
+        self.budget = budget
+        self.max_faces = max_faces
+        self.callers = callers
+        self._encode = encode
+
+        self.requests = 0
+        self.faces = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.encode_seconds = 0.0
+        # Number of batches by size in faces
+        self.batch_sizes = {}
+
+        self._pending = []
+        self._pending_faces = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='encoding-batcher', daemon=True)
+        self._thread.start()
+
+    # Queue one frame's face boxes; the future resolves to their encodings
+    def submit(self, rgb_frame, locations):
+        request = _Request(rgb_frame, list(locations))
+        if not request.locations:
+            request.future.set_result([])
+            return request.future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Encoding batcher is closed")
+            self._pending.append(request)
+            self._pending_faces += len(request.locations)
+            self._cond.notify()
+        return request.future
+
+    # Encode one frame's face boxes, waiting for the batch they go out with
+    def encode(self, rgb_frame, locations, timeout=None):
+        return self.submit(rgb_frame, locations).result(timeout)
+
+    # Wait for a full batch or for the oldest request's budget to run out
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            deadline = self._pending[0].submitted_at + self.budget
+            while (self._pending_faces < self.max_faces and not self._closed
+                   and (self.callers is None or len(self._pending) < self.callers)):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            faces = 0
+            while self._pending and (not batch or faces + len(self._pending[0].locations) <= self.max_faces):
+                request = self._pending.pop(0)
+                batch.append(request)
+                faces += len(request.locations)
+            self._pending_faces -= faces
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                break
+            items = [(r.rgb_frame, loc) for r in batch for loc in r.locations]
+            start = time.perf_counter()
+            try:
+                encodings = self._encode(items)
+            except Exception as e:
+                self.failed += len(batch)
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            now = time.perf_counter()
+
+            offset = 0
+            for request in batch:
+                count = len(request.locations)
+                request.future.set_result(encodings[offset:offset + count])
+                offset += count
+                self.wait_seconds += start - request.submitted_at
+                metrics.observe('encode_batch_wait', start - request.submitted_at)
+            metrics.observe('encode_batch', now - start)
+            metrics.inc('encode_batches')
+            metrics.inc('encode_batch_faces', len(items))
+
+            self.requests += len(batch)
+            self.faces += len(items)
+            self.batches += 1
+            self.encode_seconds += now - start
+            self.max_batch = max(self.max_batch, len(items))
+            self.batch_sizes[len(items)] = self.batch_sizes.get(len(items), 0) + 1
+
+    # Encode what is queued and stop the batcher thread
+    def close(self, timeout=5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # Achieved batch sizes, queueing delay and encoding cost per face
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'faces': self.faces,
+            'batches': self.batches,
+            'failed': self.failed,
+            'avg_batch': self.faces / self.batches if self.batches else 0.0,
+            'max_batch': self.max_batch,
+            'avg_wait_ms': self.wait_seconds / self.requests * 1000 if self.requests else 0.0,
+            'encode_ms_per_face': self.encode_seconds / self.faces * 1000 if self.faces else 0.0,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+        }
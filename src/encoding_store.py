@@ -0,0 +1,121 @@
+import os
+import hashlib
+import numpy as np
+
+# Length of a dlib face encoding
+ENCODING_SIZE = 128
+
+
+# Compute a content hash for a file on disk
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Persistent store of face encodings keyed by file path, mtime and content hash
+class EncodingStore:
+
+    # Load an existing cache file if there is one
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.entries = {}
+        self.by_digest = {}
+        self.dirty = False
+        self._load()
+
+    # Read the encoding matrix and its index from disk
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                paths = data['paths']
+                mtimes = data['mtimes']
+                sizes = data['sizes']
+                digests = data['digests']
+                has_face = data['has_face']
+                encodings = data['encodings']
+        except Exception as e:
+            print(f"[Warning]: Ignoring unreadable encoding cache {self.cache_path}: {e}")
+            return
+
+        for i, path in enumerate(paths):
+            encoding = encodings[i] if has_face[i] else None
+            entry = (int(mtimes[i]), int(sizes[i]), str(digests[i]), encoding)
+            self.entries[str(path)] = entry
+            self.by_digest[entry[2]] = encoding
+        print(f"[INFO]: Loaded {len(self.entries)} cached face encodings.")
+
+    # Look up a file, returning (found, encoding, digest)
+    def lookup(self, path):
+        path = os.path.normpath(path)
+        st = os.stat(path)
+        entry = self.entries.get(path)
+
+        # Unchanged size and mtime means the file was not touched
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return True, entry[3], entry[2]
+
+        # Touched or renamed files are only re-encoded if their content changed
+        digest = file_digest(path)
+        if digest in self.by_digest:
+            encoding = self.by_digest[digest]
+            self.entries[path] = (st.st_mtime_ns, st.st_size, digest, encoding)
+            self.dirty = True
+            return True, encoding, digest
+        return False, None, digest
+
+    # Record a freshly computed encoding (None if the image has no face)
+    def put(self, path, digest, encoding):
+        path = os.path.normpath(path)
+        st = os.stat(path)
+        self.entries[path] = (st.st_mtime_ns, st.st_size, digest, encoding)
+        self.by_digest[digest] = encoding
+        self.dirty = True
+
+    # Drop entries for files that no longer exist
+    def prune(self, live_paths):
+        live = {os.path.normpath(p) for p in live_paths}
+        stale = [p for p in self.entries if p not in live]
+        for path in stale:
+            del self.entries[path]
+        if stale:
+            self.by_digest = {e[2]: e[3] for e in self.entries.values()}
+            self.dirty = True
+        return len(stale)
+
+    # Write the cache atomically as a single .npz file
+    def save(self):
+        if not self.dirty:
+            return
+        paths = sorted(self.entries)
+        count = len(paths)
+        encodings = np.zeros((count, ENCODING_SIZE), dtype=np.float64)
+        has_face = np.zeros(count, dtype=bool)
+        for i, path in enumerate(paths):
+            encoding = self.entries[path][3]
+            if encoding is not None:
+                encodings[i] = encoding
+                has_face[i] = True
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        # Named per process so concurrent writers never share a temporary file
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f,
+                         paths=np.array(paths, dtype=str),
+                         mtimes=np.array([self.entries[p][0] for p in paths], dtype=np.int64),
+                         sizes=np.array([self.entries[p][1] for p in paths], dtype=np.int64),
+                         digests=np.array([self.entries[p][2] for p in paths], dtype=str),
+                         has_face=has_face,
+                         encodings=encodings)
+            os.replace(tmp_path, self.cache_path)
+            self.dirty = False
+        except Exception as e:
+            print(f"[Error]: Failed to write encoding cache {self.cache_path}: {e}")
@@ -0,0 +1,247 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+
+from gallery import UNKNOWN_NAME
+
+# Default database written by main.py when EVENT_LOG_PATH ends in .db
+DEFAULT_STORE_PATH = "motion_events.db"
+
+# Unknown faces are stored under this identity so they can be queried like any other
+UNKNOWN_IDENTITY = UNKNOWN_NAME
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL DEFAULT '',
+    faces TEXT,
+    face_count INTEGER NOT NULL DEFAULT 0,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    event_id INTEGER NOT NULL REFERENCES events(id),
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL DEFAULT '',
+    identity TEXT NOT NULL,
+    distance REAL,
+    box_top INTEGER,
+    box_right INTEGER,
+    box_bottom INTEGER,
+    box_left INTEGER,
+    crop_path TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_camera_ts ON events (camera, ts);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS detections_identity_ts ON detections (identity, ts);
+CREATE INDEX IF NOT EXISTS detections_camera_identity_ts ON detections (camera, identity, ts);
+"""
+
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d")
+
+
+# Parse an epoch number or a local "YYYY-MM-DD[ HH:MM[:SS]]" time into epoch seconds
+def parse_time(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized time: {value}")
+
+
+# Epoch time of an event: its "Time" field, or its "Timestamp" string
+def event_time(event):
+    if event.get("Time") is not None:
+        return float(event["Time"])
+    if event.get("Timestamp"):
+        return parse_time(event["Timestamp"])
+    return time.time()
+
+
+# Detections of an event; events without them (e.g. old CSV logs) get one per name in "Faces"
+def event_detections(event):
+    detections = event.get("Detections")
+    if isinstance(detections, str):
+        detections = json.loads(detections) if detections else []
+    if detections:
+        return detections
+    faces = event.get("Faces") or ""
+    if isinstance(faces, str):
+        faces = [name.strip() for name in faces.split(",") if name.strip() and name.strip() != "None"]
+    return [{"name": name} for name in faces]
+
+
+# SQLite event store indexed by time, camera and identity
+# Range, identity and hourly count queries only touch the index ranges they need,
+# so they stay fast as the store grows to tens of millions of events
+class EventStore:
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Writes come from the sink's flush timer thread, reads from whoever queries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    # Insert a batch of events (dicts as written by main.log_motion_for_gui) in one transaction
+    def add_events(self, events):
+        with self._conn:
+            for event in events:
+                ts = event_time(event)
+                camera = str(event.get("Camera") or "")
+                detections = event_detections(event)
+                names = [d.get("name", UNKNOWN_IDENTITY) for d in detections]
+                extra = {k: v for k, v in event.items() if k not in ("Time", "Timestamp", "Camera", "Faces", "Detections")}
+                cursor = self._conn.execute(
+                    "INSERT INTO events (ts, camera, faces, face_count, data) VALUES (?, ?, ?, ?, ?)",
+                    (ts, camera, ", ".join(names) if names else "None", len(names),
+                     json.dumps(extra, default=str) if extra else None))
+                rows = []
+                for d in detections:
+                    box = d.get("box") or [None] * 4
+                    rows.append((cursor.lastrowid, ts, camera, d.get("name", UNKNOWN_IDENTITY), d.get("distance"),
+                                 box[0], box[1], box[2], box[3], d.get("crop")))
+                self._conn.executemany(
+                    "INSERT INTO detections (event_id, ts, camera, identity, distance, "
+                    "box_top, box_right, box_bottom, box_left, crop_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(events)
+
+    @staticmethod
+    def _where(start, end, camera, identity=None):
+        clauses, params = [], []
+        if identity is not None:
+            clauses.append("identity = ?")
+            params.append(identity)
+        if camera is not None:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(parse_time(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(parse_time(end))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # Events in [start, end), optionally on one camera, oldest first
+    def query_range(self, start=None, end=None, camera=None, limit=None):
+        where, params = self._where(start, end, camera)
+        sql = f"SELECT id, ts, camera, faces, face_count FROM events{where} ORDER BY ts"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    # Detections of one identity in [start, end), optionally on one camera, oldest first
+    def query_identity(self, identity, start=None, end=None, camera=None, limit=None):
+        where, params = self._where(start, end, camera, identity)
+        sql = ("SELECT event_id, ts, camera, identity, distance, box_top, box_right, box_bottom, box_left, crop_path "
+               f"FROM detections{where} ORDER BY ts")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    # Number of detections per local hour and identity, as (hour, identity, count)
+    def counts_per_hour(self, start=None, end=None, identity=None, camera=None):
+        where, params = self._where(start, end, camera, identity)
+        sql = ("SELECT strftime('%Y-%m-%d %H:00', ts, 'unixepoch', 'localtime') AS hour, identity, COUNT(*) AS count "
+               f"FROM detections{where} GROUP BY hour, identity ORDER BY hour, identity")
+        return [tuple(row) for row in self._conn.execute(sql, params)]
+
+    # Number of stored events
+    def count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    # Import a CSV log written by logger.save_log or CsvEventSink, in batches
+    def import_csv(self, path, camera=None, batch_size=10000):
+        imported = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            batch = []
+            for row in csv.DictReader(f):
+                if camera is not None and not row.get("Camera"):
+                    row["Camera"] = camera
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    imported += self.add_events(batch)
+                    batch = []
+            if batch:
+                imported += self.add_events(batch)
+        return imported
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Query the event store from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Query the motion event store")
+    parser.add_argument('--db', default=DEFAULT_STORE_PATH, help="Event store database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_filters(sub):
+        sub.add_argument('--start', help="Start time (epoch or YYYY-MM-DD HH:MM[:SS], local time)")
+        sub.add_argument('--end', help="End time, exclusive")
+        sub.add_argument('--camera', help="Only this camera")
+
+    range_cmd = commands.add_parser('range', help="Events in a time range")
+    add_filters(range_cmd)
+    range_cmd.add_argument('--limit', type=int)
+    identity_cmd = commands.add_parser('identity', help="Sightings of one person")
+    identity_cmd.add_argument('identity')
+    add_filters(identity_cmd)
+    identity_cmd.add_argument('--limit', type=int)
+    hourly_cmd = commands.add_parser('hourly', help="Detections per hour per person")
+    hourly_cmd.add_argument('--identity')
+    add_filters(hourly_cmd)
+    import_cmd = commands.add_parser('import', help="Import a CSV motion log")
+    import_cmd.add_argument('csv_path')
+    import_cmd.add_argument('--camera', help="Camera name for rows without one")
+    args = parser.parse_args()
+
+    with EventStore(args.db) as store:
+        if args.command == 'range':
+            for event in store.query_range(args.start, args.end, args.camera, args.limit):
+                print(f"{format_time(event['ts'])}  {event['camera'] or '-'}  {event['faces']}")
+        elif args.command == 'identity':
+            for d in store.query_identity(args.identity, args.start, args.end, args.camera, args.limit):
+                box = "" if d['box_top'] is None else f"  box=({d['box_top']},{d['box_right']},{d['box_bottom']},{d['box_left']})"
+                distance = "" if d['distance'] is None else f"  distance={d['distance']:.3f}"
+                crop = f"  crop={d['crop_path']}" if d['crop_path'] else ""
+                print(f"{format_time(d['ts'])}  {d['camera'] or '-'}  {d['identity']}{distance}{box}{crop}")
+        elif args.command == 'hourly':
+            for hour, identity, count in store.counts_per_hour(args.start, args.end, args.identity, args.camera):
+                print(f"{hour}  {identity}  {count}")
+        elif args.command == 'import':
+            print(f"[INFO]: Imported {store.import_csv(args.csv_path, args.camera)} events into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+from encoding_store import EncodingStore, ENCODING_SIZE
+from face_index import make_index
+
+UNKNOWN_FACES_DIR = os.path.join('data', 'unknown_faces')
+KNOWN_FACES_DIR = os.path.join('data', 'known_faces')
+# Encodings of unknown crops, reused across runs like the known faces cache
+UNKNOWN_CACHE_PATH = os.path.join('data', 'cache', 'unknown_faces.npz')
+KNOWN_CACHE_PATH = os.path.join('data', 'cache', 'known_faces.npz')
+CLUSTERS_PATH = os.path.join('data', 'cache', 'unknown_clusters.json')
+
+# Faces closer than this are linked when clustering; slightly tighter than the match tolerance
+# (gallery.DEFAULT_TOLERANCE, 0.4), since one wrong link merges two people's clusters
+DEFAULT_EPS = 0.38
+# Clusters smaller than this are not listed
+DEFAULT_MIN_SIZE = 3
+
+
+# List unknown face crops, oldest name first
+def list_crops(directory=UNKNOWN_FACES_DIR):
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.lower().endswith((".jpg", ".png")))
+
+
+# Worker process: encode a saved crop, treating the whole image as the face box
+# Crops are already cut to the detected face, so detection is skipped
+def _encode_crop(path):
+    import face_recognition as face_recognition_lib
+    try:
+        image = face_recognition_lib.load_image_file(path)
+        height, width = image.shape[:2]
+        encodings = face_recognition_lib.face_encodings(image, [(0, width, height, 0)])
+        return encodings[0] if encodings else None
+    except Exception as e:
+        print(f"[Warning]: Failed to encode {path}: {e}")
+        return None
+
+
+# Encode crops in worker processes, reusing cached encodings
+# Returns (paths, encodings) for the crops that hold a face
+def encode_crops(paths, store, workers=None, save_every=5000):
+    workers = workers or os.cpu_count() or 1
+    encodings = {}
+    missing = []
+    for path in paths:
+        found, encoding, digest = store.lookup(path)
+        if found:
+            encodings[path] = encoding
+        else:
+            missing.append((path, digest))
+    print(f"[INFO]: {len(paths) - len(missing)} cached encodings, {len(missing)} crops to encode on {workers} workers.")
+
+    if missing:
+        start = time.perf_counter()
+        ctx = mp.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=ctx) as executor:
+            results = executor.map(_encode_crop, [p for p, _ in missing], chunksize=64)
+            for done, ((path, digest), encoding) in enumerate(zip(missing, results), 1):
+                store.put(path, digest, encoding)
+                encodings[path] = encoding
+                # Save progress so an interrupted run does not start over
+                if done % save_every == 0:
+                    store.save()
+                    print(f"[INFO]: Encoded {done}/{len(missing)} crops "
+                          f"({done / (time.perf_counter() - start):.0f} crops/s).")
+    store.save()
+
+    kept = [p for p in paths if encodings.get(p) is not None]
+    matrix = np.array([encodings[p] for p in kept], dtype=np.float32).reshape(len(kept), ENCODING_SIZE)
+    return kept, matrix
+
+
+# For each face, the other faces within eps among its k nearest neighbours
+# Large sets are searched with the IVF index, in chunks to bound memory
+# The graph is made symmetric: k-NN lists are not, and one-way links split dense identities
+def neighbor_graph(encodings, eps=DEFAULT_EPS, k=32, chunk=1024):
+    index = make_index('auto', len(encodings)).build(encodings)
+    neighbors = [set() for _ in range(len(encodings))]
+    for start in range(0, len(encodings), chunk):
+        dist, rows = index.search(encodings[start:start + chunk], k + 1)
+        for i, (d, r) in enumerate(zip(dist, rows)):
+            keep = (d <= eps) & (r >= 0) & (r != start + i)
+            for j in r[keep].tolist():
+                neighbors[start + i].add(j)
+                neighbors[j].add(start + i)
+    return [sorted(n) for n in neighbors]
+
+
+# Chinese whispers: every face repeatedly takes the most common label among its neighbours
+def chinese_whispers(neighbors, iterations=20, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = list(range(len(neighbors)))
+    for _ in range(iterations):
+        changed = 0
+        for i in rng.permutation(len(neighbors)).tolist():
+            if not neighbors[i]:
+                continue
+            votes = {}
+            for j in neighbors[i]:
+                label = labels[j]
+                votes[label] = votes.get(label, 0) + 1
+            best = max(votes, key=votes.get)
+            if best != labels[i]:
+                labels[i] = best
+                changed += 1
+        if not changed:
+            break
+    return np.array(labels)
+
+
+# DBSCAN over the neighbour graph; faces in no cluster get label -1
+def dbscan(neighbors, min_samples=3):
+    labels = np.full(len(neighbors), -1)
+    core = [len(n) + 1 >= min_samples for n in neighbors]
+    label = 0
+    for i in range(len(neighbors)):
+        if not core[i] or labels[i] != -1:
+            continue
+        labels[i] = label
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            for n in neighbors[j]:
+                if labels[n] == -1:
+                    labels[n] = label
+                    # Border faces join the cluster but do not extend it
+                    if core[n]:
+                        stack.append(n)
+        label += 1
+    return labels
+
+
+CLUSTER_METHODS = ('chinese_whispers', 'dbscan')
+
+
+# Cluster face encodings, returning one label per row
+def cluster_faces(encodings, method='chinese_whispers', eps=DEFAULT_EPS, k=32, min_samples=3):
+    neighbors = neighbor_graph(encodings, eps, k)
+    if method == 'chinese_whispers':
+        return chinese_whispers(neighbors)
+    if method == 'dbscan':
+        return dbscan(neighbors, min_samples)
+    raise ValueError(f"Unknown clustering method: {method}")
+
+
+# Group paths by label, largest cluster first, dropping noise and clusters below min_size
+def group_clusters(paths, labels, min_size=DEFAULT_MIN_SIZE):
+    groups = {}
+    for path, label in zip(paths, labels.tolist()):
+        if label >= 0:
+            groups.setdefault(label, []).append(path)
+    members = sorted((g for g in groups.values() if len(g) >= min_size), key=len, reverse=True)
+    return [{"id": i, "size": len(m), "paths": m} for i, m in enumerate(members, 1)]
+
+
+def save_clusters(clusters, path=CLUSTERS_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({"created": time.time(), "clusters": clusters}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_clusters(path=CLUSTERS_PATH):
+    with open(path) as f:
+        return json.load(f)["clusters"]
+
+
+# Write a contact sheet of up to per_cluster crops for each cluster, for review before promoting
+def write_previews(clusters, directory, per_cluster=16, tile=96, columns=8):
+    os.makedirs(directory, exist_ok=True)
+    for cluster in clusters:
+        tiles = []
+        for path in cluster["paths"][:per_cluster]:
+            image = cv2.imread(path)
+            if image is not None:
+                tiles.append(cv2.resize(image, (tile, tile), interpolation=cv2.INTER_AREA))
+        if not tiles:
+            continue
+        if len(tiles) > columns:
+            tiles += [np.zeros_like(tiles[0])] * ((columns - len(tiles) % columns) % columns)
+        rows = [np.hstack(tiles[i:i + columns]) for i in range(0, len(tiles), columns)]
+        cv2.imwrite(os.path.join(directory, f"cluster_{cluster['id']:04d}_{cluster['size']}.jpg"), np.vstack(rows))
+
+
+# Move a cluster's crops into data/known_faces/{name}/ and seed the known faces cache with
+# their encodings, so the next load_known_faces() adds them without re-encoding
+def promote_cluster(cluster_id, name, clusters_path=CLUSTERS_PATH, unknown_cache_path=UNKNOWN_CACHE_PATH,
+                    known_cache_path=KNOWN_CACHE_PATH, known_dir=KNOWN_FACES_DIR):
+    clusters = load_clusters(clusters_path)
+    cluster = next((c for c in clusters if c["id"] == cluster_id), None)
+    if cluster is None:
+        raise ValueError(f"No cluster {cluster_id} in {clusters_path}")
+
+    unknown_store = EncodingStore(unknown_cache_path)
+    known_store = EncodingStore(known_cache_path)
+    target_dir = os.path.join(known_dir, name)
+    os.makedirs(target_dir, exist_ok=True)
+
+    promoted = []
+    for path in cluster["paths"]:
+        if not os.path.exists(path):
+            continue
+        found, encoding, digest = unknown_store.lookup(path)
+        if not found or encoding is None:
+            continue
+        target = os.path.join(target_dir, os.path.basename(path))
+        shutil.move(path, target)
+        known_store.put(target, digest, encoding)
+        promoted.append(os.path.normpath(path))
+
+    known_store.save()
+    promoted_set = set(promoted)
+    unknown_store.prune([p for p in unknown_store.entries if p not in promoted_set])
+    unknown_store.save()
+    save_clusters([c for c in clusters if c["id"] != cluster_id], clusters_path)
+    print(f"[INFO]: Promoted cluster {cluster_id} to '{name}' with {len(promoted)} faces in {target_dir}.")
+    return len(promoted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster saved unknown faces and enroll clusters as known people")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cluster_cmd = commands.add_parser('cluster', help="Encode and cluster all unknown face crops")
+    cluster_cmd.add_argument('--dir', default=UNKNOWN_FACES_DIR, help="Directory of unknown face crops")
+    cluster_cmd.add_argument('--workers', type=int, default=None, help="Encoding worker processes")
+    cluster_cmd.add_argument('--method', default='chinese_whispers', choices=CLUSTER_METHODS)
+    cluster_cmd.add_argument('--eps', type=float, default=DEFAULT_EPS, help="Largest distance between linked faces")
+    cluster_cmd.add_argument('--neighbors', type=int, default=32, help="Neighbours considered per face")
+    cluster_cmd.add_argument('--min-samples', type=int, default=3, help="DBSCAN core point size")
+    cluster_cmd.add_argument('--min-size', type=int, default=DEFAULT_MIN_SIZE, help="Smallest cluster to list")
+    cluster_cmd.add_argument('--preview-dir', help="Write a contact sheet per cluster to this directory")
+
+    list_cmd = commands.add_parser('list', help="Show the clusters from the last run")
+    list_cmd.add_argument('--top', type=int, default=20)
+
+    promote_cmd = commands.add_parser('promote', help="Enroll a cluster as a known person")
+    promote_cmd.add_argument('cluster_id', type=int)
+    promote_cmd.add_argument('name')
+    args = parser.parse_args()
+
+    if args.command == 'cluster':
+        start = time.perf_counter()
+        paths = list_crops(args.dir)
+        kept, encodings = encode_crops(paths, EncodingStore(UNKNOWN_CACHE_PATH), args.workers)
+        encoded_at = time.perf_counter()
+        if not kept:
+            print("[INFO]: No unknown faces to cluster.")
+            return
+        labels = cluster_faces(encodings, args.method, args.eps, args.neighbors, args.min_samples)
+        clusters = group_clusters(kept, labels, args.min_size)
+        save_clusters(clusters)
+        if args.preview_dir:
+            write_previews(clusters, args.preview_dir)
+        clustered = sum(c["size"] for c in clusters)
+        print(f"[INFO]: {len(clusters)} clusters covering {clustered} of {len(kept)} faces "
+              f"({len(paths) - len(kept)} crops without a face). Encoding {encoded_at - start:.1f}s, "
+              f"clustering {time.perf_counter() - encoded_at:.1f}s.")
+        for cluster in clusters[:10]:
+            print(f"  cluster {cluster['id']}: {cluster['size']} faces, e.g. {cluster['paths'][0]}")
+    elif args.command == 'list':
+        for cluster in load_clusters()[:args.top]:
+            print(f"  cluster {cluster['id']}: {cluster['size']} faces, e.g. {cluster['paths'][0]}")
+    elif args.command == 'promote':
+        promote_cluster(args.cluster_id, args.name)
+        # A running app loads known faces once per process; stopping and starting detection does not reload them
+        print("[INFO]: Restart the application to use the new identity "
+              "(registering a face from the GUI also reloads known faces).")
+
+
+if __name__ == "__main__":
+    main()
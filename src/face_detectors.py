@@ -0,0 +1,224 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+# Model files for the DNN detectors, downloaded separately (see the README)
+MODELS_DIR = os.path.join('data', 'models')
+YUNET_MODEL = os.path.join(MODELS_DIR, 'face_detection_yunet_2023mar.onnx')
+SSD_MODEL = os.path.join(MODELS_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+SSD_CONFIG = os.path.join(MODELS_DIR, 'deploy.prototxt')
+HAAR_CASCADE = 'haarcascade_frontalface_default.xml'
+
+DETECTORS = ('hog', 'haar', 'yunet', 'ssd')
+DEFAULT_DETECTOR = 'hog'
+
+
+# Base class for face detectors; detect() takes an RGB image and returns (top, right, bottom, left) boxes
+class FaceDetector:
+    name = None
+
+    def detect(self, rgb):
+        raise NotImplementedError
+
+
+# dlib's HOG detector through face_recognition, the original detector
+class HogDetector(FaceDetector):
+    name = 'hog'
+
+    # upsample finds smaller faces at about 4x the cost per step
+    def __init__(self, upsample=1):
+        import face_recognition as face_recognition_lib
+        self._face_locations = face_recognition_lib.face_locations
+        self.upsample = upsample
+
+    def detect(self, rgb):
+        return self._face_locations(rgb, self.upsample, 'hog')
+
+
+# OpenCV Haar cascade: the fastest, with more false positives and misses on turned faces
+class HaarDetector(FaceDetector):
+    name = 'haar'
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=30):
+        if not hasattr(cv2, 'CascadeClassifier'):
+            raise RuntimeError("This OpenCV build has no Haar cascade support")
+        if cascade_path is None:
+            cascade_path = _find_cascade()
+        self.cascade_path = cascade_path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._local = threading.local()
+        self._classifier()
+
+    # CascadeClassifier keeps scratch state, so each thread gets its own
+    def _classifier(self):
+        classifier = getattr(self._local, 'classifier', None)
+        if classifier is None:
+            classifier = cv2.CascadeClassifier(self.cascade_path)
+            if classifier.empty():
+                raise RuntimeError(f"Failed to load Haar cascade from {self.cascade_path}")
+            self._local.classifier = classifier
+        return classifier
+
+    def detect(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        faces = self._classifier().detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                                    minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in faces]
+
+
+def _find_cascade():
+    candidates = [os.path.join(MODELS_DIR, HAAR_CASCADE)]
+    if hasattr(cv2, 'data'):
+        candidates.insert(0, os.path.join(cv2.data.haarcascades, HAAR_CASCADE))
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    raise RuntimeError(f"Haar cascade {HAAR_CASCADE} not found in {' or '.join(candidates)}")
+
+
+def _require_model(*paths):
+    for path in paths:
+        if not os.path.exists(path):
+            raise RuntimeError(f"Face detector model {path} not found")
+
+
+# OpenCV's YuNet CNN detector (ONNX): close to HOG accuracy, handles small and turned faces
+class YuNetDetector(FaceDetector):
+    name = 'yunet'
+
+    def __init__(self, model_path=YUNET_MODEL, score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        _require_model(model_path)
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self._local = threading.local()
+
+    # The detector holds its input size, so each thread gets its own
+    def _model(self, width, height):
+        model = getattr(self._local, 'model', None)
+        if model is None:
+            model = cv2.FaceDetectorYN.create(self.model_path, '', (width, height), self.score_threshold,
+                                              self.nms_threshold, self.top_k)
+            self._local.model = model
+        else:
+            model.setInputSize((width, height))
+        return model
+
+    def detect(self, rgb):
+        height, width = rgb.shape[:2]
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        _, faces = self._model(width, height).detect(bgr)
+        if faces is None:
+            return []
+        boxes = []
+        for x, y, w, h in faces[:, :4]:
+            left, top = max(0, int(x)), max(0, int(y))
+            boxes.append((top, min(width, int(x + w)), min(height, int(y + h)), left))
+        return boxes
+
+
+# OpenCV's ResNet-10 SSD face detector (Caffe), run at a fixed 300x300 input
+class SsdDetector(FaceDetector):
+    name = 'ssd'
+
+    def __init__(self, model_path=SSD_MODEL, config_path=SSD_CONFIG, confidence=0.6, input_size=300):
+        _require_model(model_path, config_path)
+        self.model_path = model_path
+        self.config_path = config_path
+        self.confidence = confidence
+        self.input_size = input_size
+        self._local = threading.local()
+
+    def _net(self):
+        net = getattr(self._local, 'net', None)
+        if net is None:
+            net = cv2.dnn.readNet(self.model_path, self.config_path)
+            self._local.net = net
+        return net
+
+    def detect(self, rgb):
+        height, width = rgb.shape[:2]
+        size = (self.input_size, self.input_size)
+        # The model expects BGR input with these channel means subtracted
+        bgr = cv2.cvtColor(cv2.resize(rgb, size), cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, size, (104.0, 177.0, 123.0))
+        net = self._net()
+        net.setInput(blob)
+        detections = net.forward().reshape(-1, 7)
+        boxes = []
+        for _, _, score, x1, y1, x2, y2 in detections:
+            if score < self.confidence:
+                continue
+            left, top = max(0, int(x1 * width)), max(0, int(y1 * height))
+            right, bottom = min(width, int(x2 * width)), min(height, int(y2 * height))
+            if right > left and bottom > top:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+
+# Run a fast detector on the whole image, then check each candidate with a slower, more
+# accurate detector on a padded crop around it. Only confirmed faces are returned, with the
+# confirming detector's box, so the slow detector only ever sees a few small crops.
+class CascadeDetector(FaceDetector):
+    name = 'cascade'
+
+    def __init__(self, fast, confirm, padding=0.5):
+        self.fast = fast
+        self.confirm = confirm
+        self.padding = padding
+        self.candidates = 0
+        self.confirmed = 0
+
+    def detect(self, rgb):
+        height, width = rgb.shape[:2]
+        boxes = []
+        for (top, right, bottom, left) in self.fast.detect(rgb):
+            self.candidates += 1
+            pad_x = int((right - left) * self.padding)
+            pad_y = int((bottom - top) * self.padding)
+            y0, y1 = max(0, top - pad_y), min(height, bottom + pad_y)
+            x0, x1 = max(0, left - pad_x), min(width, right + pad_x)
+            found = self.confirm.detect(np.ascontiguousarray(rgb[y0:y1, x0:x1]))
+            if not found:
+                continue
+            # Keep the confirmed box closest to the candidate's centre
+            cx, cy = (left + right) / 2 - x0, (top + bottom) / 2 - y0
+            t, r, b, l = min(found, key=lambda f: ((f[1] + f[3]) / 2 - cx) ** 2 + ((f[0] + f[2]) / 2 - cy) ** 2)
+            box = (t + y0, r + x0, b + y0, l + x0)
+            if box not in boxes:
+                boxes.append(box)
+                self.confirmed += 1
+        return boxes
+
+
+# Create a detector from a spec: a name from DETECTORS, or 'fast>confirm' for a cascade
+# such as 'haar>hog'; options are passed to the (single) detector's constructor
+def create_face_detector(spec=DEFAULT_DETECTOR, **options):
+    if isinstance(spec, FaceDetector):
+        return spec
+    if '>' in spec:
+        fast, confirm = spec.split('>', 1)
+        return CascadeDetector(create_face_detector(fast.strip()), create_face_detector(confirm.strip()), **options)
+    if spec == 'hog':
+        return HogDetector(**options)
+    if spec == 'haar':
+        return HaarDetector(**options)
+    if spec == 'yunet':
+        return YuNetDetector(**options)
+    if spec == 'ssd':
+        return SsdDetector(**options)
+    raise ValueError(f"Unknown face detector: {spec}")
+
+
+# argparse type for detector specs, checking names without loading any models
+def detector_spec(value):
+    for name in value.split('>'):
+        if name.strip() not in DETECTORS:
+            raise ValueError(f"Unknown face detector: {name}")
+    if value.count('>') > 1:
+        raise ValueError("A cascade has exactly two detectors, e.g. haar>hog")
+    return value
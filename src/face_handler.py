@@ -1,11 +1,16 @@
 import os
 import cv2
-import numpy as np
-import face_recognition as face_recognition_lib
 
-from datetime import datetime
-import random
-import tkinter.messagebox as messagebox
+import json
+import threading
+
+import metrics
+import startup
+from encoding_store import EncodingStore
+from encoding_batcher import EncodingBatcher
+from face_detectors import create_face_detector, DEFAULT_DETECTOR
+from gallery import FaceGallery, UNKNOWN_NAME, DEFAULT_TOLERANCE
+from unknown_faces import UnknownFaceWriter
 
 # Directories for known and unknown faces
 KNOWN_FACES_DIR = os.path.join('data', 'known_faces')
@@ -15,107 +20,459 @@ UNKNOWN_FACES_DIR = os.path.join('data', 'unknown_faces')
 os.makedirs(UNKNOWN_FACES_DIR, exist_ok=True)
 os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
 
-# Global lists to hold known face encodings and names
-known_encodings = []
-known_names = []
+# Restrict face detection to padded motion regions, downscaled by MOTION_ROI_SCALE
+MOTION_ROI_MODE = True
+MOTION_ROI_SCALE = 0.5
+MOTION_ROI_PADDING = 0.25
+# Regions smaller than this (in detection pixels) cannot hold a detectable face
+MIN_DETECTION_SIZE = 40
+
+# Face detector used when a caller does not pass its own: 'hog', 'haar', 'yunet', 'ssd',
+# or a cascade such as 'haar>hog' where the second detector confirms the first one's finds
+FACE_DETECTOR = DEFAULT_DETECTOR
+face_detector = None
+_detector_lock = threading.Lock()
+
+# Gallery of known face encodings used for matching
+# Large galleries switch to an approximate IVF index, cached on disk between runs
+# MATCH_TOLERANCE is the configured tolerance; a reloaded gallery is built with it
+GALLERY_INDEX_PATH = os.path.join('data', 'cache', 'gallery_index.npz')
+MATCH_TOLERANCE = DEFAULT_TOLERANCE
+gallery = FaceGallery(tolerance=MATCH_TOLERANCE, index_cache_path=GALLERY_INDEX_PATH)
+
+# Optional per-identity match thresholds, e.g. {"sai": 0.35}
+THRESHOLDS_FILE = os.path.join(KNOWN_FACES_DIR, 'thresholds.json')
+
+# On-disk cache of known face encodings
+ENCODING_CACHE_PATH = os.path.join('data', 'cache', 'known_faces.npz')
+encoding_store = None
+# Recognition worker processes set this to False: they read the encoding cache and gallery index
+# the parent process writes, but never write them, so workers cannot race each other on the files
+PERSIST_CACHES = True
+
+# Unknown face crops are written by a background thread. A crop within UNKNOWN_DEDUP_DISTANCE
+# of one saved in the last UNKNOWN_COOLDOWN seconds is skipped, and the oldest crops are
+# deleted once the directory exceeds UNKNOWN_MAX_BYTES
+UNKNOWN_DEDUP_DISTANCE = 0.5
+UNKNOWN_COOLDOWN = 30.0
+UNKNOWN_MAX_BYTES = 500 * 1024 * 1024
+UNKNOWN_QUEUE_SIZE = 16
+unknown_face_writer = None
+_writer_lock = threading.Lock()
+
+# With batching enabled, faces from concurrent callers (e.g. several cameras) are encoded
+# together once ENCODE_BATCH_MAX faces are waiting or the oldest has waited ENCODE_BATCH_BUDGET seconds
+ENCODE_BATCH_BUDGET = 0.02
+ENCODE_BATCH_MAX = 32
+encoding_batcher = None
+
+# face_recognition (and dlib) take seconds to import, so they are loaded on first use or by
+# warm_up() on a background thread. Recognition stays offline until gallery_ready is set.
+face_recognition_lib = None
+gallery_ready = threading.Event()
+warm_up_error = None
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+# Show a message to the user; the GUI passes a function that opens message boxes instead
+# kind is 'info', 'warning' or 'error'
+def print_notice(kind, title, message):
+    print(f"[{kind.upper()}]: {title}: {message}")
 
-# Load known faces from the directory
+# The face_recognition module, imported on first use
+def load_face_recognition():
+    global face_recognition_lib
+    if face_recognition_lib is None:
+        face_recognition_lib = startup.timed_import('face_recognition')
+    return face_recognition_lib
+
+# Encode the first face found in an image file
+def encode_face_file(path):
+    lib = load_face_recognition()
+    image = lib.load_image_file(path)
+    encodings = lib.face_encodings(image)
+    return encodings[0] if encodings else None
+
+# List (name, path) pairs for known face images
+# Files are named {name}.jpg, or several images can go in a {name}/ subdirectory
+def list_known_face_files(directory=None):
+    directory = directory or KNOWN_FACES_DIR
+    files = []
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.lower().endswith((".jpg", ".png")):
+                    files.append((entry, os.path.join(path, filename)))
+        elif entry.lower().endswith((".jpg", ".png")):
+            files.append((os.path.splitext(entry)[0], path))
+    return files
+
+# Read per-identity thresholds if the thresholds file exists
+def load_thresholds(path=None):
+    path = path or THRESHOLDS_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return {str(name): float(value) for name, value in json.load(f).items()}
+    except Exception as e:
+        print(f"[Warning]: Failed to read thresholds from {path}: {e}")
+        return {}
+
+# Load known faces from the directory, only encoding new or changed files
+# The encoding cache is read from disk again each time, so recognition workers pick up the
+# encodings their parent process wrote
 def load_known_faces():
-    global known_encodings, known_names
-    known_encodings = []
-    known_names = []
+    global gallery, encoding_store
+    encoding_store = EncodingStore(ENCODING_CACHE_PATH)
+
+    new_gallery = FaceGallery(tolerance=MATCH_TOLERANCE, index_kind=gallery.index_kind,
+                              index_cache_path=GALLERY_INDEX_PATH, save_index=PERSIST_CACHES)
+    paths = []
+    encoded = 0
 
 # Load each image file in the known faces directory
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        if filename.lower().endswith((".jpg", ".png")):
-            path = os.path.join(KNOWN_FACES_DIR, filename)
-            image = face_recognition_lib.load_image_file(path)
-            encodings = face_recognition_lib.face_encodings(image)
-            if encodings:
-                known_encodings.append(encodings[0])
-                known_names.append(os.path.splitext(filename)[0])
-            else:
-                print(f"[Warning]: No faces found in {filename}. Skipping.")
+    for name, path in list_known_face_files():
+        paths.append(path)
+        found, encoding, digest = encoding_store.lookup(path)
+        if not found:
+            encoding = encode_face_file(path)
+            encoding_store.put(path, digest, encoding)
+            encoded += 1
+            if encoding is None:
+                print(f"[Warning]: No faces found in {path}. Skipping.")
+        if encoding is not None:
+            new_gallery.add(name, encoding)
+
+    for name, threshold in load_thresholds().items():
+        new_gallery.set_threshold(name, threshold)
+
+    encoding_store.prune(paths)
+    if PERSIST_CACHES:
+        encoding_store.save()
+    new_gallery.snapshot()
+    gallery = new_gallery
+    # The tolerance may have been changed by apply_config while the faces were loading
+    if gallery.tolerance != MATCH_TOLERANCE:
+        gallery.set_tolerance(MATCH_TOLERANCE)
+    gallery_ready.set()
+    print(f"[INFO]: Loaded {len(gallery)} known people "
+          f"({gallery.encoding_count()} encodings, {encoded} newly encoded).")
+    return encoded
+
+
+# Load the face libraries, the face detector and the known faces on a background thread
+# Returns gallery_ready; on_ready(error) is called when warm-up finishes, with None on success
+def warm_up(on_ready=None):
+    global _warm_up_thread
+    with _warm_up_lock:
+        thread = _warm_up_thread
+        if thread is None:
+            thread = _warm_up_thread = threading.Thread(target=_warm_up, name='face-warm-up', daemon=True)
+            thread.start()
+    if on_ready is not None:
+        threading.Thread(target=lambda: (thread.join(), on_ready(warm_up_error)), daemon=True).start()
+    return gallery_ready
+
+
+def _warm_up():
+    global warm_up_error
+    try:
+        with startup.phase('import face_recognition'):
+            load_face_recognition()
+        with startup.phase('face detector'):
+            get_face_detector()
+        with startup.phase('known faces'):
+            if not gallery_ready.is_set():
+                load_known_faces()
+        startup.mark('recognition_ready')
+    except Exception as e:
+        warm_up_error = e
+        print(f"[Error]: Face recognition failed to start: {e}")
+
+
+# Start warm-up if needed and wait for it, for tools that need recognition from the first frame
+# Returns False if warm-up failed or the timeout ran out
+def ensure_ready(timeout=None):
+    warm_up()
+    _warm_up_thread.join(timeout)
+    return recognition_ready()
+
+
+# Whether recognition is online; until then frames pass through without face recognition
+def recognition_ready():
+    return gallery_ready.is_set() and face_recognition_lib is not None and warm_up_error is None
 
 
 # Reload known faces (useful after adding new faces)
 def reload_known_faces():
-    global known_encodings, known_names
-    known_encodings = []
-    known_names = []
-
-# Load each image file in the known faces directory
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        if filename.lower().endswith((".jpg", ".png")):
-            path = os.path.join(KNOWN_FACES_DIR, filename)
-            image = face_recognition_lib.load_image_file(path)
-            encodings = face_recognition_lib.face_encodings(image)
-            if encodings:
-                known_encodings.append(encodings[0])
-                known_names.append(os.path.splitext(filename)[0])
+    load_known_faces()
     print("[INFO]: Reloaded known faces from directory.")
 
 
-# Recognize faces in a given frame
-def recognize_faces(frame):
+# Pad motion regions and merge overlapping ones into (top, right, bottom, left) boxes
+def merge_regions(regions, frame_shape, padding=None):
+    padding = MOTION_ROI_PADDING if padding is None else padding
+    height, width = frame_shape[:2]
+    boxes = []
+    for (x, y, w, h) in regions:
+        pad_x = int(w * padding)
+        pad_y = int(h * padding)
+        boxes.append([max(0, y - pad_y), min(width, x + w + pad_x),
+                      min(height, y + h + pad_y), max(0, x - pad_x)])
+
+# Repeatedly union boxes that overlap until none do
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for box in boxes:
+            for other in result:
+                if box[0] < other[2] and other[0] < box[2] and box[3] < other[1] and other[3] < box[1]:
+                    other[0] = min(other[0], box[0])
+                    other[1] = max(other[1], box[1])
+                    other[2] = max(other[2], box[2])
+                    other[3] = min(other[3], box[3])
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    return [tuple(box) for box in boxes]
+
+
+# The default face detector, created on first use
+def get_face_detector():
+    global face_detector
+    with _detector_lock:
+        if face_detector is None:
+            face_detector = create_face_detector(FACE_DETECTOR)
+        return face_detector
+
+
+# Switch the default face detector, e.g. set_face_detector('haar>hog')
+def set_face_detector(spec):
+    global face_detector, FACE_DETECTOR
+    detector = create_face_detector(spec)
+    with _detector_lock:
+        FACE_DETECTOR, face_detector = spec, detector
+    print(f"[INFO]: Using face detector {spec}.")
+
+
+# Apply recognition, path and unknown face settings from a config.Config
+# Called again with hot changes while running: the gallery keeps its encodings and index,
+# only its tolerance changes. Paths are read when faces are loaded or saved.
+def apply_config(config):
+    global KNOWN_FACES_DIR, UNKNOWN_FACES_DIR, THRESHOLDS_FILE, ENCODING_CACHE_PATH, GALLERY_INDEX_PATH
+    global MOTION_ROI_MODE, MOTION_ROI_SCALE, MOTION_ROI_PADDING, MIN_DETECTION_SIZE
+    global UNKNOWN_DEDUP_DISTANCE, UNKNOWN_COOLDOWN, UNKNOWN_MAX_BYTES, MATCH_TOLERANCE
+    KNOWN_FACES_DIR = config['paths.known_faces']
+    UNKNOWN_FACES_DIR = config['paths.unknown_faces']
+    os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
+    os.makedirs(UNKNOWN_FACES_DIR, exist_ok=True)
+    THRESHOLDS_FILE = config['paths.thresholds'] or os.path.join(KNOWN_FACES_DIR, 'thresholds.json')
+    ENCODING_CACHE_PATH = config['paths.encoding_cache']
+    GALLERY_INDEX_PATH = config['paths.gallery_index']
+
+    MOTION_ROI_MODE = config['recognition.roi_mode']
+    MOTION_ROI_SCALE = config['recognition.roi_scale']
+    MOTION_ROI_PADDING = config['recognition.roi_padding']
+    MIN_DETECTION_SIZE = config['recognition.min_detection_size']
+    MATCH_TOLERANCE = config['recognition.tolerance']
+    if gallery.tolerance != MATCH_TOLERANCE:
+        gallery.set_tolerance(MATCH_TOLERANCE)
+    if FACE_DETECTOR != config['recognition.detector']:
+        set_face_detector(config['recognition.detector'])
+
+    UNKNOWN_DEDUP_DISTANCE = config['unknown_faces.dedup_distance']
+    UNKNOWN_COOLDOWN = config['unknown_faces.cooldown']
+    UNKNOWN_MAX_BYTES = config['unknown_faces.max_bytes']
+    writer = unknown_face_writer
+    if writer is not None:
+        writer.dedup_distance = UNKNOWN_DEDUP_DISTANCE
+        writer.cooldown = UNKNOWN_COOLDOWN
+        writer.max_bytes = UNKNOWN_MAX_BYTES
+
+
+# Find faces at a reduced scale, either in the whole frame or only inside motion regions
+# Returned boxes are in full-resolution frame coordinates
+def locate_faces(rgb_frame, regions=None, scale=1.0, detector=None):
+    detector = detector or get_face_detector()
+    if regions is None:
+        boxes = [(0, rgb_frame.shape[1], rgb_frame.shape[0], 0)]
+    else:
+        boxes = merge_regions(regions, rgb_frame.shape)
+
+    face_locations = []
+    for (top, right, bottom, left) in boxes:
+        roi = rgb_frame[top:bottom, left:right]
+        if scale != 1.0:
+            if min(roi.shape[:2]) * scale < MIN_DETECTION_SIZE:
+                continue
+            roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        elif min(roi.shape[:2]) < MIN_DETECTION_SIZE:
+            continue
+        for (t, r, b, l) in detector.detect(roi):
+            face_locations.append((int(t / scale) + top, int(r / scale) + left,
+                                   int(b / scale) + top, int(l / scale) + left))
+    return face_locations
+
+
+# Find face boxes, only inside motion regions when they are given and MOTION_ROI_MODE is on
+# detector is a face_detectors.FaceDetector; the default one is used if it is None
+def detect_faces(rgb_frame, regions=None, detector=None):
+    detector = detector or get_face_detector()
+    with metrics.timer('face_locations'):
+        if regions is not None and MOTION_ROI_MODE:
+            return locate_faces(rgb_frame, regions, MOTION_ROI_SCALE, detector)
+        return detector.detect(rgb_frame)
+
+
+# Encode the given face boxes, returning None if encoding failed
+def encode_faces(rgb_frame, face_locations):
+    if not face_locations:
+        return []
+    try:
+        with metrics.timer('face_encodings'):
+            batcher = encoding_batcher
+            if batcher is not None:
+                return batcher.encode(rgb_frame, face_locations)
+            return load_face_recognition().face_encodings(rgb_frame, face_locations)
+    except Exception as e:
+        print(f"[Error]: Face encoding failed: {e}")
+        return None
+
+
+# Match face encodings against the gallery in one batch, returning (face_names, distances)
+def identify_encodings(face_encodings):
+    with metrics.timer('matching'):
+        matches = gallery.identify(face_encodings) if len(face_encodings) else []
+    return [name for name, _ in matches], [distance for _, distance in matches]
+
+
+# Encode the given face boxes and match them against the gallery
+# Returns (face_names, distances), both empty if encoding failed
+def identify_faces(rgb_frame, face_locations):
+    face_encodings = encode_faces(rgb_frame, face_locations)
+    if face_encodings is None:
+        return [], []
+    return identify_encodings(face_encodings)
+
+
+# Like analyze_faces, but also returns the face encodings
+# Returns (face_locations, face_names, distances, face_encodings), all empty until recognition is ready
+def analyze_faces_encoded(frame, regions=None, detector=None):
+    if not recognition_ready():
+        return [], [], [], []
     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    face_locations = face_recognition_lib.face_locations(rgb_frame)
-    face_encodings = []
-
-# Get face encodings for detected faces
-    if face_locations:
-        try:
-            face_encodings = face_recognition_lib.face_encodings(rgb_frame, face_locations)
-        except Exception as e:
-            print(f"[Error]: Face encoding failed: {e}")
-            face_encodings = []
-
-# Match detected faces with known faces
-    face_names = []
-    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-        name = "Unknown"
-        if known_encodings:
-            distances = face_recognition_lib.face_distance(known_encodings, face_encoding)
-            best_match_index = np.argmin(distances)
-            if distances[best_match_index] < 0.4:
-                name = known_names[best_match_index]
+    face_locations = detect_faces(rgb_frame, regions, detector)
+    face_encodings = encode_faces(rgb_frame, face_locations)
+    if face_encodings is None:
+        return [], [], [], []
+    face_names, distances = identify_encodings(face_encodings)
+    return face_locations, face_names, distances, face_encodings
+
+
+# Detect, encode and match faces without modifying the frame
+# Returns (face_locations, face_names, distances)
+def analyze_faces(frame, regions=None, detector=None):
+    face_locations, face_names, distances, _ = analyze_faces_encoded(frame, regions, detector)
+    return face_locations, face_names, distances
+
 
 # Draw rectangles and labels around detected faces
+def annotate_faces(frame, face_locations, face_names):
+    for (top, right, bottom, left), name in zip(face_locations, face_names):
         cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
         cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 0, 255), 2)
-        face_names.append(name)
-
-# Save unknown faces to the unknown faces directory
-        if name == "Unknown":
-            now_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
-            top_c = max(0, top)
-            bottom_c = min(frame.shape[0], bottom)
-            left_c = max(0, left)
-            right_c = min(frame.shape[1], right)
-
-# Crop the face from the frame
-            if bottom_c > top_c and right_c > left_c:
-                face_crop = frame[top_c:bottom_c, left_c:right_c]
-                if face_crop.size > 0:
-                    filename = f"unknown_{now_str}_{random.randint(1000, 9999)}.jpg"
-                    save_path = os.path.join(UNKNOWN_FACES_DIR, filename)
-                    success = cv2.imwrite(save_path, face_crop)
-                    if success:
-                        print(f"[INFO]: Saved unknown face to {save_path}.")
-                    else:
-                        print(f"[Error]: Failed to save unknown face to {save_path}.")
+    return frame
+
+
+# Encode faces of concurrent callers in shared batches; only pays off with several recognition
+# threads, since a lone caller just waits out the budget
+# callers is the number of recognition threads, which lets a batch go out once all of them are waiting
+def enable_encoding_batching(budget=ENCODE_BATCH_BUDGET, max_faces=ENCODE_BATCH_MAX, callers=None):
+    global encoding_batcher
+    close_encoding_batcher()
+    encoding_batcher = EncodingBatcher(budget, max_faces, callers=callers)
+    print(f"[INFO]: Batching face encodings for up to {budget * 1000:.0f} ms or {max_faces} faces.")
+
+
+# Encode any waiting faces and go back to encoding each frame on its own
+def close_encoding_batcher():
+    global encoding_batcher
+    batcher, encoding_batcher = encoding_batcher, None
+    if batcher is not None:
+        batcher.close()
+        print(f"[STATS]: encoding batches {batcher.stats()}")
+
+
+# Background writer for unknown face crops, started on first use
+def get_unknown_face_writer():
+    global unknown_face_writer
+    with _writer_lock:
+        if unknown_face_writer is None:
+            unknown_face_writer = UnknownFaceWriter(UNKNOWN_FACES_DIR, queue_size=UNKNOWN_QUEUE_SIZE,
+                                                    dedup_distance=UNKNOWN_DEDUP_DISTANCE,
+                                                    cooldown=UNKNOWN_COOLDOWN, max_bytes=UNKNOWN_MAX_BYTES)
+        return unknown_face_writer
+
 
+# Write any queued unknown face crops and stop the writer
+def close_unknown_face_writer():
+    global unknown_face_writer
+    with _writer_lock:
+        writer, unknown_face_writer = unknown_face_writer, None
+    if writer is not None:
+        writer.close()
+        print(f"[STATS]: unknown faces {writer.stats()}")
+
+
+# Queue unknown faces for saving to the unknown faces directory
+# Passing the face encodings lets repeated crops of the same person be skipped
+# Returns the crop path for each face (None for known, duplicate or dropped faces)
+def save_unknown_faces(frame, face_locations, face_names, face_encodings=None):
+    crop_paths = [None] * len(face_locations)
+    if UNKNOWN_NAME not in face_names:
+        return crop_paths
+    writer = get_unknown_face_writer()
+    for i, (box, name) in enumerate(zip(face_locations, face_names)):
+        if name == UNKNOWN_NAME:
+            encoding = face_encodings[i] if face_encodings is not None and i < len(face_encodings) else None
+            crop_paths[i] = writer.submit(frame, box, encoding)
+    return crop_paths
+
+
+# Per-face records for the event log: name, match distance, box and unknown crop path
+def describe_faces(face_locations, face_names, distances, crop_paths=None):
+    crop_paths = crop_paths or [None] * len(face_locations)
+    return [{"name": name, "distance": round(float(distance), 4), "box": [int(v) for v in box], "crop": crop}
+            for box, name, distance, crop in zip(face_locations, face_names, distances, crop_paths)]
+
+
+# Recognize faces and also return the per-face records from describe_faces
+def recognize_faces_detailed(frame, regions=None, detector=None):
+    face_locations, face_names, distances, face_encodings = analyze_faces_encoded(frame, regions, detector)
+    crop_paths = save_unknown_faces(frame, face_locations, face_names, face_encodings)
+    annotate_faces(frame, face_locations, face_names)
+    return frame, face_names, describe_faces(face_locations, face_names, distances, crop_paths)
+
+
+# Recognize faces in a given frame, optionally only inside motion regions
+def recognize_faces(frame, regions=None, detector=None):
+    frame, face_names, _ = recognize_faces_detailed(frame, regions, detector)
     return frame, face_names
 
 
 # Capture and save a new face for registration
-def capture_and_save_face(name):
+def capture_and_save_face(name, notify=print_notice):
     from motion_detection import open_camera
 
 # Open the camera
     cap = open_camera()
     if cap is None:
-        messagebox.showerror("Camera Error", "Could not access camera. Please check if it's connected and not being used by another application.")
+        notify("error", "Camera Error", "Could not access camera. Please check if it's connected and not being used by another application.")
         return
 
 # Create a window to capture the face
@@ -135,23 +492,20 @@ def capture_and_save_face(name):
             key = cv2.waitKey(1) & 0xFF
             if key == ord('s'):
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition_lib.face_locations(rgb_frame)
+                face_locations = load_face_recognition().face_locations(rgb_frame)
                 if face_locations:
                     top, right, bottom, left = face_locations[0]
                     face_image = frame[top:bottom, left:right]
                     path = os.path.join(KNOWN_FACES_DIR, f"{name}.jpg")
                     cv2.imwrite(path, face_image)
                     print(f"[INFO]: Registered {name} successfully at {path}.")
-                    messagebox.showinfo("Success", f"Face registered for {name}!")
+                    notify("info", "Success", f"Face registered for {name}!")
                     reload_known_faces()
                 else:
-                    messagebox.showwarning("No Face", "No face detected in the frame.")
+                    notify("warning", "No Face", "No face detected in the frame.")
                 break
             elif key == ord('q'):
                 break
     finally:
         cap.release()
         cv2.destroyAllWindows()
-
-# Initial load of known faces
-load_known_faces()
\ No newline at end of file
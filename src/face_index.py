@@ -0,0 +1,228 @@
+import os
+import numpy as np
+
+# Galleries with at least this many encodings use the IVF index when kind is 'auto'
+AUTO_IVF_MIN_SIZE = 5000
+
+
+# Squared Euclidean distances between queries and matrix rows
+def squared_distances(queries, matrix, sq_norms):
+    q_norms = np.einsum('ij,ij->i', queries, queries)
+    dist = queries @ matrix.T
+    dist *= -2.0
+    dist += q_norms[:, None]
+    dist += sq_norms[None, :]
+    np.maximum(dist, 0.0, out=dist)
+    return dist
+
+
+# Pick the k smallest entries per row, sorted, padding with inf / -1
+def top_k(dist, rows, k):
+    count = dist.shape[1]
+    out_dist = np.full((len(dist), k), np.inf, dtype=np.float32)
+    out_rows = np.full((len(dist), k), -1, dtype=np.int64)
+    if count == 0:
+        return out_dist, out_rows
+
+    take = min(k, count)
+    if take < count:
+        idx = np.argpartition(dist, take - 1, axis=1)[:, :take]
+    else:
+        idx = np.tile(np.arange(count), (len(dist), 1))
+    part = np.take_along_axis(dist, idx, axis=1)
+    order = part.argsort(axis=1)
+    out_dist[:, :take] = np.take_along_axis(part, order, axis=1)
+    out_rows[:, :take] = rows[np.take_along_axis(idx, order, axis=1)]
+    return out_dist, out_rows
+
+
+# Exact nearest-neighbour search by a full scan of the matrix
+class BruteForceIndex:
+    kind = 'brute'
+
+    def __init__(self):
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    # Index the rows of an encoding matrix
+    def build(self, matrix):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        return self
+
+    # Return (distances, row ids) of the k nearest rows for each query
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        dist = squared_distances(queries, self.matrix, self.sq_norms)
+        dist, rows = top_k(dist, np.arange(len(self.matrix)), k)
+        return np.sqrt(dist), rows
+
+    # Arrays needed to restore the index
+    def state(self):
+        return {'matrix': self.matrix}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls().build(state['matrix'])
+
+
+# Approximate search over k-means partitions (inverted file index)
+class IVFIndex:
+    kind = 'ivf'
+
+    # nlist partitions are trained; nprobe of them are scanned per query
+    def __init__(self, nlist=None, nprobe=8, iterations=15, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.row_ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    # Assign each row to its nearest centroid, in chunks to bound memory
+    @staticmethod
+    def _assign(matrix, centroids, chunk=8192):
+        c_norms = np.einsum('ij,ij->i', centroids, centroids)
+        labels = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), chunk):
+            block = matrix[start:start + chunk]
+            labels[start:start + chunk] = squared_distances(block, centroids, c_norms).argmin(axis=1)
+        return labels
+
+    # Train centroids with Lloyd's algorithm on a sample of the rows
+    def _train(self, matrix, nlist):
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(matrix), nlist * 64)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            labels = self._assign(sample, centroids)
+            counts = np.bincount(labels, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+            # Re-seed empty partitions from random sample points
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        return centroids
+
+    # Partition the rows of an encoding matrix
+    def build(self, matrix):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        count = len(matrix)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(count)))
+        nlist = max(1, min(nlist, count))
+
+        if count == 0:
+            self.centroids = np.zeros((0, matrix.shape[1]), dtype=np.float32)
+            labels = np.zeros(0, dtype=np.int64)
+        else:
+            self.centroids = self._train(matrix, nlist)
+            labels = self._assign(matrix, self.centroids)
+
+        # Store rows grouped by partition so each list is one contiguous slice
+        order = np.argsort(labels, kind='stable')
+        self.row_ids = order.astype(np.int64)
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        self.offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(self.centroids)), out=self.offsets[1:])
+        return self
+
+    # Return (distances, row ids) of the k nearest rows for each query
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(self.centroids) == 0 or len(queries) == 0:
+            return out_dist, out_rows
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        c_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        c_dist = squared_distances(queries, self.centroids, c_norms)
+        if nprobe < len(self.centroids):
+            probes = np.argpartition(c_dist, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(len(self.centroids)), (len(queries), 1))
+
+        for i, query in enumerate(queries):
+            lists = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes[i]]
+            candidates = np.concatenate(lists)
+            dist = squared_distances(query[None, :], self.matrix[candidates], self.sq_norms[candidates])
+            d, r = top_k(dist, self.row_ids[candidates], k)
+            out_dist[i] = d[0]
+            out_rows[i] = r[0]
+        return np.sqrt(out_dist), out_rows
+
+    # Arrays needed to restore the index
+    def state(self):
+        return {
+            'centroids': self.centroids,
+            'offsets': self.offsets,
+            'row_ids': self.row_ids,
+            'matrix': self.matrix,
+            'nprobe': np.array(self.nprobe),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls(nlist=len(state['centroids']), nprobe=int(state['nprobe']))
+        index.centroids = np.asarray(state['centroids'], dtype=np.float32)
+        index.offsets = np.asarray(state['offsets'], dtype=np.int64)
+        index.row_ids = np.asarray(state['row_ids'], dtype=np.int64)
+        index.matrix = np.ascontiguousarray(state['matrix'], dtype=np.float32)
+        index.sq_norms = np.einsum('ij,ij->i', index.matrix, index.matrix)
+        return index
+
+
+INDEX_TYPES = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+
+# Create an empty index of the given kind ('brute', 'ivf' or 'auto')
+def make_index(kind='auto', size=0, **options):
+    if kind == 'auto':
+        kind = IVFIndex.kind if size >= AUTO_IVF_MIN_SIZE else BruteForceIndex.kind
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    return INDEX_TYPES[kind](**options)
+
+
+# Write a built index to an .npz file atomically
+# The temporary file is named per process, so concurrent writers cannot truncate each other's
+def save_index(index, path, **extra):
+    arrays = {f"index_{key}": value for key, value in index.state().items()}
+    arrays.update(extra)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, kind=np.array(index.kind), **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Read an index written by save_index, returning (index, extra arrays)
+def load_index(path):
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data['kind'])
+        state = {key[len('index_'):]: data[key] for key in data.files if key.startswith('index_')}
+        extra = {key: data[key] for key in data.files if key != 'kind' and not key.startswith('index_')}
+    return INDEX_TYPES[kind].from_state(state), extra
@@ -0,0 +1,207 @@
+import os
+import hashlib
+import threading
+import numpy as np
+
+from face_index import BruteForceIndex, make_index, save_index, load_index, squared_distances
+
+# Default maximum face distance for a match
+DEFAULT_TOLERANCE = 0.4
+UNKNOWN_NAME = "Unknown"
+
+
+# Known face encodings held as one contiguous float32 matrix for batched matching
+class FaceGallery:
+
+    # Create an empty gallery with a default match tolerance
+    # index_kind is 'brute', 'ivf' or 'auto'; built IVF indexes are cached at index_cache_path
+    # With save_index=False a cached index is used but never written, e.g. in worker processes
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, dim=128, index_kind='auto',
+                 index_options=None, index_cache_path=None, save_index=True):
+        self.tolerance = tolerance
+        self.dim = dim
+        self.index_kind = index_kind
+        self.index_options = index_options or {}
+        self.index_cache_path = index_cache_path
+        self.save_index = save_index
+        self._rows = {}
+        self._thresholds = {}
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    # Build a gallery from parallel lists of encodings and names
+    @classmethod
+    def from_lists(cls, encodings, names, **options):
+        gallery = cls(**options)
+        for name, encoding in zip(names, encodings):
+            gallery.add(name, encoding)
+        return gallery
+
+    # Add one or more encodings for an identity
+    def add(self, name, encodings):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(encodings) == 0:
+            return
+        with self._lock:
+            self._rows.setdefault(name, []).append(encodings)
+            self._snapshot = None
+
+    # Remove an identity and all its encodings
+    def remove(self, name):
+        with self._lock:
+            self._rows.pop(name, None)
+            self._thresholds.pop(name, None)
+            self._snapshot = None
+
+    # Override the match tolerance for a single identity
+    def set_threshold(self, name, threshold):
+        with self._lock:
+            if threshold is None:
+                self._thresholds.pop(name, None)
+            else:
+                self._thresholds[name] = float(threshold)
+            self._snapshot = None
+
+    # Change the default match tolerance without rebuilding the index
+    # Identities with their own threshold keep it
+    def set_tolerance(self, tolerance):
+        with self._lock:
+            self.tolerance = tolerance
+            snap = self._snapshot
+            if snap is not None:
+                thresholds = np.array([self._thresholds.get(name, tolerance) for name in snap['identities']],
+                                      dtype=np.float32)
+                # Readers holding the old snapshot finish with the old thresholds
+                self._snapshot = dict(snap, thresholds=thresholds)
+
+    # Names of all identities in the gallery
+    @property
+    def names(self):
+        return sorted(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    # Number of stored encodings across all identities
+    def encoding_count(self):
+        return sum(len(chunk) for chunks in self._rows.values() for chunk in chunks)
+
+    # Stack the encodings into a matrix grouped by identity and index it
+    def _build(self):
+        identities = sorted(self._rows)
+        blocks = [np.concatenate(self._rows[name]) for name in identities]
+        counts = np.array([len(block) for block in blocks], dtype=np.int64)
+
+        if blocks:
+            matrix = np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32)
+        else:
+            matrix = np.zeros((0, self.dim), dtype=np.float32)
+        row_identity = np.repeat(np.arange(len(identities)), counts)
+        thresholds = np.array([self._thresholds.get(name, self.tolerance) for name in identities],
+                              dtype=np.float32)
+        return {
+            'identities': identities,
+            'matrix': matrix,
+            'row_identity': row_identity,
+            'max_count': int(counts.max()) if len(counts) else 0,
+            'thresholds': thresholds,
+            'index': self._build_index(matrix, identities, counts),
+        }
+
+    # Build the search index, reusing a saved one if the gallery has not changed
+    def _build_index(self, matrix, identities, counts):
+        index = make_index(self.index_kind, len(matrix), **self.index_options)
+        if index.kind == BruteForceIndex.kind or not self.index_cache_path:
+            return index.build(matrix)
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(matrix.tobytes())
+        digest.update('\0'.join(identities).encode('utf-8'))
+        digest.update(counts.tobytes())
+        fingerprint = digest.hexdigest()
+
+        if os.path.exists(self.index_cache_path):
+            try:
+                cached, extra = load_index(self.index_cache_path)
+                if cached.kind == index.kind and str(extra.get('fingerprint')) == fingerprint:
+                    return cached
+            except Exception as e:
+                print(f"[Warning]: Ignoring unreadable gallery index {self.index_cache_path}: {e}")
+
+        index.build(matrix)
+        if not self.save_index:
+            return index
+        try:
+            cache_dir = os.path.dirname(self.index_cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            save_index(index, self.index_cache_path, fingerprint=np.array(fingerprint))
+        except Exception as e:
+            print(f"[Error]: Failed to save gallery index {self.index_cache_path}: {e}")
+        return index
+
+    # Return the current matrix snapshot, rebuilding it after changes
+    def snapshot(self):
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._build()
+            return self._snapshot
+
+    # Euclidean distances between each query and every stored encoding
+    def distances(self, encodings):
+        snap = self.snapshot()
+        queries = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        matrix = snap['matrix']
+        dist = squared_distances(queries, matrix, np.einsum('ij,ij->i', matrix, matrix))
+        return np.sqrt(dist)
+
+    # Top-k (name, distance) candidates for each query, closest first
+    def match(self, encodings, k=1):
+        if len(encodings) == 0:
+            return []
+        snap = self.snapshot()
+        identities = snap['identities']
+        if not identities:
+            return [[] for _ in range(len(encodings))]
+
+        # Fetch enough rows that k distinct identities are present
+        k = min(k, len(identities))
+        k_rows = min(len(snap['matrix']), k * snap['max_count'])
+        dist, rows = snap['index'].search(encodings, k_rows)
+
+        results = []
+        for row_dist, row_ids in zip(dist, rows):
+            seen = []
+            for d, row in zip(row_dist, row_ids):
+                if row < 0:
+                    break
+                name = identities[snap['row_identity'][row]]
+                if all(name != other for other, _ in seen):
+                    seen.append((name, float(d)))
+                    if len(seen) == k:
+                        break
+            results.append(seen)
+        return results
+
+    # Best identity for each query, or Unknown if it exceeds the identity's threshold
+    def identify(self, encodings):
+        if len(encodings) == 0:
+            return []
+        snap = self.snapshot()
+        if not snap['identities']:
+            return [(UNKNOWN_NAME, float('inf')) for _ in range(len(encodings))]
+
+        dist, rows = snap['index'].search(encodings, 1)
+        results = []
+        for d, row in zip(dist[:, 0], rows[:, 0]):
+            if row < 0:
+                results.append((UNKNOWN_NAME, float('inf')))
+                continue
+            identity = snap['row_identity'][row]
+            name = snap['identities'][identity]
+            ok = d < snap['thresholds'][identity]
+            results.append((name if ok else UNKNOWN_NAME, float(d)))
+        return results
@@ -1,11 +1,19 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import threading
-import main
-import cv2
-import sys
-import os
+import startup
+
+# Face recognition libraries are not imported here; they load in the background once the window is up
+with startup.record_imports():
+    import tkinter as tk
+    from tkinter import ttk, messagebox, simpledialog
+    from PIL import Image, ImageTk
+    import threading
+    import main
+    import config
+    import metrics
+    import cv2
+    import numpy as np
+    import sys
+    import os
+    import time
 
 # Adjust sys.path to include src directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,6 +25,20 @@ if parent_dir not in sys.path:
 from src import main
 
 
+# Preview frames per second, independent of the detection frame rate
+PREVIEW_FPS = 25
+
+
+# Show detection and registration messages in message boxes
+def show_message_box(kind, title, message):
+    if kind == "error":
+        messagebox.showerror(title, message)
+    elif kind == "warning":
+        messagebox.showwarning(title, message)
+    else:
+        messagebox.showinfo(title, message)
+
+
 # Main application class
 class ModernMotionApp:
 
@@ -32,6 +54,19 @@ class ModernMotionApp:
         self.thread = None
         self.running = False
 
+        # Preview state: frames are resized on the detection thread and shown on the Tk thread
+        # At most one preview and one status update are scheduled with root.after at a time
+        self._preview_lock = threading.Lock()
+        self._pending_image = None
+        self._pending_status = None
+        self._preview_scheduled = False
+        self._status_scheduled = False
+        self._last_preview = 0.0
+        self._label_size = (0, 0)
+        self._preview_key = None
+        self._preview_size = None
+        self._photo = None
+
         self.setup_styles()
         self.create_header()
         self.create_main_content()
@@ -113,6 +148,7 @@ class ModernMotionApp:
                                     relief="flat",
                                     bd=0)
         self.video_label.pack(fill="both", expand=True, padx=3, pady=3)
+        self.video_label.bind("<Configure>", self._on_video_resize)
 
     # Create control panel with Start, Stop, and Register buttons
     def create_control_panel(self):
@@ -231,49 +267,104 @@ class ModernMotionApp:
         info_label.pack(side="right", padx=20)
 
 
+    # Mark the window as shown and start loading face recognition in the background
+    def on_window_shown(self):
+        startup.mark('window_shown')
+        self.update_status("⏳ Loading face recognition... The camera can be started now.")
+        main.warm_up(self._on_recognition_ready)
+
+    # Called on the warm-up thread once face recognition is loaded
+    def _on_recognition_ready(self, error):
+        if error is not None:
+            self.update_status(f"❌ Error: Face recognition failed to start: {error}")
+        elif not self.running:
+            self.update_status("✅ Face recognition ready. Ready to start detection")
+
     # Handle window closing event
     def on_closing(self):
         if self.running:
             self.stop_detection()
         self.root.destroy()
 
-    # Update the video frame in the GUI
-    def update_frame(self, frame):
-        try:
-            img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(img)
-
-            label_width = self.video_label.winfo_width()
-            label_height = self.video_label.winfo_height()
-
-            # Resize image to fit label while maintaining aspect ratio
-            if label_width > 1 and label_height > 1:
-                img_aspect = img.width / img.height
-                label_aspect = label_width / label_height
-
-                if img_aspect > label_aspect:
-                    new_width = label_width - 20
-                    new_height = int(new_width / img_aspect)
-                else:
-                    new_height = label_height - 20
-                    new_width = int(new_height * img_aspect)
+    # Remember the size of the video area; the preview size is recomputed from it (Tk thread)
+    def _on_video_resize(self, event):
+        self._label_size = (event.width, event.height)
 
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+    # Largest size that fits the video area while keeping the frame's aspect ratio
+    def _fit_size(self, width, height):
+        label_width, label_height = self._label_size
+        if label_width <= 20 or label_height <= 20:
+            return None
+        scale = min((label_width - 20) / width, (label_height - 20) / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
 
-            # Convert to ImageTk format
-            imgtk = ImageTk.PhotoImage(img)
-            self.root.after(0, self._update_label, imgtk)
+    # Update the video frame in the GUI; called from the detection thread
+    def update_frame(self, frame):
+        now = time.monotonic()
+        if now - self._last_preview < 1.0 / PREVIEW_FPS:
+            return
+        self._last_preview = now
+        try:
+            prepare_start = time.perf_counter()
+            height, width = frame.shape[:2]
+            key = (self._label_size, width, height)
+            if key != self._preview_key:
+                self._preview_key = key
+                self._preview_size = self._fit_size(width, height)
+            if self._preview_size is not None and self._preview_size != (width, height):
+                frame = cv2.resize(frame, self._preview_size, interpolation=cv2.INTER_LINEAR)
+
+            # PIL swaps BGR to RGB while copying the resized pixels, so there is no separate conversion pass
+            frame = np.ascontiguousarray(frame)
+            img = Image.frombuffer("RGB", (frame.shape[1], frame.shape[0]), frame, "raw", "BGR", 0, 1)
+            metrics.observe('preview_prepare', time.perf_counter() - prepare_start)
         except Exception as e:
             print(f"[Error]: Frame update failed: {e}")
-
-    # Internal method to update the video label
-    def _update_label(self, imgtk):
-        self.video_label.configure(image=imgtk, text="")
-        self.video_label.image = imgtk
+            return
+
+        # Replace any frame still waiting to be shown instead of queueing another callback
+        with self._preview_lock:
+            if self._pending_image is not None:
+                metrics.inc('preview_frames_replaced')
+            self._pending_image = img
+            if self._preview_scheduled:
+                return
+            self._preview_scheduled = True
+        self.root.after(0, self._show_pending_frame)
+
+    # Internal method to show the newest pending frame, reusing the PhotoImage while its size is unchanged
+    def _show_pending_frame(self):
+        with self._preview_lock:
+            img, self._pending_image = self._pending_image, None
+            self._preview_scheduled = False
+        if img is None:
+            return
+        if startup.mark('first_preview'):
+            startup.report()
+        with metrics.timer('gui_render'):
+            if self._photo is not None and (self._photo.width(), self._photo.height()) == img.size:
+                self._photo.paste(img)
+            else:
+                self._photo = ImageTk.PhotoImage(img)
+                self.video_label.configure(image=self._photo, text="")
+                self.video_label.image = self._photo
 
     # Update the status message in the GUI
     def update_status(self, msg):
-        self.root.after(0, self._update_status_ui, msg)
+        with self._preview_lock:
+            self._pending_status = msg
+            if self._status_scheduled:
+                return
+            self._status_scheduled = True
+        self.root.after(0, self._show_pending_status)
+
+    # Internal method to show the newest pending status message
+    def _show_pending_status(self):
+        with self._preview_lock:
+            msg, self._pending_status = self._pending_status, None
+            self._status_scheduled = False
+        if msg is not None:
+            self._update_status_ui(msg)
 
     # Internal method to update status text and color indicator
     def _update_status_ui(self, msg):
@@ -304,7 +395,7 @@ class ModernMotionApp:
     # Run the motion detection loop
     def _run_detection(self):
         try:
-            main.log_motion_for_gui(self.update_frame, self.update_status)
+            main.log_motion_for_gui(self.update_frame, self.update_status, notify=show_message_box)
         except Exception as e:
             self.update_status(f"❌ Error: {str(e)}")
             print(f"[ERROR]: Detection failed: {e}")
@@ -324,15 +415,26 @@ class ModernMotionApp:
         self.start_button.config(state="normal", bg="#00d9ff")
         self.stop_button.config(state="disabled", bg="#64748b")
 
-    # Register a new face safely
+    # Ask for a name and register the face on a background thread
     def on_register_face_click(self):
-        main.register_new_face_threadsafe(self.root)
+        name = simpledialog.askstring("Register Face", "Enter your name for registration:", parent=self.root)
+        if name:
+            threading.Thread(target=main.register_and_reload, args=(name, show_message_box), daemon=True).start()
+        else:
+            messagebox.showwarning("Input Error", "Name cannot be empty.")
 
 # Launch the GUI application
 def main_app():
     """Launch the GUI application"""
     root = tk.Tk()
+    # Apply the config before warm-up loads known faces, so its paths and tolerance are used
+    try:
+        main.configure(config.load_config())
+    except ValueError as e:
+        print(f"[ERROR]: Invalid configuration: {e}")
+        messagebox.showerror("Configuration Error", f"{e}\n\nUsing the default settings.")
     app = ModernMotionApp(root)
+    root.after(0, app.on_window_shown)
     root.mainloop()
 
 # Run the GUI application
@@ -1,11 +1,204 @@
-import pandas as pd
+import os
+import csv
+import json
+import threading
+from datetime import date
+
+from event_store import EventStore
+
+# Columns written by the CSV event log
+DEFAULT_FIELDS = ["Timestamp", "Camera", "Faces", "Detections", "Clip"]
+
 
 # Save motion detection log data to a CSV file
 def save_log(data, filename="motion_log.csv"):
     if data:
         try:
-            df = pd.DataFrame(data)
-            df.to_csv(filename, index=False)
+            fields = list(data[0].keys())
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(data)
             print(f"[LOG]: Motion log saved with {len(data)} entries.")
         except Exception as e:
             print(f"[Error]: Failed to write log: {e}")
+
+
+# Buffered, append-only event log; events are flushed every flush_size events or flush_interval seconds
+class EventSink:
+
+    def __init__(self, path, flush_size=10, flush_interval=5.0):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+
+    # Queue an event (a dict) for writing
+    def write(self, event):
+        with self._lock:
+            if self._closed:
+                return
+            self._buffer.append(event)
+            flush_now = len(self._buffer) >= self.flush_size
+            if not flush_now and self._timer is None and self.flush_interval:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    # Write all buffered events
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                self._write_rows(rows)
+                self.written += len(rows)
+            except Exception as e:
+                print(f"[Error]: Failed to write {len(rows)} events to {self.path}: {e}")
+
+    # Flush and release the underlying file or database
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._close()
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+# Line-oriented file log that rotates by size and/or day
+class RotatingFileSink(EventSink):
+
+    # max_bytes of None disables size rotation; rotate_daily starts a new file at midnight
+    def __init__(self, path, max_bytes=None, rotate_daily=False, **options):
+        super().__init__(path, **options)
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self._file = None
+        self._opened_on = None
+
+    # Name for a rotated file, e.g. motion_log.2026-01-01.1.csv
+    def _rotated_path(self):
+        base, ext = os.path.splitext(self.path)
+        day = self._opened_on.isoformat()
+        n = 1
+        while os.path.exists(f"{base}.{day}.{n}{ext}"):
+            n += 1
+        return f"{base}.{day}.{n}{ext}"
+
+    def _needs_rotation(self):
+        if self.rotate_daily and self._opened_on != date.today():
+            return True
+        return self.max_bytes is not None and self._file.tell() >= self.max_bytes
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # An existing file belongs to the day it was last written
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self._opened_on = date.fromtimestamp(os.path.getmtime(self.path))
+        else:
+            self._opened_on = date.today()
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, self._rotated_path())
+        self._open()
+
+    def _write_rows(self, rows):
+        if self._file is None:
+            self._open()
+        # Also checked right after opening, so a file left over from a previous run (yesterday's, or already full) is rotated first
+        if self._needs_rotation():
+            self._rotate()
+        self._write_lines(rows)
+        self._file.flush()
+
+    def _write_lines(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# CSV event log with a fixed set of columns; list and dict values (e.g. Detections) are written as JSON
+class CsvEventSink(RotatingFileSink):
+
+    def __init__(self, path, fields=DEFAULT_FIELDS, **options):
+        super().__init__(path, **options)
+        self.fields = list(fields)
+        self._writer = None
+
+    def _open(self):
+        super()._open()
+        if self._file.tell() > 0:
+            with open(self.path, newline='', encoding='utf-8') as f:
+                header = next(csv.reader(f), None)
+            # A file written with other columns is moved aside rather than appended to with the wrong header
+            if header != self.fields:
+                self._file.close()
+                rotated = self._rotated_path()
+                os.replace(self.path, rotated)
+                print(f"[Warning]: {self.path} has columns {header}, expected {self.fields}; moved it to {rotated}")
+                super()._open()
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fields, extrasaction='ignore')
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def _write_lines(self, rows):
+        self._writer.writerows({k: json.dumps(v, default=str) if isinstance(v, (list, dict)) else v
+                                for k, v in row.items()} for row in rows)
+
+
+# JSON Lines event log keeping every field of each event
+class JsonlEventSink(RotatingFileSink):
+
+    def _write_lines(self, rows):
+        self._file.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+
+
+# SQLite event log backed by the indexed event_store.EventStore (WAL mode, so readers never block the writer)
+class SqliteEventSink(EventSink):
+
+    def __init__(self, path, **options):
+        super().__init__(path, **options)
+        self.store = EventStore(path)
+
+    def _write_rows(self, rows):
+        self.store.add_events(rows)
+
+    def _close(self):
+        self.store.close()
+
+
+# Create an event sink from the file extension (.csv, .jsonl or .db/.sqlite)
+def create_event_sink(path, **options):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return CsvEventSink(path, **options)
+    options.pop('fields', None)
+    if ext in ('.jsonl', '.json'):
+        return JsonlEventSink(path, **options)
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        for key in ('max_bytes', 'rotate_daily'):
+            options.pop(key, None)
+        return SqliteEventSink(path, **options)
+    raise ValueError(f"Unsupported event log format: {path}")
@@ -2,44 +2,170 @@ import os
 import cv2
 import numpy as np
 from datetime import datetime
-import tkinter.simpledialog as simpledialog
-import tkinter.messagebox as messagebox
-import threading
 import time
+from collections import deque
 
-from motion_detection import open_camera, detect_motion
-from face_handler import recognize_faces, reload_known_faces, capture_and_save_face
-from logger import save_log
+from motion_detection import open_camera, MotionDetector
+from camera_source import ReconnectingCapture
+import camera_source
+import motion_detection
+import face_handler
+from face_handler import (recognize_faces_detailed, reload_known_faces, capture_and_save_face,
+                          close_unknown_face_writer, print_notice, warm_up, recognition_ready, annotate_faces)
+from logger import create_event_sink
+from pipeline import DetectionPipeline, format_stats
+from clip_recorder import ClipRecorder
+from adaptive_scheduler import AdaptiveScheduler, format_scheduler_stats
+from recognition_pool import RecognitionPool
+from tracker import FaceTracker
+import metrics
+import startup
+import config
 
 stop_flag = False
 
-# Detect motion and recognize faces in the frame
-def detect_motion_and_faces(cap, first_frame):
-    ret, frame = cap.read()
-    if not ret or frame is None:
-        print("[ERROR]: Failed to read frame from camera")
-        return None, first_frame, False, None
-    
-    # Detect motion
-    updated_first_frame, motion_detected = detect_motion(frame, first_frame)
+# Pipeline of the running detection session, for inspecting per-stage stats
+current_pipeline = None
 
-    # Recognize faces if motion is detected
-    face_names = []
-    if motion_detected:
-        frame, face_names = recognize_faces(frame)
-        print(f"[INFO]: Detected faces: {face_names}")
+# The settings below are defaults; configure() replaces them with the effective config.Config
+# (config.json, MOTION_* environment variables and --set overrides), which is read again at every
+# start from the same file and with the same overrides. While detection runs the file is watched
+# and hot settings are applied to the running pipeline (see config.SETTINGS for which are hot)
+current_config = None
+config_watcher = None
 
-    return frame, updated_first_frame, motion_detected, face_names
+# Motion events are appended to this log (.csv, .jsonl or .db) in batches
+# A .db log is an indexed event store that event_store.py can query by time, camera and person
+EVENT_LOG_PATH = "motion_log.csv"
+# Camera name recorded with each event
+CAMERA_NAME = "camera0"
+EVENT_FLUSH_SIZE = 10
+EVENT_FLUSH_INTERVAL = 5.0
+# Number of recent events kept in memory and returned when detection stops
+RECENT_EVENTS = 100
 
-# Log motion events for GUI application
-def log_motion_for_gui(update_frame_callback, update_status_callback):
-    global stop_flag
+# When the camera stops delivering frames it is reopened, waiting this many seconds after the
+# first failed attempt and doubling the wait after each one up to the maximum
+CAMERA_RECONNECT_BACKOFF = 0.5
+CAMERA_RECONNECT_MAX_BACKOFF = 10.0
+
+# Record a video clip of each motion event, from CLIP_PRE_SECONDS before it to CLIP_POST_SECONDS
+# after it; overlapping events are merged into one clip. Frames wait in a ring buffer of
+# CLIP_MEMORY_MB, stored as 'jpeg' or 'raw' frames, and clips are encoded on a background thread
+RECORD_CLIPS = True
+CLIPS_DIR = os.path.join('data', 'clips')
+CLIP_PRE_SECONDS = 5.0
+CLIP_POST_SECONDS = 5.0
+CLIP_MEMORY_MB = 64
+CLIP_STORAGE = 'jpeg'
+# Oldest clips are deleted when the clip directory grows past this size
+CLIPS_MAX_BYTES = 2 * 1024 ** 3
+
+# Run face recognition on a varying share of motion frames instead of all of them: every frame
+# when new motion or new faces appear, fewer during sustained motion, and fewer still while the
+# process uses more than SCHEDULER_CPU_BUDGET cores or results take longer than
+# SCHEDULER_LATENCY_SLO seconds (None for no target). After SCHEDULER_IDLE_AFTER seconds without
+# motion, motion detection only runs SCHEDULER_IDLE_FPS times a second
+ADAPTIVE_SCHEDULING = True
+SCHEDULER_CPU_BUDGET = None
+SCHEDULER_LATENCY_SLO = 0.5
+SCHEDULER_MAX_STRIDE = 8
+SCHEDULER_IDLE_AFTER = 30.0
+SCHEDULER_IDLE_FPS = 2.0
+
+# Seconds between pipeline stats log lines
+STATS_INTERVAL = 10
+
+# When metrics are enabled (metrics.ENABLED or MOTION_METRICS=1), append a JSON snapshot
+# of the stage timing histograms, queue depths and drop counts to this file every interval
+METRICS_DUMP_PATH = "metrics.jsonl"
+METRICS_DUMP_INTERVAL = 60.0
+
+# Run face recognition on 'threads' in this process or on a pool of worker 'processes'
+RECOGNITION_BACKEND = 'threads'
+current_recognition_pool = None
+
+# Track faces between frames so identified people are not re-encoded every frame
+USE_FACE_TRACKING = True
+current_tracker = None
+
+# Apply a config.Config to this module and the camera, motion and face modules
+# Motion, clip and scheduler settings come from the profile of CAMERA_NAME, if it has one
+def configure(cfg):
+    global current_config, CAMERA_NAME, EVENT_LOG_PATH, EVENT_FLUSH_SIZE, EVENT_FLUSH_INTERVAL
+    global RECENT_EVENTS, CAMERA_RECONNECT_BACKOFF, CAMERA_RECONNECT_MAX_BACKOFF
+    global RECORD_CLIPS, CLIPS_DIR, CLIP_PRE_SECONDS, CLIP_POST_SECONDS, CLIP_MEMORY_MB, CLIP_STORAGE, CLIPS_MAX_BYTES
+    global ADAPTIVE_SCHEDULING, SCHEDULER_CPU_BUDGET, SCHEDULER_LATENCY_SLO, SCHEDULER_MAX_STRIDE
+    global SCHEDULER_IDLE_AFTER, SCHEDULER_IDLE_FPS, STATS_INTERVAL, RECOGNITION_BACKEND, USE_FACE_TRACKING
+    camera_source.apply_config(cfg)
+    motion_detection.apply_config(cfg)
+    face_handler.apply_config(cfg)
+
+    CAMERA_NAME = cfg['camera.name']
+    profile = cfg.for_camera(CAMERA_NAME)
+    CAMERA_RECONNECT_BACKOFF = cfg['camera.reconnect_backoff']
+    CAMERA_RECONNECT_MAX_BACKOFF = cfg['camera.reconnect_max_backoff']
+    EVENT_LOG_PATH = cfg['events.log_path']
+    EVENT_FLUSH_SIZE = cfg['events.flush_size']
+    EVENT_FLUSH_INTERVAL = cfg['events.flush_interval']
+    RECENT_EVENTS = cfg['events.recent']
+
+    RECORD_CLIPS = profile['clips.enabled']
+    CLIPS_DIR = profile['clips.directory']
+    CLIP_PRE_SECONDS = profile['clips.pre_seconds']
+    CLIP_POST_SECONDS = profile['clips.post_seconds']
+    CLIP_MEMORY_MB = profile['clips.memory_mb']
+    CLIP_STORAGE = profile['clips.storage']
+    CLIPS_MAX_BYTES = profile['clips.max_bytes']
+
+    ADAPTIVE_SCHEDULING = profile['scheduler.enabled']
+    SCHEDULER_CPU_BUDGET = profile['scheduler.cpu_budget']
+    SCHEDULER_LATENCY_SLO = profile['scheduler.latency_slo']
+    SCHEDULER_MAX_STRIDE = profile['scheduler.max_stride']
+    SCHEDULER_IDLE_AFTER = profile['scheduler.idle_after']
+    SCHEDULER_IDLE_FPS = profile['scheduler.idle_fps']
+
+    STATS_INTERVAL = cfg['stats.interval']
+    RECOGNITION_BACKEND = cfg['recognition.backend']
+    USE_FACE_TRACKING = cfg['recognition.tracking']
+    current_config = cfg
+
+# Read the config file again now instead of waiting for the watcher
+# While detection runs only hot settings are applied; returns the keys that changed
+def reload_config():
+    if config_watcher is not None:
+        return config_watcher.check(force=True)
+    old = current_config or config.Config()
+    cfg = config.load_config(old.path, old.overrides)
+    configure(cfg)
+    return sorted(cfg.changed(old))
+
+# Log motion events for GUI application or the headless daemon
+# notify(kind, title, message) reports errors to the user; on_event(event) receives each motion event
+def log_motion_for_gui(update_frame_callback, update_status_callback, notify=print_notice, on_event=None):
+    global stop_flag, current_pipeline, current_recognition_pool, current_tracker, config_watcher
+
+# Read the config again so restart-only changes made since the last run take effect
+    previous = current_config or config.Config()
+    try:
+        configure(config.load_config(previous.path, previous.overrides))
+    except ValueError as e:
+        update_status_callback(f"❌ Error: Invalid configuration: {e}")
+        notify("error", "Configuration Error", str(e))
+        return []
+
+# Load face recognition in the background; frames are shown without recognition until it is ready
+    if not recognition_ready():
+        update_status_callback("⏳ Loading face recognition...")
+        warm_up(lambda error: update_status_callback(
+            f"❌ Error: Face recognition failed to start: {error}" if error else "✅ Face recognition ready."))
 
 # Open the camera
-    cap = open_camera()
+    with startup.phase('open camera'):
+        cap = open_camera()
     if cap is None:
         update_status_callback("❌ ERROR: Could not access camera! Check if it's connected and not in use.")
-        messagebox.showerror("Camera Error", "Could not access camera.\n\n" +
+        notify("error", "Camera Error", "Could not access camera.\n\n" +
                             "Possible solutions:\n" +
                             "1. Check if camera is connected\n" +
                             "2. Close other apps using the camera\n" +
@@ -47,77 +173,180 @@ def log_motion_for_gui(update_frame_callback, update_status_callback):
                             "4. Check Windows camera privacy settings")
         return []
 
-    first_frame = None
-    motion_timestamps = []
+# Keep running through camera outages: reads block while the camera is reopened with backoff
+    motion_detector = MotionDetector(**current_config.for_camera(CAMERA_NAME).section('motion'))
+
+    def on_camera_state(state, seconds):
+        if state == 'lost':
+            update_status_callback("⚠️ Camera lost, reconnecting...")
+        else:
+            # The scene may have changed while the camera was away
+            motion_detector.reset()
+            update_status_callback(f"✅ Camera reconnected after {seconds:.1f}s.")
+
+    cap = ReconnectingCapture(open_camera, cap, initial_backoff=CAMERA_RECONNECT_BACKOFF,
+                              max_backoff=CAMERA_RECONNECT_MAX_BACKOFF, on_state=on_camera_state,
+                              name=CAMERA_NAME)
+
+    recent_events = deque(maxlen=RECENT_EVENTS)
+    event_sink = create_event_sink(EVENT_LOG_PATH, flush_size=EVENT_FLUSH_SIZE,
+                                   flush_interval=EVENT_FLUSH_INTERVAL, rotate_daily=True)
     update_status_callback("✅ Camera opened. Starting detection...")
 
 # Allow camera to warm up
     time.sleep(1)
 
-# Detection loop
+# Faces from the last recognized frame, drawn on motion frames the scheduler skips
+    last_detections = []
+
+# Handle each processed frame on the pipeline's render thread
+    def handle_result(packet):
+        nonlocal last_detections
+        startup.mark('first_frame')
+        if packet.motion_detected and not packet.recognized:
+            if packet.frame is not None and last_detections:
+                annotate_faces(packet.frame, [d["box"] for d in last_detections], [d["name"] for d in last_detections])
+        elif packet.motion_detected:
+            last_detections = packet.detections
+            print(f"[INFO]: Detected faces: {packet.face_names}")
+            now = time.time()
+            timestamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+            event = {
+                "Time": now,
+                "Timestamp": timestamp,
+                "Camera": CAMERA_NAME,
+                "Faces": ", ".join(packet.face_names) if packet.face_names else "None",
+                "Detections": packet.detections
+            }
+            if packet.clip:
+                event["Clip"] = packet.clip
+            recent_events.append(event)
+            event_sink.write(event)
+            if on_event is not None:
+                on_event(event)
+            update_status_callback(f"🚨 Motion at {timestamp} | Faces: {event['Faces']}")
+        elif packet.seq % 30 == 0:
+            update_status_callback("👁️ Monitoring... No motion detected.")
+
+        if packet.frame is not None:
+            update_frame_callback(packet.frame)
+
+# Run capture, motion, face recognition and rendering as separate stages
+    recognizer = recognize_faces_detailed
+    face_workers = None
+    if RECOGNITION_BACKEND == 'processes':
+        current_recognition_pool = RecognitionPool(config=current_config)
+        recognizer = current_recognition_pool.recognize_faces_detailed
+        face_workers = current_recognition_pool.slot_count
+    elif USE_FACE_TRACKING:
+        # The tracker detects faces on several workers and keeps its own track updates in frame order
+        current_tracker = FaceTracker()
+        recognizer = current_tracker.recognize_faces_detailed
+
+    clip_recorder = None
+    if RECORD_CLIPS:
+        clip_recorder = ClipRecorder(CLIPS_DIR, CAMERA_NAME, CLIP_PRE_SECONDS, CLIP_POST_SECONDS,
+                                     memory_mb=CLIP_MEMORY_MB, storage=CLIP_STORAGE, max_bytes=CLIPS_MAX_BYTES)
+
+    scheduler = None
+    if ADAPTIVE_SCHEDULING:
+        scheduler = AdaptiveScheduler(SCHEDULER_CPU_BUDGET, SCHEDULER_LATENCY_SLO, max_stride=SCHEDULER_MAX_STRIDE,
+                                      idle_after=SCHEDULER_IDLE_AFTER, idle_fps=SCHEDULER_IDLE_FPS)
+
+    pipeline = DetectionPipeline(cap, motion_detector, recognizer, handle_result,
+                                 face_workers=face_workers, clip_recorder=clip_recorder, scheduler=scheduler)
+    current_pipeline = pipeline
+    metrics_dumper = None
+    if metrics.ENABLED and METRICS_DUMP_PATH:
+        metrics_dumper = metrics.JsonDumper(METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL).start()
+
+# Apply hot settings from the config file to the running pipeline; the camera stays open and
+# the known faces stay loaded
+    def apply_config(cfg, changed):
+        configure(cfg)
+        profile = cfg.for_camera(CAMERA_NAME)
+        motion_detector.configure(**profile.section('motion', hot=True))
+        cap.initial_backoff = CAMERA_RECONNECT_BACKOFF
+        cap.max_backoff = CAMERA_RECONNECT_MAX_BACKOFF
+        event_sink.flush_size = EVENT_FLUSH_SIZE
+        event_sink.flush_interval = EVENT_FLUSH_INTERVAL
+        if clip_recorder is not None:
+            clip_recorder.configure(**profile.section('clips', hot=True))
+        if scheduler is not None:
+            scheduler.configure(**profile.section('scheduler', hot=True))
+        if current_recognition_pool is not None:
+            current_recognition_pool.apply_config(cfg)
+        update_status_callback(f"⚙️ Settings updated: {', '.join(changed)}")
+
+    config_watcher = config.ConfigWatcher(current_config, apply_config).start()
     try:
-        frame_count = 0
-        while not stop_flag:
-            frame, first_frame, motion_detected, face_names = detect_motion_and_faces(cap, first_frame)
-
-            # Convert frame to ImageTk format for GUI display
-            if frame is None:
-                update_status_callback("❌ Failed to read from webcam.")
-                break
-
-            frame_count += 1
-
-            if motion_detected:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                motion_timestamps.append({
-                    "Timestamp": timestamp,
-                    "Faces": ", ".join(face_names) if face_names else "None"
-                })
-                update_status_callback(f"🚨 Motion at {timestamp} | Faces: {motion_timestamps[-1]['Faces']}")
-
-                if len(motion_timestamps) % 10 == 0:
-                    try:
-                        save_log(motion_timestamps)
-                    except Exception as e:
-                        print(f"[Error]: Failed to write log: {e}")
-            else:
-                if frame_count % 30 == 0:
-                    update_status_callback("👁️ Monitoring... No motion detected.")
-
-            update_frame_callback(frame)
-
-            time.sleep(0.03)
+        pipeline.start()
+        last_stats = time.monotonic()
+        while not stop_flag and pipeline.running:
+            time.sleep(0.1)
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                print(f"[STATS]: {format_stats(pipeline.stats())}")
+                if scheduler is not None:
+                    print(f"[STATS]: scheduler {format_scheduler_stats(scheduler.stats())}")
+                last_stats = time.monotonic()
+
+        if pipeline.failed:
+            update_status_callback("❌ Failed to read from webcam.")
+        elif pipeline.error is not None:
+            update_status_callback(f"❌ Error: {pipeline.error}")
 
     except Exception as loop_error:
         print(f"[Error]: Detection loop crashed: {loop_error}")
         update_status_callback(f"❌ Error: {loop_error}")
     finally:
+        config_watcher.stop()
+        config_watcher = None
+        # Wake the capture thread if it is waiting for the camera to come back
+        cap.close()
+        pipeline.stop()
+        print(f"[STATS]: {format_stats(pipeline.stats())}")
+        print(f"[STATS]: camera {cap.stats()}")
+        if scheduler is not None:
+            print(f"[STATS]: scheduler {scheduler.stats()}")
+        if clip_recorder is not None:
+            # Finish the clip in progress with the frames already buffered
+            clip_recorder.close()
+            print(f"[STATS]: clips {clip_recorder.stats()}")
+        if metrics_dumper is not None:
+            metrics_dumper.stop()
+        if current_tracker is not None:
+            print(f"[STATS]: tracker {current_tracker.stats()}")
+            current_tracker = None
+        if current_recognition_pool is not None:
+            current_recognition_pool.close()
+            current_recognition_pool = None
+        close_unknown_face_writer()
         cap.release()
         update_status_callback("🛑 Detection stopped.")
 
+        event_sink.close()
+        if event_sink.written:
+            print(f"[LOG]: Motion log appended with {event_sink.written} entries.")
+        else:
+            print("[LOG]: No motion was detected - no log to save.")
+
+        # Headless OpenCV builds have no window support
         try:
-            if motion_timestamps:
-                save_log(motion_timestamps)
-                print(f"[LOG]: Motion log saved with {len(motion_timestamps)} entries.")
-            else:
-                print("[LOG]: No motion was detected - no log to save.")
-        except Exception as final_log_error:
-            print(f"[Error]: Failed to save motion log: {final_log_error}")
-
-        cv2.destroyAllWindows()
+            cv2.destroyAllWindows()
+        except cv2.error:
+            pass
         print("[INFO]: Released webcam and destroyed all windows.")
 
-    return motion_timestamps
+    return list(recent_events)
 
-# Thread-safe function to register a new face
-def register_new_face_threadsafe(root):
-    name = simpledialog.askstring("Register Face", "Enter your name for registration:", parent=root)
-    if name:
-        threading.Thread(target=capture_and_save_face, args=(name,), daemon=True).start()
-    else:
-        messagebox.showwarning("Input Error", "Name cannot be empty.")
+# Register a face and make any recognition worker processes pick it up
+def register_and_reload(name, notify=print_notice):
+    capture_and_save_face(name, notify)
+    if current_recognition_pool is not None:
+        current_recognition_pool.reload_known_faces()
 
 # Run instructions for main module
 if __name__ == "__main__":
     print("Please run the GUI application using: python -m src.gui")
+    print("Or run headless with: python src/daemon.py")
     print("Or import this module from your GUI application.")
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+# Metrics are off unless enabled here, with enable(), or with MOTION_METRICS=1 in the environment
+# While disabled, timer() returns a shared no-op and observe()/inc() return immediately
+ENABLED = os.environ.get('MOTION_METRICS', '') not in ('', '0')
+
+# Upper bounds in seconds of the latency histogram buckets, from 0.1 ms to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every metric name is exported with this prefix
+PREFIX = 'motion_'
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+# Latency histogram with fixed buckets, like a Prometheus histogram
+class Histogram:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    # Estimate a quantile by interpolating inside the bucket that holds it
+    def quantile(self, q):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                lower = min(lower, upper)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': self.sum / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p95_ms': self.quantile(0.95) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+_histograms = {}
+_counters = {}
+_collectors = {}
+_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def histogram(name, **labels):
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(key, Histogram())
+    return hist
+
+
+# Time a block into the stage_seconds histogram: with metrics.timer('face_locations'): ...
+def timer(stage, **labels):
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(histogram('stage_seconds', stage=stage, **labels))
+
+
+# Record a duration measured by the caller
+def observe(stage, seconds, **labels):
+    if ENABLED:
+        histogram('stage_seconds', stage=stage, **labels).observe(seconds)
+
+
+# Add to a counter, e.g. dropped frames
+def inc(name, amount=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+# Register a function returning [(name, type, labels, value)] that is read at export time
+# Queue depths and drop counts are reported this way, so they cost nothing between exports
+def register_collector(key, collect):
+    with _lock:
+        _collectors[key] = collect
+
+
+def unregister_collector(key):
+    with _lock:
+        _collectors.pop(key, None)
+
+
+def _collected():
+    with _lock:
+        collectors = list(_collectors.values())
+    samples = []
+    for collect in collectors:
+        try:
+            samples.extend(collect())
+        except Exception as e:
+            print(f"[Warning]: Metrics collector failed: {e}")
+    return samples
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+# All metrics in the Prometheus text exposition format
+def prometheus_text():
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    typed = set()
+    for (name, labels), hist in histograms:
+        full = PREFIX + name
+        if full not in typed:
+            lines.append(f"# TYPE {full} histogram")
+            typed.add(full)
+        with hist._lock:
+            counts = list(hist.counts)
+            total, value_sum = hist.count, hist.sum
+        cumulative = 0
+        for bound, count in zip(hist.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{full}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{full}_sum{_format_labels(labels)} {value_sum}")
+        lines.append(f"{full}_count{_format_labels(labels)} {total}")
+    for (name, labels), value in counters:
+        full = PREFIX + name + '_total'
+        if full not in typed:
+            lines.append(f"# TYPE {full} counter")
+            typed.add(full)
+        lines.append(f"{full}{_format_labels(labels)} {value}")
+    for name, kind, labels, value in sorted(_collected(), key=lambda s: (s[0], sorted(s[2].items()))):
+        full = PREFIX + name + ('_total' if kind == 'counter' else '')
+        if full not in typed:
+            lines.append(f"# TYPE {full} {kind}")
+            typed.add(full)
+        lines.append(f"{full}{_format_labels(tuple(sorted(labels.items())))} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+# All metrics as a dict of latency summaries, counters and collected gauges
+def snapshot():
+    with _lock:
+        histograms = list(_histograms.items())
+        counters = list(_counters.items())
+
+    def label_name(name, labels):
+        return name + ''.join(f"[{v}]" for _, v in labels)
+
+    return {
+        'time': time.time(),
+        'timings': {label_name(n, l): h.summary() for (n, l), h in histograms},
+        'counters': {label_name(n, l): v for (n, l), v in counters},
+        'gauges': {label_name(n, tuple(sorted(lb.items()))): v for n, _, lb, v in _collected()},
+    }
+
+
+# Forget all recorded values (collectors stay registered)
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+# Append a JSON snapshot to a file every interval seconds
+class JsonDumper:
+
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-dump', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(snapshot()) + "\n")
+        except OSError as e:
+            print(f"[Error]: Failed to write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(self.interval)
+        self.dump()
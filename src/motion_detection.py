@@ -1,73 +1,144 @@
 import cv2
 import numpy as np
 
-# Find an available camera index
+import metrics
+from background import create_background_model
+# open_camera lives in camera_source and is re-exported here for existing callers
+from camera_source import open_camera, discover_camera
+
+# Background engine used by MotionDetector: 'frame_diff', 'running_average', 'mog2' or 'knn'
+DEFAULT_MOTION_ENGINE = 'running_average'
+
+# Gaussian blur kernel size (odd), pixel difference threshold, dilation passes and smallest
+# region area used by detect_motion; read on every call, so config changes apply immediately
+BLUR_SIZE = 21
+DIFF_THRESHOLD = 30
+DILATE_ITERATIONS = 2
+MIN_AREA = 1000
+
+# Take detect_motion's settings from a config.Config; a null threshold restores the default of 30
+def apply_config(config):
+    global BLUR_SIZE, DIFF_THRESHOLD, DILATE_ITERATIONS, MIN_AREA
+    BLUR_SIZE = config['motion.blur_size']
+    threshold = config['motion.threshold']
+    DIFF_THRESHOLD = threshold if threshold is not None else 30
+    DILATE_ITERATIONS = config['motion.dilate_iterations']
+    MIN_AREA = config['motion.min_area']
+
+# Find an available camera index, probing devices in parallel
 def find_camera():
     print("[INFO]: Searching for available cameras...")
-    for index in range(5):
-        cap = cv2.VideoCapture(index, cv2.CAP_DSHOW)
-        if cap.isOpened():
-            ret, frame = cap.read()
-            cap.release()
-            if ret and frame is not None:
-                print(f"[INFO]: Found working camera at index {index}")
-                return index
+    index, _, cap = discover_camera()
+    if cap is not None:
         cap.release()
-    print("[ERROR]: No working camera found!")
-    return None
-
-# Open the camera with the given index or find an available one
-def open_camera(camera_index=None):
-    if camera_index is None:
-        camera_index = find_camera()
-    if camera_index is None:
-        return None
-
-    cap = cv2.VideoCapture(camera_index, cv2.CAP_DSHOW)
-    if not cap.isOpened():
-        cap = cv2.VideoCapture(camera_index)
-
-    if cap.isOpened():
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-
-        ret, frame = cap.read()
-        if ret and frame is not None:
-            print(f"[INFO]: Camera opened successfully at index {camera_index}")
-            return cap
-        else:
-            print(f"[ERROR]: Camera opened but cannot read frames")
-            cap.release()
-            return None
-
-    print(f"[ERROR]: Failed to open camera at index {camera_index}")
-    return None
+    return index
 
 # Detect motion in the frame compared to the first frame
+# Returns (gray, motion_detected, regions) where regions are (x, y, w, h) boxes
 def detect_motion(frame, first_frame):
     if frame is None:
-        return first_frame, False
+        return first_frame, False, []
 
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, (21, 21), 0)
+    gray = cv2.GaussianBlur(gray, (BLUR_SIZE, BLUR_SIZE), 0)
 
     if first_frame is None:
-        return gray, False
+        return gray, False, []
 
     delta_frame = cv2.absdiff(first_frame, gray)
-    thresh_fresh = cv2.threshold(delta_frame, 30, 255, cv2.THRESH_BINARY)[1]
-    thresh_fresh = cv2.dilate(thresh_fresh, None, iterations=2)
+    thresh_fresh = cv2.threshold(delta_frame, DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+    thresh_fresh = cv2.dilate(thresh_fresh, None, iterations=DILATE_ITERATIONS)
 
     contours, _ = cv2.findContours(thresh_fresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-    motion_detected = False
+    regions = []
     for contour in contours:
-        if cv2.contourArea(contour) < 1000:
+        if cv2.contourArea(contour) < MIN_AREA:
             continue
-        motion_detected = True
         (x, y, w, h) = cv2.boundingRect(contour)
+        regions.append((x, y, w, h))
         cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
-    return gray, motion_detected
+    return gray, bool(regions), regions
+
+
+# Motion detection with a selectable background engine and reused frame buffers
+class MotionDetector:
+
+    # options are passed to the background engine (e.g. threshold, alpha, history)
+    def __init__(self, engine=DEFAULT_MOTION_ENGINE, min_area=1000, blur_size=21,
+                 dilate_iterations=2, draw=True, **options):
+        self.engine = engine
+        self.min_area = min_area
+        self.blur_size = blur_size
+        self.dilate_iterations = dilate_iterations
+        self.draw = draw
+        self.options = {name: value for name, value in options.items() if value is not None}
+        self.model = create_background_model(engine, **self.options)
+        self.gray = None
+        self.blurred = None
+        self.dilated = None
+
+    # Reuse the gray, blurred and dilated buffers while the frame size stays the same
+    def _buffers(self, frame):
+        shape = frame.shape[:2]
+        if self.gray is None or self.gray.shape != shape:
+            self.gray = np.empty(shape, dtype=np.uint8)
+            self.blurred = np.empty(shape, dtype=np.uint8)
+            self.dilated = np.empty(shape, dtype=np.uint8)
+
+    # Returns (motion_detected, regions) where regions are (x, y, w, h) boxes
+    def detect(self, frame):
+        if frame is None:
+            return False, []
+        self._buffers(frame)
+        with metrics.timer('blur'):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+            cv2.GaussianBlur(self.gray, (self.blur_size, self.blur_size), 0, dst=self.blurred)
+
+        with metrics.timer('background_diff'):
+            mask = self.model.apply(self.blurred)
+        if mask is None:
+            return False, []
+
+        regions = []
+        with metrics.timer('contours'):
+            cv2.dilate(mask, None, dst=self.dilated, iterations=self.dilate_iterations)
+            contours, _ = cv2.findContours(self.dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for contour in contours:
+                if cv2.contourArea(contour) < self.min_area:
+                    continue
+                (x, y, w, h) = cv2.boundingRect(contour)
+                regions.append((x, y, w, h))
+                if self.draw:
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+        return bool(regions), regions
+
+    # Forget the learned background, e.g. after the camera reconnects
+    def reset(self):
+        self.model.reset()
+
+    # Change settings while running, e.g. from a reloaded config; None leaves a setting as it is,
+    # except for engine options, where None restores the engine's default
+    # A threshold change keeps the learned background; other engine changes start learning it again
+    def configure(self, engine=None, min_area=None, blur_size=None, dilate_iterations=None, **options):
+        if min_area is not None:
+            self.min_area = min_area
+        if blur_size is not None:
+            self.blur_size = blur_size
+        if dilate_iterations is not None:
+            self.dilate_iterations = dilate_iterations
+        engine = engine or self.engine
+        merged = dict(self.options, **options)
+        merged = {name: value for name, value in merged.items() if value is not None}
+        threshold = merged.get('threshold')
+        if (engine != self.engine or dict(merged, threshold=None) != dict(self.options, threshold=None)
+                or (threshold is None and 'threshold' in self.options)):
+            # Detection swaps to the new model on its next frame
+            self.model = create_background_model(engine, **merged)
+            print(f"[INFO]: Motion engine {engine} with {merged or 'default options'}.")
+        elif threshold != self.options.get('threshold'):
+            self.model.set_threshold(threshold)
+        self.engine = engine
+        self.options = merged
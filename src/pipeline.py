@@ -0,0 +1,274 @@
+import os
+import time
+import threading
+from collections import deque
+
+import metrics
+
+
+# Bounded queue that discards the oldest item instead of blocking the producer
+class DropOldestQueue:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    # Add an item, evicting the oldest one if the queue is full
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    # Take the oldest item, or None on timeout or once closed and empty
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    # Wake up all waiting consumers
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+# Running count and latency totals for one pipeline stage
+class StageStats:
+
+    # stage names the histogram the timings are also recorded into when metrics are enabled
+    def __init__(self, stage=None, **labels):
+        self.stage = stage
+        self.labels = labels
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self._lock = threading.Lock()
+
+    # Record the time spent on one item
+    def record(self, seconds):
+        if self.stage is not None:
+            metrics.observe(self.stage, seconds, **self.labels)
+        with self._lock:
+            self.count += 1
+            self.total_time += seconds
+            self.max_time = max(self.max_time, seconds)
+
+    # Return the totals and reset the peak latency
+    def snapshot(self):
+        with self._lock:
+            avg = self.total_time / self.count if self.count else 0.0
+            result = {'processed': self.count, 'avg_ms': avg * 1000, 'max_ms': self.max_time * 1000}
+            self.max_time = 0.0
+            return result
+
+
+# A frame moving through the pipeline
+class FramePacket:
+    __slots__ = ('seq', 'frame', 'captured_at', 'motion_detected', 'regions', 'face_names', 'detections', 'clip',
+                 'recognized')
+
+    def __init__(self, seq, frame, captured_at):
+        self.seq = seq
+        self.frame = frame
+        self.captured_at = captured_at
+        self.motion_detected = False
+        self.regions = []
+        self.face_names = []
+        self.detections = []
+        # Path of the clip a motion frame is recorded in, if clips are being recorded
+        self.clip = None
+        # Whether face recognition ran on this frame; a scheduler may skip some motion frames
+        self.recognized = False
+
+
+# Default number of face recognition worker threads
+def default_face_workers():
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+# Capture -> motion -> face recognition pool -> render, connected by drop-oldest queues
+class DetectionPipeline:
+
+    # motion_detector is a motion_detection.MotionDetector and recognize_faces works like
+    # face_handler.recognize_faces_detailed; on_result(packet) is called from the render thread
+    # clip_recorder is a clip_recorder.ClipRecorder that is given every frame after motion detection
+    # scheduler is an adaptive_scheduler.AdaptiveScheduler choosing which frames get motion
+    # detection and recognition; without one every frame does
+    def __init__(self, cap, motion_detector, recognize_faces, on_result,
+                 face_workers=None, queue_size=2, clip_recorder=None, scheduler=None):
+        self.cap = cap
+        self.motion_detector = motion_detector
+        self.recognize_faces = recognize_faces
+        self.on_result = on_result
+        self.face_workers = face_workers or default_face_workers()
+        self.clip_recorder = clip_recorder
+        self.scheduler = scheduler
+
+        self.queues = {
+            'motion': DropOldestQueue(queue_size),
+            'faces': DropOldestQueue(max(queue_size, self.face_workers * 2)),
+            'render': DropOldestQueue(queue_size * 2),
+        }
+        self.stage_stats = {name: StageStats(name) for name in ('capture', 'motion', 'faces', 'render', 'end_to_end')}
+        self.stale_frames = 0
+        self.failed = False
+        self.error = None
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_rendered = -1
+
+    # Whether all stages are still running
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    # Queue depths and drop counts for the metrics exporter
+    def _collect_metrics(self):
+        samples = []
+        for name, q in self.queues.items():
+            samples.append(('queue_depth', 'gauge', {'queue': name}, len(q)))
+            samples.append(('queue_dropped', 'counter', {'queue': name}, q.dropped))
+        samples.append(('stale_frames', 'counter', {}, self.stale_frames))
+        if self.scheduler is not None:
+            samples += self.scheduler.metric_samples()
+        return samples
+
+    # Start all stage threads
+    def start(self):
+        self._stop.clear()
+        metrics.register_collector(('pipeline', id(self)), self._collect_metrics)
+        targets = [('capture', self._capture_loop), ('motion', self._motion_loop), ('render', self._render_loop)]
+        targets += [(f'faces-{i}', self._face_loop) for i in range(self.face_workers)]
+        for name, target in targets:
+            thread = threading.Thread(target=self._guard, args=(target,), name=f'pipeline-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # Stop all stages and wait for them to finish
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        for q in self.queues.values():
+            q.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        metrics.unregister_collector(('pipeline', id(self)))
+
+    # Run a stage loop, stopping the whole pipeline if it crashes
+    def _guard(self, target):
+        try:
+            target()
+        except Exception as e:
+            print(f"[Error]: Pipeline stage {threading.current_thread().name} crashed: {e}")
+            self.error = e
+            self._stop.set()
+            for q in self.queues.values():
+                q.close()
+
+    # Read frames as fast as the camera delivers them
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret or frame is None:
+                print("[ERROR]: Failed to read frame from camera")
+                self.failed = True
+                self._stop.set()
+                break
+            self.stage_stats['capture'].record(time.perf_counter() - start)
+            self.queues['motion'].put(FramePacket(seq, frame, start))
+            seq += 1
+        self.queues['motion'].close()
+
+    # Run motion detection in order, sending motion frames to the face workers
+    def _motion_loop(self):
+        while not self._stop.is_set():
+            packet = self.queues['motion'].get(timeout=0.1)
+            if packet is None:
+                continue
+            start = time.perf_counter()
+            if self.scheduler is not None and not self.scheduler.run_motion(start):
+                # Idle: show and buffer the frame without looking for motion
+                if self.clip_recorder is not None:
+                    self.clip_recorder.add(packet.frame, False, packet.captured_at)
+                self.queues['render'].put(packet)
+                continue
+            packet.motion_detected, packet.regions = self.motion_detector.detect(packet.frame)
+            self.stage_stats['motion'].record(time.perf_counter() - start)
+            if self.clip_recorder is not None:
+                # Buffer the frame before face recognition draws on it
+                packet.clip = self.clip_recorder.add(packet.frame, packet.motion_detected, packet.captured_at)
+            if packet.motion_detected and (self.scheduler is None
+                                           or self.scheduler.should_recognize(start, packet.regions)):
+                self.queues['faces'].put(packet)
+            else:
+                self.queues['render'].put(packet)
+
+    # Recognize faces on motion frames; several of these run in parallel
+    def _face_loop(self):
+        while not self._stop.is_set():
+            packet = self.queues['faces'].get(timeout=0.1)
+            if packet is None:
+                continue
+            start = time.perf_counter()
+            packet.frame, packet.face_names, packet.detections = self.recognize_faces(packet.frame, packet.regions)
+            packet.recognized = True
+            now = time.perf_counter()
+            self.stage_stats['faces'].record(now - start)
+            if self.scheduler is not None:
+                self.scheduler.record_result(packet, now)
+            self.queues['render'].put(packet)
+
+    # Hand results to the caller, skipping display of frames overtaken by newer ones
+    def _render_loop(self):
+        while not self._stop.is_set():
+            packet = self.queues['render'].get(timeout=0.1)
+            if packet is None:
+                continue
+            start = time.perf_counter()
+            if packet.seq < self._last_rendered:
+                self.stale_frames += 1
+                # Recognized frames are still passed on for their events, just not displayed
+                if not packet.recognized:
+                    continue
+                packet.frame = None
+            else:
+                self._last_rendered = packet.seq
+            self.on_result(packet)
+            now = time.perf_counter()
+            self.stage_stats['render'].record(now - start)
+            self.stage_stats['end_to_end'].record(now - packet.captured_at)
+
+    # Per-stage queue depth, drop counts and latency
+    def stats(self):
+        result = {name: stats.snapshot() for name, stats in self.stage_stats.items()}
+        for name, q in self.queues.items():
+            result[name]['queue_depth'] = len(q)
+            result[name]['dropped'] = q.dropped
+        result['render']['stale'] = self.stale_frames
+        return result
+
+
+# Format pipeline stats as a single log line
+def format_stats(stats):
+    parts = []
+    for name, s in stats.items():
+        part = f"{name}: {s['processed']} @ {s['avg_ms']:.1f}ms (max {s['max_ms']:.1f}ms)"
+        if 'queue_depth' in s:
+            part += f" q={s['queue_depth']} drop={s['dropped']}"
+        parts.append(part)
+    return " | ".join(parts)
@@ -0,0 +1,200 @@
+import os
+import queue
+import threading
+from collections import deque
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+import face_handler
+
+# Largest frame a slot can hold (1080p BGR)
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+# Worker process: attach to the frame slots and analyze frames until told to stop
+# config is the parent's config.Config (or None for the defaults); each later config change is
+# sent on config_queue before config_generation is bumped
+def _worker_main(slot_names, task_queue, result_queue, generation, detector, config, config_queue, config_generation):
+    # The parent encodes new faces and writes the caches before bumping the generation
+    face_handler.PERSIST_CACHES = False
+    if config is not None:
+        face_handler.apply_config(config)
+    if detector != face_handler.FACE_DETECTOR:
+        face_handler.set_face_detector(detector)
+    face_handler.ensure_ready()
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    local_generation = generation.value
+    local_config_generation = 0
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            seq, slot, shape, dtype, regions = task
+
+            # Apply config changes from the parent; only the latest one matters
+            if config_generation.value != local_config_generation:
+                while local_config_generation < config_generation.value:
+                    config = config_queue.get()
+                    local_config_generation += 1
+                face_handler.apply_config(config)
+
+            # Pick up gallery changes made in the parent process, reading its encoding cache
+            if generation.value != local_generation:
+                local_generation = generation.value
+                face_handler.load_known_faces()
+
+            frame = np.ndarray(shape, dtype=dtype, buffer=slots[slot].buf)
+            try:
+                locations, names, distances, encodings = face_handler.analyze_faces_encoded(frame, regions)
+                result_queue.put((seq, slot, locations, names, distances, encodings, None))
+            except Exception as e:
+                result_queue.put((seq, slot, [], [], [], [], str(e)))
+            del frame
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+# Face recognition spread over worker processes, each holding its own gallery
+# Frames are copied into shared memory slots instead of being pickled
+class RecognitionPool:
+
+    # slots bounds the number of frames in flight; it defaults to twice the worker count
+    # detector is a face detector spec for the workers, by default face_handler.FACE_DETECTOR
+    # config is a config.Config applied in each worker before it loads the known faces
+    def __init__(self, workers=None, slots=None, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES, detector=None, config=None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.slot_count = slots or self.workers * 2
+        self.max_frame_bytes = max_frame_bytes
+        self.detector = detector or face_handler.FACE_DETECTOR
+
+        ctx = mp.get_context('spawn')
+        self._slots = [shared_memory.SharedMemory(create=True, size=max_frame_bytes) for _ in range(self.slot_count)]
+        self._free_slots = queue.Queue()
+        for i in range(self.slot_count):
+            self._free_slots.put(i)
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._generation = ctx.Value('i', 0)
+        self._config_queues = [ctx.Queue() for _ in range(self.workers)]
+        self._config_generation = ctx.Value('i', 0)
+
+        self._next_seq = 0
+        self._seq_lock = threading.Lock()
+        self._done = {}
+        self._done_cond = threading.Condition()
+        self._closed = False
+
+        self._processes = []
+        for i in range(self.workers):
+            process = ctx.Process(target=_worker_main,
+                                  args=([shm.name for shm in self._slots], self._tasks,
+                                        self._results, self._generation, self.detector,
+                                        config, self._config_queues[i], self._config_generation),
+                                  name=f'recognition-{i}', daemon=True)
+            process.start()
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect, name='recognition-collector', daemon=True)
+        self._collector.start()
+        print(f"[INFO]: Started recognition pool with {self.workers} worker processes.")
+
+    # Receive results from the workers and free their slots
+    def _collect(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            seq, slot, locations, names, distances, encodings, error = item
+            self._free_slots.put(slot)
+            if error:
+                print(f"[Error]: Face recognition failed in worker: {error}")
+            with self._done_cond:
+                self._done[seq] = (locations, names, distances, encodings)
+                self._done_cond.notify_all()
+
+    # Copy a frame into a free slot and queue it, returning its sequence number
+    def submit(self, frame, regions=None):
+        if self._closed:
+            raise RuntimeError("Recognition pool is closed")
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds slot size {self.max_frame_bytes}")
+
+        slot = self._free_slots.get()
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._slots[slot].buf)
+        np.copyto(view, frame)
+        del view
+        with self._seq_lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        self._tasks.put((seq, slot, frame.shape, frame.dtype.str, regions))
+        return seq
+
+    # Wait for the (locations, names, distances) of a submitted frame
+    # with_encodings adds the face encodings as a fourth element
+    def result(self, seq, timeout=None, with_encodings=False):
+        with self._done_cond:
+            if not self._done_cond.wait_for(lambda: seq in self._done, timeout):
+                raise TimeoutError(f"No recognition result for frame {seq}")
+            result = self._done.pop(seq)
+        return result if with_encodings else result[:3]
+
+    # Analyze frames in parallel, yielding results in frame order
+    def map(self, frames):
+        pending = deque()
+        for frame in frames:
+            pending.append(self.submit(frame))
+            while len(pending) >= self.slot_count:
+                yield self.result(pending.popleft())
+        while pending:
+            yield self.result(pending.popleft())
+
+    # Drop-in replacement for face_handler.recognize_faces_detailed
+    def recognize_faces_detailed(self, frame, regions=None, timeout=30):
+        locations, names, distances, encodings = self.result(self.submit(frame, regions), timeout, with_encodings=True)
+        crop_paths = face_handler.save_unknown_faces(frame, locations, names, encodings)
+        face_handler.annotate_faces(frame, locations, names)
+        return frame, names, face_handler.describe_faces(locations, names, distances, crop_paths)
+
+    # Drop-in replacement for face_handler.recognize_faces
+    def recognize_faces(self, frame, regions=None, timeout=30):
+        frame, names, _ = self.recognize_faces_detailed(frame, regions, timeout)
+        return frame, names
+
+    # Make every worker reload the known faces before its next frame
+    def reload_known_faces(self):
+        with self._generation.get_lock():
+            self._generation.value += 1
+
+    # Send a changed config to every worker; each applies it before its next frame
+    def apply_config(self, config):
+        with self._config_generation.get_lock():
+            for config_queue in self._config_queues:
+                config_queue.put(config)
+            self._config_generation.value += 1
+
+    # Stop the workers and release the shared memory
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join(5)
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
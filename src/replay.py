@@ -0,0 +1,220 @@
+import os
+import time
+import argparse
+from collections import deque
+from datetime import datetime
+import cv2
+
+from background import ENGINES
+from face_detectors import detector_spec
+from motion_detection import MotionDetector, DEFAULT_MOTION_ENGINE
+from event_store import parse_time
+from logger import create_event_sink
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".gif")
+
+# Columns of a CSV replay event log
+EVENT_FIELDS = ["Source", "Frame", "Seconds", "Timestamp", "Camera", "Faces", "Detections"]
+
+
+# Yield (frame_index, frame) from a video file or a directory of images, keeping every stride-th frame
+def iter_frames(path, stride=1):
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for index in range(0, len(names), stride):
+            frame = cv2.imread(os.path.join(path, names[index]))
+            if frame is not None:
+                yield index, frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    index = 0
+    try:
+        while True:
+            # grab() skips decoding frames that the stride drops
+            if not cap.grab():
+                break
+            if index % stride == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+# Frame rate of a video source, or the given default for image directories
+def source_fps(path, default):
+    if os.path.isdir(path):
+        return default
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+
+# Expand directories that contain videos into the individual video files
+def expand_sources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos = sorted(os.path.join(path, n) for n in os.listdir(path) if n.lower().endswith(VIDEO_EXTENSIONS))
+            sources.extend(videos if videos else [path])
+        else:
+            sources.append(path)
+    return sources
+
+
+# Totals across all replayed sources
+class ReplayStats:
+
+    def __init__(self):
+        self.frames = 0
+        self.motion_frames = 0
+        self.faces = 0
+        self.started_at = time.perf_counter()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started_at
+        print(f"[STATS]: {self.frames} frames, {self.motion_frames} with motion, {self.faces} faces "
+              f"in {elapsed:.1f}s -> {self.frames / elapsed:.1f} frames/s, {self.faces / elapsed:.1f} faces/s")
+
+
+# Run motion detection and face recognition over one source as fast as possible
+def replay_source(path, args, pool, events, stats):
+    import face_handler
+
+    fps = source_fps(path, args.fps)
+    # Wall-clock time of the first frame, so replayed events land at the right place in the event store
+    start_time = parse_time(args.start_time) if args.start_time is not None else os.path.getmtime(path)
+    camera = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    detector = MotionDetector(args.motion_engine, draw=False)
+    writer = None
+    max_pending = pool.slot_count if pool is not None else 1
+    pending = deque()
+
+    # Write events and the annotated frame once a frame's recognition result is in
+    def finish(index, frame, regions, job):
+        nonlocal writer
+        if pool is not None and job is not None:
+            locations, names, distances, encodings = pool.result(job, with_encodings=True)
+        elif job is not None:
+            locations, names, distances, encodings = job
+        else:
+            locations, names, distances, encodings = [], [], [], []
+
+        if regions:
+            stats.motion_frames += 1
+            stats.faces += len(locations)
+            crop_paths = face_handler.save_unknown_faces(frame, locations, names, encodings) if args.save_unknown else None
+            if events is not None:
+                seconds = index / fps
+                events.write({
+                    "Source": path,
+                    "Frame": index,
+                    "Seconds": f"{seconds:.3f}",
+                    "Time": start_time + seconds,
+                    "Timestamp": datetime.fromtimestamp(start_time + seconds).strftime("%Y-%m-%d %H:%M:%S"),
+                    "Camera": camera,
+                    "Faces": ", ".join(names) if names else "None",
+                    "Detections": face_handler.describe_faces(locations, names, distances, crop_paths),
+                })
+
+        if args.output_dir:
+            for (x, y, w, h) in regions:
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            face_handler.annotate_faces(frame, locations, names)
+            if writer is None:
+                out_name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0] + "_annotated.avi"
+                writer = cv2.VideoWriter(os.path.join(args.output_dir, out_name), cv2.VideoWriter_fourcc(*'MJPG'),
+                                         fps / args.stride, (frame.shape[1], frame.shape[0]))
+            writer.write(frame)
+
+    print(f"[INFO]: Replaying {path}")
+    try:
+        for index, frame in iter_frames(path, args.stride):
+            stats.frames += 1
+            motion, regions = detector.detect(frame)
+            job = None
+            if motion:
+                if pool is not None:
+                    job = pool.submit(frame, regions)
+                else:
+                    job = face_handler.analyze_faces_encoded(frame, regions)
+            pending.append((index, frame, regions, job))
+            while len(pending) >= max_pending:
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+    finally:
+        if writer is not None:
+            writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded video through motion detection and face recognition")
+    parser.add_argument('sources', nargs='+', help="Video files, directories of videos, or directories of frames")
+    parser.add_argument('--stride', type=int, default=1, help="Process every n-th frame")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Face recognition worker processes (0 = recognize in this process)")
+    parser.add_argument('--motion-engine', default=DEFAULT_MOTION_ENGINE, choices=ENGINES)
+    parser.add_argument('--events', help="Write motion events to this log (.csv, .jsonl or .db event store)")
+    parser.add_argument('--overwrite', action='store_true', help="Replace an existing .csv or .jsonl events log")
+    parser.add_argument('--start-time',
+                        help="Wall-clock time of the first frame (epoch or YYYY-MM-DD HH:MM:SS); "
+                             "defaults to the source's modification time")
+    parser.add_argument('--output-dir', help="Write annotated videos to this directory")
+    parser.add_argument('--save-unknown', action='store_true', help="Save unknown face crops")
+    parser.add_argument('--fps', type=float, default=30.0, help="Frame rate of image directories")
+    parser.add_argument('--detector', type=detector_spec, default=None,
+                        help="Face detector: hog, haar, yunet, ssd, or a cascade like haar>hog")
+    args = parser.parse_args()
+
+    # Text logs start fresh on every replay, so an existing one (perhaps the live motion log) is
+    # only replaced when asked; an event store accumulates across replays
+    text_log = args.events and os.path.splitext(args.events)[1].lower() in ('.csv', '.jsonl', '.json')
+    if text_log and os.path.exists(args.events) and not args.overwrite:
+        parser.error(f"{args.events} already exists; pass --overwrite to replace it")
+
+    import face_handler
+    if args.detector:
+        face_handler.set_face_detector(args.detector)
+    if args.workers <= 0 and not face_handler.ensure_ready():
+        print("[ERROR]: Face recognition is not available.")
+        return
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    pool = None
+    if args.workers > 0:
+        from recognition_pool import RecognitionPool
+        pool = RecognitionPool(workers=args.workers, detector=args.detector)
+
+    events = None
+    if args.events:
+        if text_log and os.path.exists(args.events):
+            os.remove(args.events)
+        events = create_event_sink(args.events, fields=EVENT_FIELDS, flush_size=1000, flush_interval=None)
+
+    stats = ReplayStats()
+    try:
+        for path in expand_sources(args.sources):
+            replay_source(path, args, pool, events, stats)
+    except KeyboardInterrupt:
+        print("[INFO]: Replay interrupted.")
+    finally:
+        if pool is not None:
+            pool.close()
+        if events is not None:
+            events.close()
+        if args.save_unknown:
+            import face_handler
+            face_handler.close_unknown_face_writer()
+        stats.report()
+
+
+if __name__ == "__main__":
+    main()
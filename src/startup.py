@@ -0,0 +1,123 @@
+import sys
+import time
+import builtins
+import importlib
+import threading
+
+# Startup timing: imports and phases record their durations, and marks record the time since
+# launch of milestones such as the window appearing, the first frame and recognition coming online
+STARTED_AT = time.perf_counter()
+
+_imports = {}
+_phases = {}
+_marks = {}
+_lock = threading.Lock()
+_import_depth = threading.local()
+
+
+# Seconds since this module was first imported, which is close to process start
+def elapsed():
+    return time.perf_counter() - STARTED_AT
+
+
+# Import a module by name, recording how long the first import took
+def timed_import(name):
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    seconds = time.perf_counter() - start
+    with _lock:
+        # Later imports are cache hits; keep the cost of the first one
+        _imports.setdefault(name, seconds)
+    return module
+
+
+# Records the time of first imports made inside a with block, including the modules they import
+# Only imports up to depth levels deep are listed, so the report shows which direct import was slow
+class _ImportRecorder:
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.original = None
+
+    def __enter__(self):
+        self.original = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def __exit__(self, *exc):
+        builtins.__import__ = self.original
+        return False
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self.original(name, globals, locals, fromlist, level)
+        depth = getattr(_import_depth, 'value', 0)
+        _import_depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            _import_depth.value = depth
+            if depth < self.depth:
+                with _lock:
+                    _imports.setdefault(name, time.perf_counter() - start)
+
+
+# Time the imports in a block: with startup.record_imports(): import cv2
+def record_imports(depth=2):
+    return _ImportRecorder(depth)
+
+
+class _Phase:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        with _lock:
+            _phases[self.name] = (self.start - STARTED_AT, end - self.start)
+        return False
+
+
+# Time a startup phase: with startup.phase('known faces'): ...
+def phase(name):
+    return _Phase(name)
+
+
+# Record the first time a milestone is reached
+def mark(name):
+    with _lock:
+        if name in _marks:
+            return False
+        _marks[name] = elapsed()
+    return True
+
+
+def as_dict():
+    with _lock:
+        return {
+            'imports': {name: round(s, 4) for name, s in _imports.items()},
+            'phases': {name: {'start': round(start, 4), 'seconds': round(s, 4)}
+                       for name, (start, s) in _phases.items()},
+            'marks': {name: round(s, 4) for name, s in sorted(_marks.items(), key=lambda m: m[1])},
+        }
+
+
+# Print imports, phases and milestones, slowest imports first; imports under min_import_ms are left out
+def report(min_import_ms=1.0):
+    data = as_dict()
+    print("[STARTUP]: Time since launch")
+    for name, seconds in sorted(data['imports'].items(), key=lambda i: -i[1]):
+        if seconds * 1000 < min_import_ms:
+            continue
+        print(f"  import {name:<24} {seconds * 1000:8.1f} ms")
+    for name, p in sorted(data['phases'].items(), key=lambda i: i[1]['start']):
+        print(f"  phase  {name:<24} {p['seconds'] * 1000:8.1f} ms  (at {p['start']:.2f}s)")
+    for name, seconds in data['marks'].items():
+        print(f"  mark   {name:<24} at {seconds:.2f}s")
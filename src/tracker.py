@@ -0,0 +1,233 @@
+import time
+import threading
+import cv2
+
+import face_handler
+from gallery import UNKNOWN_NAME
+
+
+# Intersection over union of two (top, right, bottom, left) boxes
+def box_iou(a, b):
+    inter_h = min(a[2], b[2]) - max(a[0], b[0])
+    inter_w = min(a[1], b[1]) - max(a[3], b[3])
+    if inter_h <= 0 or inter_w <= 0:
+        return 0.0
+    inter = inter_h * inter_w
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+# Distance between box centres relative to the larger box size
+def centroid_distance(a, b):
+    ax, ay = (a[1] + a[3]) / 2.0, (a[0] + a[2]) / 2.0
+    bx, by = (b[1] + b[3]) / 2.0, (b[0] + b[2]) / 2.0
+    size = max(a[1] - a[3], a[2] - a[0], b[1] - b[3], b[2] - b[0], 1)
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / size
+
+
+# Create an OpenCV single-object tracker if this OpenCV build has one
+def create_opencv_tracker():
+    for factory in ('TrackerKCF_create', 'TrackerMIL_create'):
+        if hasattr(cv2, factory):
+            return getattr(cv2, factory)()
+        legacy = getattr(cv2, 'legacy', None)
+        if legacy is not None and hasattr(legacy, factory):
+            return getattr(legacy, factory)()
+    return None
+
+
+# One face followed across frames
+class Track:
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.name = None
+        self.distance = float('inf')
+        self.encoding = None
+        self.first_seen = now
+        self.last_seen = now
+        self.last_recognized = None
+        self.missed = 0
+        self.cv_tracker = None
+
+
+# Recognizes faces, but only encodes a face when its track is new or due for a refresh
+# Several face workers may call it at once: faces are detected in parallel, then each frame is
+# matched to the tracks and encoded in the order the calls arrived, so tracks move forward in time
+class FaceTracker:
+
+    # refresh_interval: seconds before an identified track is re-encoded
+    # max_missed: frames a track may go undetected before it is dropped
+    # track_timeout: seconds without any update before a track is dropped
+    # detector: face_detectors.FaceDetector for this tracker's camera, or None for the default
+    def __init__(self, refresh_interval=3.0, iou_threshold=0.3, max_centroid_distance=0.5,
+                 max_missed=5, track_timeout=2.0, use_opencv_tracker=False, detector=None):
+        self.refresh_interval = refresh_interval
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.track_timeout = track_timeout
+        self.use_opencv_tracker = use_opencv_tracker
+        self.detector = detector
+        self.tracks = []
+        self.frames = 0
+        self.encoded_faces = 0
+        self.skipped_faces = 0
+        self._next_id = 1
+        # Calls take a ticket on entry and update the tracks when their ticket is served
+        self._turn = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    # Greedily pair tracks with detections by IoU, then by centroid distance
+    def _associate(self, locations):
+        pairs = []
+        free_tracks = set(range(len(self.tracks)))
+        free_dets = set(range(len(locations)))
+
+        scored = [(box_iou(self.tracks[t].box, locations[d]), t, d) for t in free_tracks for d in free_dets]
+        for iou, t, d in sorted(scored, reverse=True):
+            if iou < self.iou_threshold:
+                break
+            if t in free_tracks and d in free_dets:
+                pairs.append((t, d))
+                free_tracks.discard(t)
+                free_dets.discard(d)
+
+        scored = [(centroid_distance(self.tracks[t].box, locations[d]), t, d) for t in free_tracks for d in free_dets]
+        for dist, t, d in sorted(scored):
+            if dist > self.max_centroid_distance:
+                break
+            if t in free_tracks and d in free_dets:
+                pairs.append((t, d))
+                free_tracks.discard(t)
+                free_dets.discard(d)
+        return pairs, free_tracks, free_dets
+
+    # Follow an undetected track with its OpenCV tracker, returning whether it is still found
+    def _follow(self, track, frame):
+        if track.cv_tracker is None:
+            return False
+        ok, (x, y, w, h) = track.cv_tracker.update(frame)
+        if not ok:
+            return False
+        track.box = (int(y), int(x + w), int(y + h), int(x))
+        return True
+
+    # Restart the OpenCV tracker on the track's freshly detected box, so a miss on the next frame
+    # is followed from where the face was last seen
+    def _start_cv_tracker(self, track, frame):
+        if not self.use_opencv_tracker:
+            return
+        track.cv_tracker = create_opencv_tracker()
+        if track.cv_tracker is not None:
+            top, right, bottom, left = track.box
+            track.cv_tracker.init(frame, (left, top, right - left, bottom - top))
+
+    # Update tracks from one frame; returns (visible_tracks, tracks newly identified as unknown)
+    def update(self, frame, regions=None):
+        with self._turn:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+        error = None
+        try:
+            now = time.monotonic()
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            locations = face_handler.detect_faces(rgb_frame, regions, self.detector)
+        except Exception as e:
+            error = e
+
+        with self._turn:
+            self._turn.wait_for(lambda: self._serving == ticket)
+            try:
+                if error is not None:
+                    raise error
+                return self._update_tracks(now, frame, rgb_frame, locations)
+            finally:
+                # A failed call still passes the turn on, so later frames are not held up
+                self._serving += 1
+                self._turn.notify_all()
+
+    # Match detections to tracks and encode new and stale tracks; called in ticket order
+    def _update_tracks(self, now, frame, rgb_frame, locations):
+        self.frames += 1
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.track_timeout]
+        pairs, lost, new = self._associate(locations)
+
+        to_encode = []
+        for t, d in pairs:
+            track = self.tracks[t]
+            track.box = locations[d]
+            track.last_seen = now
+            track.missed = 0
+            self._start_cv_tracker(track, frame)
+            if track.name is None or now - track.last_recognized >= self.refresh_interval:
+                to_encode.append(track)
+            else:
+                self.skipped_faces += 1
+
+        for d in sorted(new):
+            track = Track(self._next_id, locations[d], now)
+            self._next_id += 1
+            self._start_cv_tracker(track, frame)
+            self.tracks.append(track)
+            to_encode.append(track)
+
+        # Tracks followed by OpenCV still expire after track_timeout without a detection
+        for t in lost:
+            track = self.tracks[t]
+            if not self._follow(track, frame):
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        # Encode only new and stale tracks, all in one batch
+        new_unknown = []
+        if to_encode:
+            encodings = face_handler.encode_faces(rgb_frame, [t.box for t in to_encode])
+            if encodings is not None and len(encodings) == len(to_encode):
+                names, distances = face_handler.identify_encodings(encodings)
+                self.encoded_faces += len(to_encode)
+                for track, name, distance, encoding in zip(to_encode, names, distances, encodings):
+                    if name == UNKNOWN_NAME and track.name is None:
+                        new_unknown.append(track)
+                    track.name = name
+                    track.distance = distance
+                    track.encoding = encoding
+                    track.last_recognized = now
+
+        visible = [t for t in self.tracks if t.missed == 0 and t.name is not None]
+        return visible, new_unknown
+
+    # Drop-in replacement for face_handler.recognize_faces_detailed
+    def recognize_faces_detailed(self, frame, regions=None):
+        if not face_handler.recognition_ready():
+            return frame, [], []
+        visible, new_unknown = self.update(frame, regions)
+        saved = face_handler.save_unknown_faces(frame, [t.box for t in new_unknown],
+                                                [UNKNOWN_NAME] * len(new_unknown),
+                                                [t.encoding for t in new_unknown])
+        crops = {t.track_id: path for t, path in zip(new_unknown, saved)}
+        face_locations = [t.box for t in visible]
+        face_names = [t.name for t in visible]
+        face_handler.annotate_faces(frame, face_locations, face_names)
+        detections = face_handler.describe_faces(face_locations, face_names, [t.distance for t in visible],
+                                                 [crops.get(t.track_id) for t in visible])
+        for detection, track in zip(detections, visible):
+            detection["track"] = track.track_id
+        return frame, face_names, detections
+
+    # Drop-in replacement for face_handler.recognize_faces
+    def recognize_faces(self, frame, regions=None):
+        frame, face_names, _ = self.recognize_faces_detailed(frame, regions)
+        return frame, face_names
+
+    # Counts of frames, encoded faces and faces skipped thanks to tracking
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'tracks': len(self.tracks),
+            'encoded_faces': self.encoded_faces,
+            'skipped_faces': self.skipped_faces,
+        }
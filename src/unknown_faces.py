@@ -0,0 +1,171 @@
+import os
+import time
+import queue
+import random
+import threading
+from collections import deque
+from datetime import datetime
+import cv2
+import numpy as np
+
+import metrics
+from encoding_store import ENCODING_SIZE
+
+
+# Saves unknown face crops on a background thread
+# A crop is skipped when its encoding is within dedup_distance of a crop saved less than
+# cooldown seconds ago, so each unknown visitor is saved about once per cooldown period.
+# The directory is kept under max_bytes by deleting the oldest crops first.
+class UnknownFaceWriter:
+
+    def __init__(self, directory, queue_size=16, dedup_distance=0.5, cooldown=30.0,
+                 max_bytes=500 * 1024 * 1024, jpeg_quality=90):
+        self.directory = directory
+        self.dedup_distance = dedup_distance
+        self.cooldown = cooldown
+        self.max_bytes = max_bytes
+        self.jpeg_quality = jpeg_quality
+
+        self.saved = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.failed = 0
+        self.evicted = 0
+        self.disk_bytes = 0
+
+        # Encodings of recently saved crops, oldest first, with the time they were saved
+        self._recent = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self._recent_times = np.empty(0, dtype=np.float64)
+        self._recent_lock = threading.Lock()
+
+        self._queue = queue.Queue(queue_size)
+        self._files = deque()
+        self._thread = threading.Thread(target=self._run, name='unknown-face-writer', daemon=True)
+        self._thread.start()
+
+    # Whether the encoding matches a crop saved within the cooldown; records it if not
+    def _check_duplicate(self, encoding, now):
+        with self._recent_lock:
+            keep = self._recent_times > now - self.cooldown
+            if not keep.all():
+                self._recent = self._recent[keep]
+                self._recent_times = self._recent_times[keep]
+            if encoding is None:
+                return False
+            encoding = np.asarray(encoding, dtype=np.float32)
+            if len(self._recent):
+                distances = np.linalg.norm(self._recent - encoding, axis=1)
+                if distances.min() <= self.dedup_distance:
+                    self.duplicates += 1
+                    return True
+            self._recent = np.vstack([self._recent, encoding[None, :]])
+            self._recent_times = np.append(self._recent_times, now)
+            return False
+
+    # Drop an encoding recorded by _check_duplicate whose crop was never queued
+    def _forget(self, encoding, now):
+        if encoding is None:
+            return
+        encoding = np.asarray(encoding, dtype=np.float32)
+        with self._recent_lock:
+            keep = ~((self._recent_times == now) & (self._recent == encoding).all(axis=1))
+            self._recent = self._recent[keep]
+            self._recent_times = self._recent_times[keep]
+
+    # Queue a face crop for saving; returns the path it will be written to, or None if skipped
+    # Without an encoding the crop cannot be deduplicated and is always queued
+    def submit(self, frame, box, encoding=None):
+        top, right, bottom, left = box
+        top, left = max(0, top), max(0, left)
+        bottom, right = min(frame.shape[0], bottom), min(frame.shape[1], right)
+        if bottom <= top or right <= left:
+            return None
+        now = time.monotonic()
+        if self._check_duplicate(encoding, now):
+            return None
+
+        now_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+        path = os.path.join(self.directory, f"unknown_{now_str}_{random.randint(1000, 9999)}.jpg")
+        # Copy the crop: the caller goes on to draw on the frame
+        crop = frame[top:bottom, left:right].copy()
+        try:
+            self._queue.put_nowait((path, crop))
+        except queue.Full:
+            # Not saved, so the same face must not be treated as a duplicate for the rest of the cooldown
+            self._forget(encoding, now)
+            self.dropped += 1
+            metrics.inc('unknown_faces_dropped')
+            return None
+        return path
+
+    # Existing crops, oldest first, so the quota also covers files from earlier runs
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.lower().endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._files.append((path, size))
+            self.disk_bytes += size
+
+    # Delete the oldest crops until the directory is under its quota
+    def _enforce_quota(self):
+        while self.max_bytes is not None and self.disk_bytes > self.max_bytes and self._files:
+            path, size = self._files.popleft()
+            self.disk_bytes -= size
+            try:
+                os.remove(path)
+                self.evicted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[Warning]: Failed to remove old unknown face {path}: {e}")
+
+    def _run(self):
+        self._scan()
+        self._enforce_quota()
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                path, crop = item
+                with metrics.timer('imwrite'):
+                    written = cv2.imwrite(path, crop, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if written:
+                    size = os.path.getsize(path)
+                    self._files.append((path, size))
+                    self.disk_bytes += size
+                    self.saved += 1
+                    print(f"[INFO]: Saved unknown face to {path}.")
+                    self._enforce_quota()
+                else:
+                    self.failed += 1
+                    print(f"[Error]: Failed to save unknown face to {path}.")
+            finally:
+                self._queue.task_done()
+
+    # Wait until every queued crop has been written
+    def flush(self):
+        self._queue.join()
+
+    # Write the remaining crops and stop the writer thread
+    def close(self, timeout=5.0):
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # Counts of saved, deduplicated, dropped and evicted crops
+    def stats(self):
+        return {
+            'saved': self.saved,
+            'duplicates': self.duplicates,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'evicted': self.evicted,
+            'queued': self._queue.qsize(),
+            'disk_bytes': self.disk_bytes,
+        }